@@ -4,22 +4,37 @@
 Phase 1: リンク切れ、電話番号、誤字脱字の3つのチェック機能
 """
 
+import hashlib
+import json
+import secrets
+import time
+
 import streamlit as st
-import yaml
-from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Optional
 
 from utils.crawler import WebCrawler
-from utils.reporter import ExcelReporter
 from utils.excel_handler import ExcelHandler
-from checkers import LinkChecker, PhoneChecker, UnifiedAIChecker
+from utils.budget import RunBudget
+from utils.checkpoint import RunJournal
+from utils.job_api import api_token, start_server as start_job_api
+from utils.jobs import JOB_CANCELLED, JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, STATUS_LABELS, JobProgress, JobQueue
+from utils.page_priority import PagePrioritizer
+from utils.runner import ClinicJob, count_statuses, describe_pace, estimate_run, load_config
 
 
-def load_config():
-    """設定ファイルを読み込み"""
-    config_path = Path(__file__).parent / "config.yaml"
-    with open(config_path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+@st.cache_resource
+def get_job_queue(auth_id: str, auth_pass: str) -> JobQueue:
+    """サーバー内で共有するジョブの待ち行列（全ての利用者・セッションで1つ。jobs.api.enabled なら HTTP API も起動）"""
+    config = load_config()
+    queue = JobQueue(config, auth_id, auth_pass)
+    queue.start()
+    api_config = config.get("jobs", {}).get("api", {})
+    if api_config.get("enabled", False):
+        try:
+            start_job_api(queue, api_config.get("host", "127.0.0.1"), api_config.get("port", 8766), api_token(config))
+        except OSError as e:
+            print(f"警告 (ジョブAPIの起動): {e}")
+    return queue
 
 
 def main():
@@ -95,6 +110,12 @@ def main():
         auth_id = ""
         auth_pass = ""
     
+    # チェックは画面とは別のワーカーで実行（画面の操作・再読み込みで止まらない）
+    queue = get_job_queue(auth_id, auth_pass)
+    # 公平なスケジューリングの単位（ブラウザのセッションごと）
+    if "job_owner" not in st.session_state:
+        st.session_state.job_owner = secrets.token_hex(4)
+    
     # Excelファイルのアップロード
     st.subheader("📁 設定ファイルのロード")
     uploaded_file = st.file_uploader(
@@ -140,6 +161,12 @@ def main():
                             pre_crawler.set_auth(auth_id, auth_pass)
                         pages = pre_crawler.crawl_site(url)
                         st.session_state.target_urls = "\n".join(pages.keys())
+                        # 実行前の見積もりに使用
+                        st.session_state.pre_pages = pages
+                        st.session_state.pre_duplicates = pre_crawler.near_duplicates.resolve()
+                        st.session_state.pop("estimate_cache", None)
+                        if pre_crawler.limit_reached:
+                            st.warning(f"⚠️ 巡回ページ数が上限（{pre_crawler.max_pages}）に達しました。一部のページが漏れている可能性があります。")
                         st.session_state.last_uploaded_url = url
 
                 st.markdown("---")
@@ -160,6 +187,34 @@ def main():
                 )
                 st.session_state.target_urls = target_urls_input
 
+                # 実行前の見積もりと予算
+                estimate = None
+                budget = RunBudget.from_config(config)
+                with st.expander("⏱️ 実行前の見積もり・予算"):
+                    estimate_urls = [u.strip() for u in target_urls_input.split("\n") if u.strip()]
+                    try:
+                        estimate = cached_estimate(estimate_urls, config, handler.get_ng_rules(), handler.get_all_master_data())
+                    except Exception as e:
+                        st.warning(f"⚠️ 見積もりを算出できませんでした: {e}")
+                    if estimate:
+                        col1, col2, col3, col4 = st.columns(4)
+                        with col1:
+                            st.metric("AI呼び出し", f"{estimate['ai_calls']}回")
+                        with col2:
+                            st.metric("トークン", f"{estimate['total_tokens']:,}", help=f"入力 {estimate['prompt_tokens']:,} / 出力 {estimate['response_tokens']:,}")
+                        with col3:
+                            st.metric("リンク確認", f"{estimate['link_probes']}件", help=f"うち外部リンク {estimate['external_probes']}件")
+                        with col4:
+                            st.metric("所要時間", f"約{estimate['seconds'] / 60:.1f}分", help=f"概算費用 {estimate['cost']:.3f} {estimate['currency']}")
+                    st.caption("予算（0 は無制限）。上限に達した後はAIチェック・ページのチェックを省略します。")
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        budget.max_tokens = st.number_input("トークン上限", min_value=0, value=budget.max_tokens, step=10000)
+                    with col2:
+                        budget.max_ai_calls = st.number_input("AI呼び出し上限", min_value=0, value=budget.max_ai_calls, step=10)
+                    with col3:
+                        budget.max_seconds = st.number_input("実行時間上限（分）", min_value=0, value=int(budget.max_seconds // 60), step=5) * 60
+
                 # チェック開始ボタン（テキストボックスの下に配置）
                 if st.button("🚀 チェック開始", type="primary", use_container_width=True):
                     # 入力チェック
@@ -167,51 +222,45 @@ def main():
                     if not url_list or not clinic_name:
                         st.error("❌ 医院名と処理対象のURLを入力してください")
                     else:
-                        # 設定を更新
-                        if correct_phone:
-                            if "checks" not in config:
-                                config["checks"] = {}
-                            if "phone_check" not in config["checks"]:
-                                config["checks"]["phone_check"] = {}
-                            config["checks"]["phone_check"]["correct_phone"] = correct_phone
-                        
-                        # チェック実行
-                        try:
-                            with st.spinner("チェック実行中..."):
-                                # NG表現ルールをExcelから取得
-                                ng_rules = handler.get_ng_rules()
-                                master_data = handler.get_all_master_data()
-                                results, checked_urls, raw_pages = run_checks(url_list, config, auth_id, auth_pass, ng_rules=ng_rules, master_data=master_data)
-                            
-                            # 状態を保存
-                            st.session_state.results = results
-                            st.session_state.checked_urls = checked_urls
-                            st.session_state.last_clinic_name = clinic_name
-                            
-                            # Excelレポート生成
-                            reporter = ExcelReporter(config)
-                            st.session_state.excel_data = reporter.generate_report(clinic_name, results)
-                            
-                            # 診断用生テキストデータを生成
-                            import io
-                            import zipfile
-                            zip_buffer = io.BytesIO()
-                            with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED, False) as zip_file:
-                                for url, (content, soup) in raw_pages.items():
-                                    # URLをファイル名に安全な形式に変換
-                                    safe_filename = url.replace("https://", "").replace("http://", "").replace("/", "_").replace(":", "_") + ".txt"
-                                    zip_file.writestr(safe_filename, content)
-                            st.session_state.debug_txt_zip = zip_buffer.getvalue()
-                            
-                            st.success("✅ チェック完了！")
-                        except Exception as e:
-                            st.error(f"❌ エラーが発生しました: {str(e)}")
-                            st.exception(e)
+                        # NG表現ルールをExcelから取得
+                        job = ClinicJob(
+                            clinic_name, url, urls=url_list, correct_phone=correct_phone or "",
+                            ng_rules=handler.get_ng_rules(), master_data=handler.get_all_master_data()
+                        )
+                        # URL抽出時に取得したページの被リンク数でチェック順を決定
+                        inbound_counts = PagePrioritizer(config).inbound_counts(st.session_state.get("pre_pages", {}))
+                        st.session_state.active_job = queue.submit(
+                            st.session_state.job_owner, job, budget=budget, inbound_counts=inbound_counts, estimate=estimate
+                        )
+                        st.success("✅ チェックを開始しました（画面を操作・再読み込みしてもチェックは続きます）")
             else:
                 st.warning("⚠️ Excel内からURLまたは医院名が見つかりませんでした。")
     else:
         st.info("💡 まずは DC-config.xlsx をアップロードしてください。")
 
+    # チェックジョブの進捗・結果（一定間隔で更新）
+    render_jobs(queue)
+
+    # コマンドラインの実行等で中断したチェックの再開（実行中・待機中のジョブの分は除く）
+    active_runs = {j["run_id"] for j in queue.list_jobs() if j["status"] in (JOB_QUEUED, JOB_RUNNING)}
+    unfinished_runs = [
+        run for run in (RunJournal.list_runs(config) if RunJournal.is_enabled(config) else [])
+        if run["run_id"] not in active_runs
+    ]
+    if unfinished_runs:
+        with st.expander(f"⏯️ 中断したチェックの再開（{len(unfinished_runs)}件）"):
+            labels = {
+                f"{run['clinic_name']}（{run['done']}/{run['pages']}ページ完了・実行ID {run['run_id']}）": run["run_id"]
+                for run in unfinished_runs
+            }
+            selected = st.selectbox("再開するチェック", list(labels))
+            st.caption("チェック済みのページ・項目は記録した結果を再利用し、残りのみをチェックします。")
+            if st.button("▶️ 再開", use_container_width=True):
+                run_id = labels[selected]
+                job = ClinicJob.from_dict(RunJournal.open(config, run_id).params["job"])
+                st.session_state.active_job = queue.submit(st.session_state.job_owner, job, run_id=run_id)
+                st.rerun()
+
     # session_stateの初期化
     if "results" not in st.session_state:
         st.session_state.results = None
@@ -223,6 +272,8 @@ def main():
         st.session_state.last_clinic_name = None
     if "debug_txt_zip" not in st.session_state:
         st.session_state.debug_txt_zip = None
+    if "ai_usage" not in st.session_state:
+        st.session_state.ai_usage = None
 
     # チェック結果が表示可能な場合に表示（ボタンの外側に配置して永続化）
     if st.session_state.results and st.session_state.checked_urls:
@@ -237,17 +288,52 @@ def main():
             </div>
         """.format("<br>".join(st.session_state.checked_urls)), unsafe_allow_html=True)
         
-        ok_count = sum(1 for r in st.session_state.results if r["status"] == "ok")
-        warning_count = sum(1 for r in st.session_state.results if r["status"] == "warning")
-        error_count = sum(1 for r in st.session_state.results if r["status"] == "error")
+        counts = count_statuses(st.session_state.results)
         
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("✅ OK", ok_count)
+            st.metric("✅ OK", counts["ok"])
         with col2:
-            st.metric("⚠️ 警告", warning_count)
+            st.metric("⚠️ 警告", counts["warning"])
         with col3:
-            st.metric("❌ エラー", error_count)
+            st.metric("❌ エラー", counts["error"])
+        
+        # ほぼ同一の内容として代表ページにまとめたページ
+        duplicate_count = sum(1 for r in st.session_state.results if r["check_name"] == "重複ページ" and "類似度" in r["details"])
+        if duplicate_count:
+            st.info(f"ℹ️ ほぼ同一の内容のページ {duplicate_count}件は代表ページにまとめてチェックしました（レポートの「重複ページ」行を参照）")
+        
+        # テンプレート群のサンプリングでAIチェックを省略したページ
+        sampling_rows = [r for r in st.session_state.results if r["check_name"] == "サンプリング"]
+        if sampling_rows:
+            skipped = sum(1 for r in sampling_rows if "代表ページとして" not in r["details"])
+            st.info(f"ℹ️ テンプレート群のサンプリング: {len(sampling_rows)}ページ中 {skipped}ページはAIチェックを代表ページで代替し、機械判定のみ行いました（レポートの「サンプリング」行を参照）")
+        
+        # AI使用状況（トークン数・処理時間・概算費用）
+        ai_usage = st.session_state.ai_usage
+        if ai_usage and ai_usage["total"]["calls"]:
+            total = ai_usage["total"]
+            with st.expander("🤖 AI使用状況"):
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("呼び出し回数", total["calls"], help=f"エラー {total['errors']}件 / リトライ {total['retries']}回")
+                with col2:
+                    st.metric("トークン (入力/出力)", f"{total['prompt_tokens']:,} / {total['response_tokens']:,}")
+                with col3:
+                    st.metric("概算費用", f"{total['cost']:.3f} {ai_usage['currency']}")
+                with col4:
+                    st.metric("応答時間 p95", f"{total['latency_p95']:.1f}秒", help=f"p50 {total['latency_p50']:.1f}秒")
+                if ai_usage["top_pages"]:
+                    st.caption("トークン消費の多いページ")
+                    st.table([
+                        {"ページ": p["page_url"], "入力": p["prompt_tokens"], "出力": p["response_tokens"], "処理時間(秒)": round(p["latency_total"], 1)}
+                        for p in ai_usage["top_pages"][:5]
+                    ])
+        
+        # 段階ごとの処理件数・スループット（ボトルネックの段階のワーカー数を増やす目安）
+        if st.session_state.get("pipeline_metrics"):
+            with st.expander("⚙️ 処理段階ごとの統計"):
+                render_stage_metrics(st.empty(), st.session_state.pipeline_metrics)
         
         # ダウンロードボタン
         if st.session_state.excel_data:
@@ -272,104 +358,140 @@ def main():
                 )
 
 
-def run_checks(urls: List[str], config: dict, auth_id: str = "", auth_pass: str = "", ng_rules: Optional[List[dict]] = None, master_data: Optional[dict] = None):
-    """
-    チェックを実行
+@st.fragment(run_every=1)
+def render_jobs(queue: JobQueue):
+    """ジョブの一覧と、このセッションで投入したジョブの進捗・途中結果（完了したら結果を表示）"""
+    jobs = queue.list_jobs(limit=20)
+    if not jobs:
+        return
     
-    Args:
-        urls: チェック対象URLリスト
-        config: 設定辞書
-        auth_id: Basic認証ID
-        auth_pass: Basic認証パスワード
-        ng_rules: NG表現ルールのリスト
+    active_id = st.session_state.get("active_job")
+    active = next((j for j in jobs if j["job_id"] == active_id), None)
+    if active and active["status"] in (JOB_QUEUED, JOB_RUNNING):
+        st.subheader(f"⏳ {active['clinic_name']} をチェック中")
+        if active["cancel_requested"]:
+            st.info("ℹ️ 中止しています（それまでの結果でレポートを作成します）")
+        elif st.button("⏹️ 中止", help="取得・リンク確認・AIチェックを打ち切り、それまでの結果でレポートを作成します"):
+            queue.cancel(active_id)
+            st.rerun()
+        progress = queue.progress(active_id)
+        if progress is None:
+            waiting = sum(1 for j in jobs if j["status"] == JOB_QUEUED and j["submitted_at"] < active["submitted_at"])
+            st.info(f"ℹ️ 他のチェックの終了を待っています（先に待機中のジョブ {waiting}件）")
+        else:
+            st.progress(min(1.0, progress.done / max(1, progress.total)))
+            render_live_findings(st.empty(), progress)
+            if progress.stage_metrics:
+                render_stage_metrics(st.empty(), progress.stage_metrics)
+    elif active and active["status"] == JOB_DONE and st.session_state.get("loaded_job") != active_id:
+        load_job_report(queue, active_id)
+        st.rerun()
+    elif active and active["status"] == JOB_DONE and active["message"]:
+        # 中止・実行時間の上限で一部のページを省略した場合
+        st.warning(f"⚠️ {active['message']}（「未チェック」の行を参照）")
+    elif active and active["status"] == JOB_FAILED:
+        st.error(f"❌ チェックに失敗しました: {active['message']}")
+    elif active and active["status"] == JOB_CANCELLED:
+        st.warning(f"⚠️ チェックを中止しました: {active['message']}")
     
-    Returns:
-        (チェック結果のリスト, チェックしたURLのリスト)
+    with st.expander(f"📋 チェックジョブ（{sum(1 for j in jobs if j['status'] in (JOB_QUEUED, JOB_RUNNING))}件実行中・待機中）"):
+        st.dataframe(
+            [{
+                "医院名": j["clinic_name"],
+                "状態": STATUS_LABELS[j["status"]],
+                "進捗": f"{j['done']}/{j['total']}" if j["total"] else "",
+                "エラー": j["errors"],
+                "警告": j["warnings"],
+                "投入": time.strftime("%m/%d %H:%M", time.localtime(j["submitted_at"])),
+                "ジョブID": j["job_id"],
+            } for j in jobs],
+            use_container_width=True,
+            hide_index=True
+        )
+        done_jobs = {f"{j['clinic_name']}（{j['job_id']}）": j["job_id"] for j in jobs if j["status"] == JOB_DONE}
+        if done_jobs:
+            selected = st.selectbox("結果を表示するジョブ", list(done_jobs))
+            if st.button("📄 結果を表示", use_container_width=True):
+                st.session_state.active_job = done_jobs[selected]
+                load_job_report(queue, done_jobs[selected])
+                st.rerun()
+
+
+def cached_estimate(urls: List[str], config: Dict, ng_rules: List[dict], master_data: Dict) -> Optional[Dict]:
     """
-    all_results = []
-    
-    # 既存の設定を上書きしないようにコピー
-    run_config = config.copy()
-    if ng_rules:
-        run_config["ng_words_rules"] = ng_rules
-    
-    # Basic認証情報
-    auth = None
-    if auth_id and auth_pass:
-        auth = (auth_id, auth_pass)
-    
-    # クローラー初期化
-    crawler = WebCrawler(run_config)
-    if auth:
-        crawler.set_auth(auth_id, auth_pass)
-    
-    import concurrent.futures
-    
-    # ページ取得の並列化
-    pages = {}
-    progress_text = st.empty()
-    fetch_progress = st.progress(0)
-    
-    def fetch_single_page(url):
-        return url, crawler.fetch_page(url)
-
-    max_workers = run_config.get("crawler", {}).get("max_workers", 5)
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_url = {executor.submit(fetch_single_page, url): url for url in urls}
-        for i, future in enumerate(concurrent.futures.as_completed(future_to_url)):
-            url, result = future.result()
-            if result:
-                pages[url] = result
-            progress_text.text(f"ページの内容を取得中 ({i+1}/{len(urls)}): {url}")
-            fetch_progress.progress((i + 1) / len(urls))
+    実行前の見積もり（URLリスト・設定・NGルール・マスターデータが変わった場合のみ算出し、画面の操作ごとの再実行では再利用）
     
-    fetch_progress.empty()
-    progress_text.empty()
-    
-    if not pages:
-        st.error("入力されたURLから有効なページ情報を取得できませんでした")
-        return [], []
-    
-    # チェックしたURLのリスト
-    checked_urls = list(pages.keys())
-    
-    # チェッカーを初期化（AI系は UnifiedAIChecker に統合）
-    checkers = [
-        LinkChecker(run_config, auth=auth),
-        PhoneChecker(run_config),
-        UnifiedAIChecker(run_config, master_data=master_data, ng_rules=ng_rules)
-    ]
-    
-    # 各ページに対するチェック実行の並列化
-    progress_bar = st.progress(0)
-    total_tasks = len(pages)
-    current_done = 0
-    
-    def run_all_checkers_for_page(page_url, page_data):
-        page_content, soup = page_data
-        page_results = []
-        for checker in checkers:
-            if checker.is_enabled():
-                try:
-                    res = checker.check(page_url, page_content, soup)
-                    for r in res:
-                        page_results.append(r.to_dict())
-                except Exception as e:
-                    print(f"エラー ({checker.__class__.__name__} at {page_url}): {e}")
-        return page_results
-
-    # チェックの実行
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_page = {executor.submit(run_all_checkers_for_page, url, data): url for url, data in pages.items()}
-        for future in concurrent.futures.as_completed(future_to_page):
-            page_results = future.result()
-            all_results.extend(page_results)
-            current_done += 1
-            progress_bar.progress(current_done / total_tasks)
-    
-    progress_bar.empty()
+    Raises:
+        Exception: 見積もりを算出できなかった場合
+    """
+    key = hashlib.sha256(
+        json.dumps([urls, config, ng_rules, master_data], ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    cached = st.session_state.get("estimate_cache")
+    if cached and cached[0] == key:
+        return cached[1]
+    estimate = estimate_run(
+        urls, config, st.session_state.get("pre_pages", {}),
+        ng_rules=ng_rules, master_data=master_data, duplicates=st.session_state.get("pre_duplicates", {})
+    )
+    st.session_state.estimate_cache = (key, estimate)
+    return estimate
+
+
+def load_job_report(queue: JobQueue, job_id: str):
+    """完了したジョブのレポートを画面の状態に読み込み"""
+    report = queue.load_report(job_id)
+    st.session_state.results = report["results"]
+    st.session_state.checked_urls = report["checked_urls"]
+    st.session_state.last_clinic_name = report["clinic_name"]
+    st.session_state.ai_usage = report["ai_usage"]
+    st.session_state.pipeline_metrics = report["pipeline"]
+    st.session_state.excel_data = report["excel_data"]
+    st.session_state.debug_txt_zip = report["pages_zip"]
+    st.session_state.loaded_job = job_id
+
+
+def render_stage_metrics(placeholder, metrics: List[Dict]):
+    """段階ごとの待ち件数・処理件数・スループットを表示"""
+    placeholder.dataframe(
+        [{
+            "段階": m["stage"],
+            "ワーカー数": m["workers"],
+            "待ち": m["queue_depth"],
+            "処理済み": m["processed"],
+            "件/秒": round(m["throughput"], 2),
+            "稼働率": f"{m['utilization']:.0%}",
+        } for m in metrics],
+        use_container_width=True,
+        hide_index=True
+    )
+
+
+def render_live_findings(placeholder, progress: JobProgress):
+    """
+    チェック中の件数・処理速度と検出済みのエラー・警告を表示（エラーを先頭に最大50件）
     
-    return all_results, checked_urls, pages
+    ページ・チェッカー単位で届いた結果を表示するため、ページのAIチェックの完了を待たずに機械判定等の指摘が表示される
+    """
+    counts = progress.counts
+    findings = progress.findings(limit=50)
+    with placeholder.container():
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("✅ OK", counts["ok"])
+        with col2:
+            st.metric("⚠️ 警告", counts["warning"])
+        with col3:
+            st.metric("❌ エラー", counts["error"])
+        with col4:
+            st.metric("チェック済み", f"{progress.done}/{progress.total}ページ")
+        st.caption(f"⚡ {describe_pace(progress.rate, progress.eta)}")
+        if findings:
+            st.dataframe(
+                [{"ページ": r["page_url"], "チェック項目": r["check_name"], "結果": r["status"], "詳細": r["details"][:150]} for r in findings],
+                use_container_width=True,
+                hide_index=True
+            )
 
 
 if __name__ == "__main__":
@@ -4,7 +4,7 @@
 各チェック機能を提供するモジュール群
 """
 
-from .base import BaseChecker, CheckResult
+from .base import RESOURCE_AI, RESOURCE_CLASSES, RESOURCE_CPU, RESOURCE_NETWORK, BaseChecker, CheckResult
 from .link_checker import LinkChecker
 from .phone_checker import PhoneChecker
 from .typo_checker import TypoChecker
@@ -13,6 +13,10 @@ from .consistency_checker import ConsistencyChecker
 from .unified_ai_checker import UnifiedAIChecker
 
 __all__ = [
+    'RESOURCE_AI',
+    'RESOURCE_CLASSES',
+    'RESOURCE_CPU',
+    'RESOURCE_NETWORK',
     'BaseChecker',
     'CheckResult',
     'LinkChecker',
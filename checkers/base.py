@@ -7,6 +7,12 @@
 from abc import ABC, abstractmethod
 from typing import Dict, List, Any
 
+# チェッカーが主に消費する資源（実行時はこの種類ごとに同時実行数を制限したワーカーで処理する）
+RESOURCE_CPU = "cpu"          # 正規表現・形態素解析などの機械判定
+RESOURCE_NETWORK = "network"  # リンク先へのリクエスト
+RESOURCE_AI = "ai"            # AI API の呼び出し（API のレート制限を消費）
+RESOURCE_CLASSES = (RESOURCE_CPU, RESOURCE_NETWORK, RESOURCE_AI)
+
 
 class CheckResult:
     """チェック結果を格納するクラス"""
@@ -39,6 +45,9 @@ class CheckResult:
 class BaseChecker(ABC):
     """全チェッカーの基底クラス"""
     
+    # 主に消費する資源（RESOURCE_CLASSES のいずれか）
+    resource_class = RESOURCE_CPU
+    
     def __init__(self, config: Dict[str, Any]):
         """
         Args:
@@ -69,6 +78,9 @@ class BaseChecker(ABC):
             return self.config["checks"][check_key].get("enabled", True)
         return True
     
+    def close(self):
+        """チェックの終了時に呼び出される（保持している資源を解放。既定では何もしない）"""
+    
     def get_severity(self) -> str:
         """このチェッカーの重要度を取得"""
         check_key = self.check_name.lower() + "_check"
@@ -8,12 +8,14 @@ import re
 import json
 from typing import List
 from bs4 import BeautifulSoup
-from .base import BaseChecker, CheckResult
+from .base import RESOURCE_AI, BaseChecker, CheckResult
 from utils.ai_helper import AIHelper
 
 class ConsistencyChecker(BaseChecker):
     """詳細情報の整合性をチェックするクラス"""
     
+    resource_class = RESOURCE_AI
+    
     def __init__(self, config: dict, master_data: dict = None):
         super().__init__(config)
         self.master_data = master_data or {}
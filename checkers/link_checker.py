@@ -5,19 +5,23 @@
 """
 
 import requests
-import time
 from typing import List, Dict, Tuple
 from bs4 import BeautifulSoup
-from .base import BaseChecker, CheckResult
+from .base import RESOURCE_NETWORK, BaseChecker, CheckResult
+from utils.budget import CancelToken
+from utils.limits import shared_limits
 
 
 class LinkChecker(BaseChecker):
     """リンク切れをチェックするクラス"""
     
-    def __init__(self, config: dict, auth: tuple = None):
+    resource_class = RESOURCE_NETWORK
+    
+    def __init__(self, config: dict, auth: tuple = None, cancel_token: CancelToken = None):
         super().__init__(config)
         self.timeout = config.get("checks", {}).get("link_check", {}).get("timeout", 5)
         self.auth = auth  # Basic認証情報 (username, password)
+        self.cancel_token = cancel_token or CancelToken()  # 中断されると残りのリンクは確認しない
         self._cache = {}  # チェック済みURLのキャッシュ {url: (is_valid, status_code)}
     
     def check(self, page_url: str, page_content: str, soup: BeautifulSoup) -> List[CheckResult]:
@@ -31,6 +35,9 @@ class LinkChecker(BaseChecker):
         
         Returns:
             CheckResultのリスト
+        
+        Raises:
+            CancelledError: 実行が中断された場合（確認途中の結果は返さない）
         """
         results = []
         severity = self.get_severity()
@@ -54,30 +61,15 @@ class LinkChecker(BaseChecker):
         
         # 各リンクをチェック
         broken_links_info = []
-        checked_links_count = 0
-        for link in links:
-            href = link["href"]
-            
-            # 相対URLや特殊なURL、または特定のSNSリンクはスキップ
-            if (href.startswith("#") or href.startswith("javascript:") or 
-                href.startswith("mailto:") or href.startswith("tel:")):
-                continue
-            
-            # SNSリンクを除外 (Instagram, X, Facebook)
-            sns_domains = ["instagram.com", "facebook.com", "twitter.com", "x.com"]
-            if any(domain in href.lower() for domain in sns_domains):
-                continue
-            
-            # 絶対URLに変換
-            if not href.startswith("http"):
-                from urllib.parse import urljoin
-                href = urljoin(page_url, href)
-            
-            # リンクをチェック
-            checked_links_count += 1
+        targets = self.collect_targets(page_url, soup)
+        checked_links_count = len(targets)
+        for href in targets:
+            self.cancel_token.check()
             is_valid, status_code = self._check_link(href, base_domain)
             if not is_valid:
                 broken_links_info.append(f"{href} (Status: {status_code})")
+        # 中断の期限で打ち切った確認をリンク切れとして報告しない
+        self.cancel_token.check()
         
         # 結果を作成
         if broken_links_info:
@@ -103,6 +95,53 @@ class LinkChecker(BaseChecker):
         
         return results
     
+    def collect_targets(self, page_url: str, soup: BeautifulSoup) -> List[str]:
+        """
+        ページ内のチェック対象リンク（絶対URL）を抽出
+        
+        ページ内リンク・javascript:・mailto:・tel: およびSNSリンクは除外する
+        
+        Args:
+            page_url: ページのURL
+            soup: BeautifulSoupオブジェクト
+        
+        Returns:
+            チェック対象URLのリスト（ページ内の出現順、重複を含む）
+        """
+        from urllib.parse import urljoin
+        
+        targets = []
+        for link in soup.find_all("a", href=True):
+            href = link["href"]
+            
+            # 相対URLや特殊なURL、または特定のSNSリンクはスキップ
+            if (href.startswith("#") or href.startswith("javascript:") or 
+                href.startswith("mailto:") or href.startswith("tel:")):
+                continue
+            
+            # SNSリンクを除外 (Instagram, X, Facebook)
+            sns_domains = ["instagram.com", "facebook.com", "twitter.com", "x.com"]
+            if any(domain in href.lower() for domain in sns_domains):
+                continue
+            
+            # 絶対URLに変換
+            if not href.startswith("http"):
+                href = urljoin(page_url, href)
+            targets.append(href)
+        return targets
+    
+    @staticmethod
+    def is_internal(url: str, base_domain: str) -> bool:
+        """URLがチェック対象サイトと同一ドメインか（www. の有無は区別しない）"""
+        from urllib.parse import urlparse
+        target_domain = urlparse(url).netloc
+        
+        # ドメイン正規化（www. を除外して比較）
+        def normalize_domain(d):
+            return d.replace("www.", "")
+        
+        return normalize_domain(target_domain) == normalize_domain(base_domain)
+    
     def _check_link(self, url: str, base_domain: str) -> Tuple[bool, str]:
         """
         リンクが有効かチェック
@@ -118,18 +157,12 @@ class LinkChecker(BaseChecker):
         if url in self._cache:
             return self._cache[url]
 
-        from urllib.parse import urlparse
-        target_domain = urlparse(url).netloc
-        
-        # ドメイン正規化（www. を除外して比較）
-        def normalize_domain(d):
-            return d.replace("www.", "")
-        
-        is_internal = normalize_domain(target_domain) == normalize_domain(base_domain)
+        is_internal = self.is_internal(url, base_domain)
         
         # 2. 外部ドメインの場合のみ待機（レート制限回避）
         if not is_internal:
-            time.sleep(1.0)
+            self.cancel_token.wait(1.0)
+            self.cancel_token.check()
         
         # 同一ドメインの場合のみBasic認証を送信する
         request_auth = self.auth if is_internal else None
@@ -139,9 +172,15 @@ class LinkChecker(BaseChecker):
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
         }
         
-        # タイムアウトを長めに設定
-        timeout = 10
+        # タイムアウトを長めに設定（中断の期限は超えない）
+        timeout = self.cancel_token.timeout(10)
         
+        # バッチ実行時は他の医院のチェックと合わせてホストごとの同時リクエスト数を制限
+        with shared_limits().host_slot(url):
+            return self._probe(url, request_auth, headers, timeout)
+    
+    def _probe(self, url: str, request_auth, headers: Dict, timeout: int) -> Tuple[bool, str]:
+        """HEAD（失敗時は GET）でリンク先を確認し、結果をキャッシュ"""
         try:
             # まずHEADリクエストで試す（高速）
             response = requests.head(
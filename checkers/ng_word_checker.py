@@ -7,13 +7,15 @@ Gemini APIを使用して、指定されたルールに基づきテキストのN
 from typing import List
 import json
 from bs4 import BeautifulSoup
-from .base import BaseChecker, CheckResult
+from .base import RESOURCE_AI, BaseChecker, CheckResult
 from utils.ai_helper import AIHelper
 
 
 class NGWordChecker(BaseChecker):
     """NG表現をチェックするクラス（AI支援）"""
     
+    resource_class = RESOURCE_AI
+    
     def __init__(self, config: dict):
         super().__init__(config)
         self.enabled = config.get("checks", {}).get("ng_word_check", {}).get("enabled", True)
@@ -87,7 +89,7 @@ class NGWordChecker(BaseChecker):
 
         # AIで分析
         try:
-            ai_result = self.ai_helper.model.generate_content(prompt).text.strip()
+            ai_result = self.ai_helper.generate(prompt).strip()
         except Exception as e:
             print(f"AI分析エラー (NGWordChecker): {e}")
             return results
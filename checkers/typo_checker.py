@@ -6,13 +6,15 @@ Gemini API を使用してテキストの誤字脱字をチェック
 
 from typing import List
 from bs4 import BeautifulSoup
-from .base import BaseChecker, CheckResult
+from .base import RESOURCE_AI, BaseChecker, CheckResult
 from utils.ai_helper import AIHelper
 
 
 class TypoChecker(BaseChecker):
     """誤字脱字をチェックするクラス（AI支援）"""
     
+    resource_class = RESOURCE_AI
+    
     def __init__(self, config: dict):
         super().__init__(config)
         self.use_ai = config.get("checks", {}).get("typo_check", {}).get("use_ai", True)
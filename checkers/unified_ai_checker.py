@@ -6,15 +6,35 @@ Gemini APIを使用して、誤字脱字、NG表現、詳細情報の整合性
 
 import json
 import re
-from typing import List
+from typing import List, Tuple
 from bs4 import BeautifulSoup
-from .base import BaseChecker, CheckResult
+from .base import RESOURCE_AI, BaseChecker, CheckResult
+from utils.ai_findings import FINDINGS_SCHEMA, AIFinding, parse_findings
 from utils.ai_helper import AIHelper
+from utils.ai_metrics import AIUsageTracker
+from utils.budget import BudgetExceededError, CancelledError, RunBudget
+from utils.consistency_rules import ConsistencyRuleEngine
+from utils.ng_matcher import NGExpressionMatcher
+from utils.paragraph_cache import ParagraphFindingCache, compute_rule_version, split_paragraphs
+from utils.proofreader import LocalProofreader
+
+# プロンプトの指示内容を変更した場合は更新する（段落キャッシュのバージョンに反映）
+PROMPT_VERSION = 1
+
+# 段落単位で判定する（段落キャッシュに保存する）指摘の分類
+PARAGRAPH_CATEGORIES = ("誤字脱字", "NG表現")
+
+# 整合性チェック用に送信する段落の判定キーワード（マスターデータ照合に関わる記述）
+CONSISTENCY_HINTS = ["〒", "住所", "所在地", "電話", "TEL", "Tel", "診療", "休診", "院長", "医院", "©", "Copyright", "copyright"]
 
 class UnifiedAIChecker(BaseChecker):
     """複数のAIチェック機能を1つに集約したチェッカー"""
     
-    def __init__(self, config: dict, master_data: dict = None, ng_rules: List[dict] = None):
+    # AIを呼び出さない機械判定（check_local）は RESOURCE_CPU のワーカーで先に実行される
+    resource_class = RESOURCE_AI
+    
+    def __init__(self, config: dict, master_data: dict = None, ng_rules: List[dict] = None,
+                 usage_tracker: AIUsageTracker = None, budget: RunBudget = None):
         super().__init__(config)
         self.master_data = master_data or {}
         self.ng_rules = ng_rules or config.get("ng_words_rules", [])
@@ -24,18 +44,99 @@ class UnifiedAIChecker(BaseChecker):
         self.ng_enabled = config.get("checks", {}).get("ng_word_check", {}).get("enabled", True)
         self.consistency_enabled = config.get("checks", {}).get("consistency_check", {}).get("enabled", True)
 
+        # NG表現の機械照合（完全一致・活用形はローカルで判定し、AIには曖昧なケースのみを任せる）
+        ng_config = config.get("checks", {}).get("ng_word_check", {})
+        self.ng_severity = ng_config.get("severity", "high")
+        self.ng_matcher = None
+        if self.ng_enabled and self.ng_rules and ng_config.get("local_matcher", True):
+            self.ng_matcher = NGExpressionMatcher(self.ng_rules)
+
+        # マスターデータとの整合性の機械判定（全ルール合格のページはAIへの指示を軽量化）
+        consistency_config = config.get("checks", {}).get("consistency_check", {})
+        self.consistency_severity = consistency_config.get("severity", "medium")
+        self.consistency_engine = None
+        if self.consistency_enabled and self.master_data and consistency_config.get("local_rules", True):
+            self.consistency_engine = ConsistencyRuleEngine(self.master_data)
+
+        # ローカル校正ルール（疑わしさスコアが閾値以上のページのみAIで誤字脱字を精査）
+        typo_config = config.get("checks", {}).get("typo_check", {})
+        self.typo_severity = typo_config.get("severity", "high")
+        self.escalation_threshold = typo_config.get("escalation_threshold", 0)
+        self.proofreader = None
+        if self.typo_enabled and typo_config.get("local_prefilter", True):
+            self.proofreader = LocalProofreader()
+
+        # 段落単位の指摘キャッシュ設定（クリニック間で共有）
+        self.paragraph_cache_config = config.get("cache", {}).get("paragraph", {})
+        self.paragraph_cache = None
+
+        # AIの出力形式（json: レスポンススキーマ指定の構造化出力 / text: 従来の自由記述）
+        self.output_format = config.get("api", {}).get("output_format", "json")
+
+        # 実行中に変化しないプロンプト固定部を1回だけ構築（軽量版は初回使用時に構築）
+        self._static_prompts = {}
+        self.static_prompt = self._get_static_prompt()
+
+        # 機械判定（check_local）はAIを使用できない場合（APIキー未設定等）も実行する
+        self.enabled = any([self.typo_enabled, self.ng_enabled, self.consistency_enabled])
         try:
-            self.ai_helper = AIHelper(config)
-            self.enabled = any([self.typo_enabled, self.ng_enabled, self.consistency_enabled])
+            self.ai_helper = AIHelper(config, usage_tracker=usage_tracker, caller=self.__class__.__name__, budget=budget)
         except Exception as e:
             print(f"警告 (UnifiedAIChecker): {e}")
-            self.enabled = False
             self.ai_helper = None
 
+        if self.enabled and self.ai_helper and self.paragraph_cache_config.get("enabled", False):
+            try:
+                self.paragraph_cache = ParagraphFindingCache(
+                    self.paragraph_cache_config.get("path", ".cache/paragraph_findings.sqlite3"),
+                    self._paragraph_rule_version()
+                )
+            except Exception as e:
+                print(f"警告 (段落キャッシュ): {e}")
+
+    def close(self):
+        """モデル側に作成したコンテキストキャッシュを削除"""
+        if self.ai_helper:
+            self.ai_helper.close()
+
     def check(self, page_url: str, page_content: str, soup: BeautifulSoup) -> List[CheckResult]:
-        results = []
+        if not self.enabled:
+            return []
+
+        results, light_consistency, include_typo = self.check_local(page_url, page_content, soup)
+        results.extend(self.check_ai(page_url, page_content, soup, light_consistency, include_typo))
+        return results
+
+    def check_ai(self, page_url: str, page_content: str, soup: BeautifulSoup,
+                 light_consistency: bool = False, include_typo: bool = True) -> List[CheckResult]:
+        """
+        5. AIによる統合チェック（check_local の機械判定の結果を反映）
+        
+        パイプライン実行時は機械判定と別の段階（AI用のワーカー）で呼び出される
+        """
         if not self.enabled or not self.ai_helper:
-            return results
+            return []
+        try:
+            return self._check_with_ai_unified(page_url, page_content, soup, light_consistency, include_typo)
+        except BudgetExceededError as e:
+            return [CheckResult(
+                page_url=page_url,
+                check_name="AI統合チェック",
+                status="warning",
+                details=f"★ 実行予算の上限に達したため、AIチェックを省略しました（{e}）",
+                severity="medium"
+            )]
+
+    def check_local(self, page_url: str, page_content: str, soup: BeautifulSoup) -> Tuple[List[CheckResult], bool, bool]:
+        """
+        AIを呼び出す前の機械判定（1〜4）
+        
+        Returns:
+            (機械判定の結果, 整合性の指示を軽量化する場合True, AIで誤字脱字を精査する場合True)
+        """
+        results = []
+        if not self.enabled:
+            return results, False, self.typo_enabled
 
         # 1. 外部サービス(GA4等)の非AI直接チェック
         if self.consistency_enabled:
@@ -43,11 +144,70 @@ class UnifiedAIChecker(BaseChecker):
             if ga4_res:
                 results.append(ga4_res)
 
-        # 2. AIによる統合チェック
-        ai_res_list = self._check_with_ai_unified(page_url, page_content, soup)
-        results.extend(ai_res_list)
+        # 2. NG表現の機械照合
+        if self.ng_matcher:
+            ng_res = self._check_ng_local(page_url, page_content, soup)
+            if ng_res:
+                results.append(ng_res)
 
-        return results
+        # 3. マスターデータとの整合性の機械判定
+        light_consistency = False
+        if self.consistency_engine:
+            report = self.consistency_engine.check(page_content)
+            light_consistency = report.all_passed
+            if report.findings:
+                results.append(CheckResult(
+                    page_url=page_url,
+                    check_name="詳細情報の整合性",
+                    status="error",
+                    details="\n".join(report.findings),
+                    severity=self.consistency_severity
+                ))
+
+        # 4. ローカル校正ルール（スコアが閾値未満のページはAIの誤字脱字チェックを省略）
+        include_typo = self.typo_enabled
+        if self.proofreader:
+            findings = self.proofreader.check(page_content)
+            include_typo = self.proofreader.score(findings) >= self.escalation_threshold
+            if findings:
+                results.append(CheckResult(
+                    page_url=page_url,
+                    check_name="誤字脱字",
+                    status="warning",
+                    details="\n\n".join(f.to_finding() for f in findings),
+                    severity=self.typo_severity
+                ))
+
+        return results, light_consistency, include_typo
+
+    def estimate_prompt(self, page_url: str, page_content: str, soup: BeautifulSoup) -> Tuple[int, int]:
+        """
+        AIを呼び出さずに、このページで送信するプロンプトの文字数を見積もる（実行前の見積もり用）
+        
+        ローカルの事前判定・段落キャッシュの状態を check() と同じ手順で反映する
+        
+        Returns:
+            (固定部の文字数, ページ部の文字数)。AIを呼び出さないページは (0, 0)
+        """
+        if not self.enabled or not self.ai_helper:
+            return 0, 0
+
+        _, light_consistency, include_typo = self.check_local(page_url, page_content, soup)
+        if not any([self.typo_enabled and include_typo, self.ng_enabled, self.consistency_enabled]):
+            return 0, 0
+
+        static_prompt = self._get_static_prompt(light_consistency, include_typo)
+        metadata = self._extract_metadata(soup)
+        if self.paragraph_cache:
+            paragraphs, cached, uncached, consistency_paragraphs = self._plan_paragraphs(
+                page_content, light_consistency, include_typo
+            )
+            if not (uncached or consistency_paragraphs):
+                return 0, 0
+            page_prompt = self._build_paragraph_page_prompt(page_url, metadata, uncached, consistency_paragraphs)
+        else:
+            page_prompt = self._build_page_prompt(page_url, metadata, page_content)
+        return len(static_prompt), len(page_prompt)
 
     def _check_ga4_direct(self, soup: BeautifulSoup, page_url: str) -> CheckResult:
         """GA4コードの存在と正確性をソースから直接判定"""
@@ -77,9 +237,47 @@ class UnifiedAIChecker(BaseChecker):
             )
         return None
 
-    def _check_with_ai_unified(self, page_url: str, page_content: str, soup: BeautifulSoup) -> List[CheckResult]:
-        """Geminiを使用して全項目を一括判定"""
+    def _check_ng_local(self, page_url: str, page_content: str, soup: BeautifulSoup) -> CheckResult:
+        """NG表現リストとの完全一致・活用形を形態素解析で機械判定"""
         metadata = self._extract_metadata(soup)
+        text = page_content + "\n" + "\n".join(v for v in metadata.values() if v)
+
+        findings = []
+        for match in self.ng_matcher.match(text):
+            finding = match.to_finding()
+            if finding not in findings:
+                findings.append(finding)
+        if not findings:
+            return None
+
+        return CheckResult(
+            page_url=page_url,
+            check_name="NG表現",
+            status="error",
+            details="\n".join(findings),
+            severity=self.ng_severity
+        )
+
+    def _get_static_prompt(self, light_consistency: bool = False, include_typo: bool = True,
+                           output_format: str = None) -> str:
+        """指示の組み合わせごとにプロンプト固定部を1回だけ構築して返す"""
+        key = (light_consistency, include_typo, output_format or self.output_format)
+        if key not in self._static_prompts:
+            self._static_prompts[key] = self._build_static_prompt(*key)
+        return self._static_prompts[key]
+
+    def _build_static_prompt(self, light_consistency: bool = False, include_typo: bool = True,
+                             output_format: str = "text") -> str:
+        """
+        実行中に変化しないプロンプト固定部（指示・マスターデータ・NGルール）を構築
+        
+        実行ごとに1回だけ構築し、コンテキストキャッシュ経由で全ページに再利用する
+        
+        Args:
+            light_consistency: 整合性の機械判定に全て合格したページ用の軽量版を構築する場合True
+            include_typo: 誤字脱字の指示を含める場合True（ローカル校正でAIに回さないページはFalse）
+            output_format: "json"（構造化出力）または "text"
+        """
         master_summary = json.dumps(self.master_data, ensure_ascii=False, indent=2)
         rules_text = "\n".join([f"- {r.get('bad')} ⇒ {r.get('good')}" for r in self.ng_rules])
         
@@ -90,25 +288,32 @@ class UnifiedAIChecker(BaseChecker):
 
         # 有効なチェック項目のリストを作成
         check_instructions = []
-        if self.typo_enabled:
+        if self.typo_enabled and include_typo:
             check_instructions.append("1. **誤字脱字・不自然な表現**: 文脈の誤り、タイプミス、不自然な言い回し、日付の矛盾（現在は2026年）。")
-        if self.ng_enabled:
+        if self.ng_enabled and self.ng_matcher:
+            check_instructions.append(
+                "2. **NG表現**: 以下のリストとの完全一致・活用形は機械判定済みのため指摘不要です。"
+                "ひらがな/カタカナ/漢字の表記違い、送り仮名の違い、言い換えなど、機械判定では拾えない曖昧なケースのみ検出。"
+                f"\n{rules_text}"
+            )
+        elif self.ng_enabled:
             check_instructions.append(f"2. **NG表現**: 以下のリストに該当する（またはその変形、活用形）表現を検出。\n{rules_text}")
-        if self.consistency_enabled:
+        if self.consistency_enabled and light_consistency:
+            check_instructions.append("3. **詳細情報の整合性**: 医院名・郵便番号・電話番号・所在地住所・診療時間は機械判定で問題なしのため指摘不要。経歴の矛盾のみ確認。")
+        elif self.consistency_enabled:
             check_instructions.append("3. **詳細情報の整合性**: 医院名（統一性）、郵便番号・電話番号（半角推奨）、所在地住所（全角推奨）、診療時間、経歴の矛盾。")
 
         instructions_str = "\n".join(check_instructions)
 
-        prompt = f"""あなたは歯科Webサイト制作と校正の専門家です。
-【重要】本日は **{today_str}** です。現在は **2026年** であることを認識して精査してください。
+        if output_format == "json":
+            output_str = self._json_output_instructions()
+        else:
+            output_str = self._text_output_instructions()
 
-以下の【ページ情報】を精査し、指定された【チェック項目】に基づき不備を指摘してください。
+        return f"""あなたは歯科Webサイト制作と校正の専門家です。
+【重要】本日は **{today_str}** です。現在は **2026年** であることを認識して精査してください。
 
-【ページ情報】
-URL: {page_url}
-Meta情報: {json.dumps(metadata, ensure_ascii=False, indent=2)}
-本文（抜粋）:
-{page_content[:10000]}
+この後に送信される【ページ情報】を精査し、指定された【チェック項目】に基づき不備を指摘してください。
 
 【マスターデータ (比較用)】
 {master_summary}
@@ -116,12 +321,23 @@ Meta情報: {json.dumps(metadata, ensure_ascii=False, indent=2)}
 【チェック項目】
 {instructions_str}
 
-【出力形式：厳守】
+{output_str}"""
+
+    def _text_output_instructions(self) -> str:
+        """出力形式の指示（自由記述）"""
+        # 段落キャッシュ使用時は、指摘をどの段落に由来するか特定できる形式で出力させる
+        paragraph_format = ""
+        if self.paragraph_cache_config.get("enabled", False):
+            paragraph_format = """
+- 【校正対象の段落】に由来する [誤字脱字]・[NG表現] の指摘には、項目名の前に段落番号を付けてください（例: ★ [P3] [誤字脱字]: ...）。
+- [整合性] の指摘およびMeta情報に関する指摘には段落番号を付けないでください。"""
+
+        return f"""【出力形式：厳守】
 - 指摘がある場合のみ、以下の形式で出力してください。
 - 複数の指摘がある場合は、間に必ず【空行】を1行入れてください。
 - 行頭は必ず「★」で始めてください。
 - 各指摘の冒頭に [項目名] を付けてください（[誤字脱字], [NG表現], [整合性] 等）。
-- 挨拶や前置きは【絶対に】含めないでください。
+- 挨拶や前置きは【絶対に】含めないでください。{paragraph_format}
 
 形式例：
 ★ [誤字脱字]: 「該当箇所」 → 正: 「修正案（理由）」
@@ -132,24 +348,285 @@ Meta情報: {json.dumps(metadata, ensure_ascii=False, indent=2)}
 
 不備がない場合は「問題なし」とだけ回答してください。"""
 
+    def _json_output_instructions(self) -> str:
+        """出力形式の指示（構造化出力）"""
+        paragraph_format = ""
+        if self.paragraph_cache_config.get("enabled", False):
+            paragraph_format = """
+- paragraph: 【校正対象の段落】に由来する誤字脱字・NG表現の指摘は段落番号（[P3] なら 3）、それ以外の指摘は 0"""
+
+        return f"""【出力形式：厳守】
+- 指定されたJSONスキーマに従い、findings 配列に指摘を1件ずつ格納してください。
+- category: 「誤字脱字」「NG表現」「整合性」「Meta情報」のいずれか
+- excerpt: ページ内の該当箇所（原文のまま、前後を含め最小限）
+- suggestion: 修正案（正しい表現）
+- reason: 指摘理由（簡潔に）{paragraph_format}
+- 不備がない場合は findings を空の配列にしてください。"""
+
+    def _paragraph_rule_version(self) -> str:
+        """段落の指摘結果に影響する要素からキャッシュのバージョンを算出"""
+        import datetime
+        return compute_rule_version(
+            prompt_version=PROMPT_VERSION,
+            model=self.ai_helper.model_name,
+            typo=self.typo_enabled,
+            ng=self.ng_enabled,
+            ng_rules=self.ng_rules if self.ng_enabled else [],
+            ng_local=self.ng_matcher is not None,
+            output_format=self.output_format,
+            # 「2025年開催予定」等の日付の指摘は年が変わると結果が変わる
+            year=datetime.date.today().year,
+        )
+
+    def _check_with_ai_unified(self, page_url: str, page_content: str, soup: BeautifulSoup,
+                               light_consistency: bool = False, include_typo: bool = True) -> List[CheckResult]:
+        """Geminiを使用して全項目を一括判定"""
+        if not self.ai_helper or not any([self.typo_enabled and include_typo, self.ng_enabled, self.consistency_enabled]):
+            return []
+
+        if self.paragraph_cache:
+            return self._check_with_paragraph_cache(page_url, page_content, soup, light_consistency, include_typo)
+
+        metadata = self._extract_metadata(soup)
+
+        # ページ部のみを構築（固定部はコンテキストキャッシュ済み）
+        page_prompt = self._build_page_prompt(page_url, metadata, page_content)
+
+        response = self._request_findings(page_url, page_prompt, 0, light_consistency, include_typo)
+        if response is None:
+            return []
+        return self._findings_to_results(page_url, response[0])
+
+    def _request_findings(self, page_url: str, page_prompt: str, paragraph_count: int,
+                          light_consistency: bool = False, include_typo: bool = True):
+        """
+        AIに問い合わせて指摘を取得
+        
+        構造化出力（api.output_format: json）では応答を検証して AIFinding に分解する。
+        応答がJSONとして不正な場合は、自由記述の形式で問い合わせ直す
+        
+        Args:
+            paragraph_count: ページ部に含めた番号付き段落の数（段落キャッシュ使用時）
+        
+        Returns:
+            (指摘のリスト, {段落番号: 指摘のリスト}, 構造化出力の場合True, 段落番号のない誤字脱字・NG表現の指摘の数)。
+            応答が得られない場合はNone
+            指摘は構造化出力では AIFinding、自由記述では「★」で始まる文字列
+        """
+        if self.output_format == "json":
+            static_prompt = self._get_static_prompt(light_consistency, include_typo, "json")
+            raw = self.ai_helper.check_structured(static_prompt, page_prompt, FINDINGS_SCHEMA, page_url)
+            if raw is None:
+                return None
+            try:
+                findings = parse_findings(raw, paragraph_count)
+                by_paragraph = {}
+                unattributed = 0
+                for finding in findings:
+                    if finding.paragraph and finding.category != "整合性":
+                        by_paragraph.setdefault(finding.paragraph, []).append(finding)
+                    elif finding.category in PARAGRAPH_CATEGORIES:
+                        unattributed += 1
+                return findings, by_paragraph, True, unattributed
+            except ValueError as e:
+                print(f"警告 (構造化出力): {e}。自由記述の形式で再度問い合わせます")
+
+        static_prompt = self._get_static_prompt(light_consistency, include_typo, "text")
         try:
             # AIHelper経由で取得（クリーニング処理済み）
-            ai_output = self.ai_helper.check_text(prompt, check_type="unified")
-            
-            if not ai_output or "問題なし" in ai_output:
-                return []
+            ai_output = self.ai_helper.check_with_static_prompt(static_prompt, page_prompt, page_url)
+        except (BudgetExceededError, CancelledError):
+            raise
+        except Exception as e:
+            print(f"AI統合分析エラー: {e}")
+            return None
+        if ai_output is None:
+            return None
+        findings, by_paragraph, unattributed = self._split_findings_by_paragraph(ai_output, paragraph_count)
+        return findings, by_paragraph, False, unattributed
 
-            # 項目ごとに分割して解析（簡易的に1つの結果としてまとめるが、詳細はAIに任せる）
-            return [CheckResult(
+    def _findings_to_results(self, page_url: str, findings: list) -> List[CheckResult]:
+        """
+        指摘を CheckResult に変換
+        
+        構造化出力の指摘は1件ずつ（分類を check_name とする）、自由記述の指摘は
+        「AI統合チェック」1件にまとめる
+        """
+        severities = {
+            "誤字脱字": self.typo_severity,
+            "NG表現": self.ng_severity,
+            "整合性": self.consistency_severity,
+        }
+        results = []
+        structured = {}
+        texts = []
+        for finding in findings:
+            if isinstance(finding, AIFinding):
+                structured.setdefault(finding.key(), finding)
+            else:
+                texts.append(finding)
+
+        for finding in structured.values():
+            results.append(CheckResult(
+                page_url=page_url,
+                check_name=finding.check_name,
+                status="warning",
+                details=finding.to_finding(),
+                severity=severities.get(finding.category, "medium")
+            ))
+        if texts:
+            results.append(CheckResult(
                 page_url=page_url,
                 check_name="AI統合チェック",
                 status="warning",
-                details=ai_output,
+                details="\n\n".join(dict.fromkeys(texts)),
                 severity="medium"
-            )]
-        except Exception as e:
-            print(f"AI統合分析エラー: {e}")
+            ))
+        return results
+
+    def _check_with_paragraph_cache(self, page_url: str, page_content: str, soup: BeautifulSoup,
+                                    light_consistency: bool = False, include_typo: bool = True) -> List[CheckResult]:
+        """
+        段落キャッシュを使用して判定
+        
+        キャッシュ済みの段落は保存済みの指摘を再利用し、未キャッシュの段落と
+        クリニック固有の整合性チェック用の抜粋のみをAIに送信する
+        """
+        if not self.ai_helper:
             return []
+        metadata = self._extract_metadata(soup)
+        paragraphs, cached, uncached, consistency_paragraphs = self._plan_paragraphs(
+            page_content, light_consistency, include_typo
+        )
+
+        # 構造化出力では指摘を辞書として保存している（キャッシュのバージョンに出力形式を含む）
+        findings = [
+            AIFinding.from_dict(f) if isinstance(f, dict) else f
+            for p in paragraphs if p in cached for f in cached[p]
+        ]
+
+        if uncached or consistency_paragraphs:
+            page_prompt = self._build_paragraph_page_prompt(page_url, metadata, uncached, consistency_paragraphs)
+            response = self._request_findings(page_url, page_prompt, len(uncached), light_consistency, include_typo)
+
+            if response is not None:
+                new_findings, by_paragraph, structured, unattributed = response
+                findings.extend(new_findings)
+                # AIの応答が得られ、全項目を精査した場合のみ段落ごとの指摘を保存（指摘なしも保存）
+                # 構造化出力から自由記述に切り替えた応答は、キャッシュの形式と異なるため保存しない
+                # 段落番号のない誤字脱字・NG表現の指摘がある場合は、どの段落も指摘なしとして保存しない
+                # （保存すると、段落を共有する他のクリニックでその指摘が表示されなくなるため）
+                if (include_typo or not self.typo_enabled) and structured == (self.output_format == "json") and not unattributed:
+                    self.paragraph_cache.put_many({
+                        p: [f.to_dict() if structured else f for f in by_paragraph.get(i, [])]
+                        for i, p in enumerate(uncached, start=1)
+                    })
+
+        return self._findings_to_results(page_url, findings)
+
+    def _plan_paragraphs(self, page_content: str, light_consistency: bool = False, include_typo: bool = True):
+        """
+        段落キャッシュの照会結果から、AIに送信する段落を決定
+        
+        Returns:
+            (全段落, キャッシュ済みの段落と指摘, 未キャッシュの段落, 整合性チェック用の段落)
+        """
+        paragraphs = split_paragraphs(page_content)
+        cached = self.paragraph_cache.get_many(paragraphs)
+
+        # 未キャッシュの段落（本文上限 10000 文字まで）
+        # 誤字脱字をAIに回さないページでNGチェックも無効なら、段落の校正は不要
+        proofread = (self.typo_enabled and include_typo) or self.ng_enabled
+        uncached = []
+        total_length = 0
+        for paragraph in (paragraphs if proofread else []):
+            if paragraph in cached:
+                continue
+            total_length += len(paragraph)
+            if total_length > 10000:
+                break
+            uncached.append(paragraph)
+
+        consistency_paragraphs = []
+        if self.consistency_enabled:
+            consistency_paragraphs = self._select_consistency_paragraphs(paragraphs, career_only=light_consistency)
+
+        return paragraphs, cached, uncached, consistency_paragraphs
+
+    def _build_page_prompt(self, page_url: str, metadata: dict, page_content: str) -> str:
+        """プロンプトのページ部（本文の抜粋をそのまま送信）"""
+        return f"""【ページ情報】
+URL: {page_url}
+Meta情報: {json.dumps(metadata, ensure_ascii=False, indent=2)}
+本文（抜粋）:
+{page_content[:10000]}"""
+
+    def _build_paragraph_page_prompt(self, page_url: str, metadata: dict, uncached: List[str],
+                                     consistency_paragraphs: List[str]) -> str:
+        """プロンプトのページ部（段落キャッシュ使用時、未キャッシュの段落に番号を付けて送信）"""
+        numbered = "\n".join(f"[P{i}] {p}" for i, p in enumerate(uncached, start=1))
+        return f"""【ページ情報】
+URL: {page_url}
+Meta情報: {json.dumps(metadata, ensure_ascii=False, indent=2)}
+
+【校正対象の段落】（誤字脱字・NG表現のチェック対象）
+{numbered or "（なし）"}
+
+【整合性チェック用の抜粋】（マスターデータとの照合対象）
+{chr(10).join(consistency_paragraphs) or "（なし）"}"""
+
+    def _select_consistency_paragraphs(self, paragraphs: List[str], career_only: bool = False) -> List[str]:
+        """
+        マスターデータとの照合に関わる段落（数字・医院名・住所等を含むもの）を抽出
+        
+        Args:
+            paragraphs: ページの段落リスト
+            career_only: 機械判定に全て合格したページの場合True（経歴に関わる段落のみ抽出）
+        """
+        if career_only:
+            return [p for p in paragraphs if re.search(r"(19|20)\d{2}|経歴|略歴|卒業|勤務", p)]
+
+        master_values = [
+            str(v) for k, v in self.master_data.items()
+            if v and k in ("医院名", "院長名・副院長名")
+        ]
+        selected = []
+        for paragraph in paragraphs:
+            if (re.search(r"[0-9０-９]", paragraph)
+                    or any(h in paragraph for h in CONSISTENCY_HINTS)
+                    or any(v in paragraph for v in master_values)):
+                selected.append(paragraph)
+        return selected
+
+    def _split_findings_by_paragraph(self, ai_output: str, paragraph_count: int):
+        """
+        AI応答を指摘ごとに分割し、段落番号ごとに振り分ける
+        
+        Returns:
+            (全指摘のリスト, {段落番号: 指摘のリスト}, 段落番号のない誤字脱字・NG表現の指摘の数)
+        """
+        blocks = []
+        for line in ai_output.split("\n"):
+            line = line.strip()
+            if line.startswith("★"):
+                blocks.append(line)
+            elif line and blocks:
+                blocks[-1] += "\n" + line
+
+        findings = []
+        by_paragraph = {}
+        unattributed = 0
+        for block in blocks:
+            match = re.match(r"★\s*\[P(\d+)\]\s*", block)
+            index = int(match.group(1)) if match else 0
+            if match:
+                block = "★ " + block[match.end():]
+            if 1 <= index <= paragraph_count and "[整合性]" not in block:
+                by_paragraph.setdefault(index, []).append(block)
+            elif any(f"[{category}]" in block for category in PARAGRAPH_CATEGORIES):
+                unattributed += 1
+            findings.append(block)
+        return findings, by_paragraph, unattributed
 
     def _extract_metadata(self, soup: BeautifulSoup) -> dict:
         """主要なメタデータを抽出"""
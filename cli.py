@@ -0,0 +1,215 @@
+"""
+歯科クリニック公開前チェックツール - コマンドライン版
+
+画面（app.py）と同じクローラー・チェッカーで医院のチェックを行い、Excel/JSONレポートを出力する（--batch で複数医院を一括チェック）。
+Streamlit を読み込まないため、サーバー上の定期実行や CI から利用できる。
+
+使い方:
+    python cli.py --excel DC-config.xlsx
+    python cli.py --url https://example.com/ --clinic-name "サンプル歯科医院" --phone 0776-11-2222
+    python cli.py --excel DC-config.xlsx --urls-file urls.txt --format json --output-dir reports
+    python cli.py --batch configs/ --processes 4      # ディレクトリ内の全 DC-config を一括チェック
+    python cli.py --resume 20250101-120000-a1b2c3     # 中断したチェックを再開（--list-runs で一覧）
+    python cli.py --excel DC-config.xlsx --work-queue http://192.168.0.10:8767   # 複数のPCのワーカーで分散チェック
+"""
+
+import argparse
+import os
+import signal
+import sys
+import time
+from typing import Dict, List, Optional
+
+from utils.batch import BatchRunner, discover_configs
+from utils.budget import RunBudget
+from utils.checkpoint import RunJournal
+from utils.runner import ClinicJob, ProgressReporter, count_statuses, describe_pace, load_config, resume_clinic, run_clinic, write_reports
+
+
+class ConsoleProgress(ProgressReporter):
+    """チェックの進捗を標準エラー出力に表示（interval 秒ごと。エラーは検出した時点で表示）"""
+
+    def __init__(self, interval: float = 2.0):
+        super().__init__()
+        self.interval = interval
+        self._last_printed = 0.0
+
+    def start(self, run_id: Optional[str]):
+        if run_id:
+            print(f"実行ID: {run_id}（中断した場合は --resume {run_id} で再開できます）", file=sys.stderr)
+
+    def add_results(self, results: List[Dict]):
+        super().add_results(results)
+        for r in results:
+            if r["status"] == "error":
+                details = " ".join(r["details"].split())
+                print(f"  ❌ {r['check_name']}: {r['page_url']} {details[:80]}", file=sys.stderr)
+
+    def update(self, done: int, total: int, results: List[Dict], metrics: List[Dict]):
+        rate, eta = self.pace(done, total)
+        now = time.monotonic()
+        if now - self._last_printed < self.interval and done < total:
+            return
+        self._last_printed = now
+        waiting = " ".join(f"{m['stage']}:{m['queue_depth']}" for m in metrics)
+        print(
+            f"[{done}/{total}] エラー {self.counts['error']}件 / 警告 {self.counts['warning']}件 | "
+            f"{describe_pace(rate, eta)} | 待ち {waiting}",
+            file=sys.stderr
+        )
+
+    def finish(self, metrics: List[Dict]):
+        super().finish(metrics)
+        for m in metrics:
+            print(
+                f"  {m['stage']}: {m['processed']}件 ({m['throughput']:.2f}件/秒, 稼働率 {m['utilization']:.0%}, {m['workers']}ワーカー)",
+                file=sys.stderr
+            )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="クリニック公開前チェック（コマンドライン版）")
+    source = parser.add_argument_group("チェック対象（--excel、--url と --clinic-name、--batch、または --resume）")
+    source.add_argument("--excel", help="DC-config.xlsx のパス")
+    source.add_argument("--no-sync", action="store_true", help="Excelのシート間の同期（ファイルの上書き保存）を行わない")
+    source.add_argument("--url", help="サイトのURL（--excel の指定より優先）")
+    source.add_argument("--clinic-name", help="医院名（--excel の指定より優先）")
+    source.add_argument("--phone", help="正しい電話番号（--excel の指定より優先）")
+    source.add_argument("--urls-file", help="チェック対象URLの一覧（1行1URL。省略時はサイトを巡回して収集）")
+    source.add_argument("--batch", help="一括チェック: DC-config.xlsx を置いたディレクトリ、または一覧ファイル（1行1パス）")
+    source.add_argument("--resume", metavar="RUN_ID", help="中断したチェックを実行IDを指定して再開（記録済みの結果は再利用）")
+    source.add_argument("--list-runs", action="store_true", help="再開できる（完了していない）チェックの一覧を表示")
+    parser.add_argument("--processes", type=int, help="一括チェックで同時にチェックする医院数（省略時は batch.processes）")
+    parser.add_argument("--config", help="設定ファイル（省略時は config.yaml）")
+    parser.add_argument("--work-queue", help="分散チェックの待ち行列（ブローカーのURL、または SQLite ファイルのパス。省略時は distributed.queue）")
+    parser.add_argument("--output-dir", default="reports", help="レポートの出力先（既定: reports）")
+    parser.add_argument("--format", nargs="+", choices=["xlsx", "json"], default=["xlsx", "json"], help="レポートの形式")
+    parser.add_argument("--max-tokens", type=int, help="トークン数の上限（0 は無制限）")
+    parser.add_argument("--max-ai-calls", type=int, help="AI呼び出し回数の上限（0 は無制限）")
+    parser.add_argument("--max-minutes", type=float, help="実行時間の上限（分。0 は無制限。超えた時点で打ち切り、未チェックのページを記録したレポートを出力）")
+    parser.add_argument("--fail-on-error", action="store_true", help="エラーの指摘がある場合に終了コード 2 を返す")
+    parser.add_argument("--quiet", action="store_true", help="進捗を表示しない")
+    args = parser.parse_args(argv)
+    if not args.batch and not args.resume and not args.list_runs and not args.excel and not (args.url and args.clinic_name):
+        parser.error("--excel、--url と --clinic-name、--batch、または --resume を指定してください")
+    return args
+
+
+def build_job(args) -> ClinicJob:
+    """引数からチェック条件を作成"""
+    urls = None
+    if args.urls_file:
+        with open(args.urls_file, "r", encoding="utf-8") as f:
+            urls = [line.strip() for line in f if line.strip()]
+
+    if args.excel:
+        job = ClinicJob.from_excel(args.excel, sync=not args.no_sync, urls=urls)
+    else:
+        job = ClinicJob(args.clinic_name, args.url, urls=urls)
+    if args.url:
+        job.url = args.url
+    if args.clinic_name:
+        job.clinic_name = args.clinic_name
+    if args.phone:
+        job.correct_phone = args.phone
+    return job
+
+
+def build_budget(args, config: Dict) -> RunBudget:
+    """設定ファイルの予算に引数の指定を上書き"""
+    budget = RunBudget.from_config(config)
+    if args.max_tokens is not None:
+        budget.max_tokens = args.max_tokens
+    if args.max_ai_calls is not None:
+        budget.max_ai_calls = args.max_ai_calls
+    if args.max_minutes is not None:
+        budget.max_seconds = args.max_minutes * 60
+    return budget
+
+
+def run_batch(args, config: Dict, auth_id: str, auth_pass: str) -> int:
+    """一括チェック（医院ごとのレポートと集計表を出力）"""
+    paths = discover_configs(args.batch)
+    if not paths:
+        print(f"エラー: DC-config.xlsx が見つかりません: {args.batch}", file=sys.stderr)
+        return 1
+
+    runner = BatchRunner(config, args.output_dir, tuple(args.format), auth_id, auth_pass)
+    if args.processes:
+        runner.processes = args.processes
+    print(f"{len(paths)}医院を {min(runner.processes, len(paths))}プロセスでチェックします", file=sys.stderr)
+
+    def on_done(summary):
+        status = f"失敗: {summary['failure']}" if summary["failure"] else f"エラー {summary['errors']}件 / 警告 {summary['warnings']}件"
+        print(f"  {summary['clinic_name']}: {summary['pages']}ページ / {status}（{summary['elapsed']:.0f}秒）", file=sys.stderr)
+
+    result = runner.run(paths, on_done=on_done)
+    print(runner.write_summary(result))
+    failed = sum(1 for s in result["clinics"] if s["failure"])
+    print(
+        f"合計: {len(paths)}医院 / {result['pages']}ページ / {result['elapsed'] / 60:.1f}分 "
+        f"（{result['pages_per_minute']:.1f} ページ/分）/ 失敗 {failed}医院",
+        file=sys.stderr
+    )
+    if failed:
+        return 1
+    return 2 if args.fail_on_error and any(s["errors"] for s in result["clinics"]) else 0
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    config = load_config(args.config)
+    if args.work_queue:
+        config["distributed"] = dict(config.get("distributed") or {}, queue=args.work_queue)
+    # Basic認証情報は環境変数から取得（画面版の Secrets に相当）
+    auth_id = os.environ.get("BASIC_AUTH_ID", "")
+    auth_pass = os.environ.get("BASIC_AUTH_PASS", "")
+    if args.list_runs:
+        for run in RunJournal.list_runs(config):
+            created = time.strftime("%Y-%m-%d %H:%M", time.localtime(run["created"]))
+            print(f"{run['run_id']}\t{created}\t{run['clinic_name']}\t{run['done']}/{run['pages']}ページ完了")
+        return 0
+    if args.batch:
+        return run_batch(args, config, auth_id, auth_pass)
+
+    progress = ProgressReporter() if args.quiet else ConsoleProgress()
+    budget = build_budget(args, config)
+
+    def interrupt(signum, frame):
+        # 1回目の Ctrl+C はチェックを中止してそれまでの結果でレポートを出力（2回目で強制終了）
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        budget.cancel_token.cancel("Ctrl+C で中止した")
+        print("中止しています（それまでの結果でレポートを出力します。強制終了する場合はもう一度 Ctrl+C）", file=sys.stderr)
+    signal.signal(signal.SIGINT, interrupt)
+
+    try:
+        if args.resume:
+            report = resume_clinic(args.resume, config, auth_id, auth_pass, budget=budget, progress=progress)
+        else:
+            report = run_clinic(build_job(args), config, auth_id, auth_pass, budget=budget, progress=progress)
+    except (OSError, ValueError) as e:
+        print(f"エラー: {e}", file=sys.stderr)
+        return 1
+    if not report["checked_urls"]:
+        if not report["interrupted"]:
+            print("エラー: 有効なページ情報を取得できませんでした", file=sys.stderr)
+        return 1
+
+    for path in write_reports(report, config, args.output_dir, tuple(args.format)):
+        print(path)
+
+    counts = count_statuses(report["results"])
+    error_count, warning_count = counts["error"], counts["warning"]
+    print(
+        f"{report['clinic_name']}: {len(report['checked_urls'])}ページ / エラー {error_count}件 / 警告 {warning_count}件 "
+        f"（{report['elapsed']:.0f}秒）",
+        file=sys.stderr
+    )
+    if report["interrupted"]:
+        resume = f"。--resume {report['run_id']} で残りをチェックできます" if report["run_id"] else ""
+        print(f"警告: {report['interrupted']}ため、未チェックのページがあります{resume}", file=sys.stderr)
+    return 2 if args.fail_on_error and error_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+AIチェックのスループット計測
+
+LLMモックサーバーを起動し、UnifiedAIChecker を並列実行してページ/秒と
+ページあたりの処理時間を計測する。ネットワーク・APIキーは不要。
+
+使い方:
+    python scripts/bench_ai_throughput.py --pages 100 --workers 5 --latency 1.0 --error-rate 0.05
+"""
+
+import argparse
+import concurrent.futures
+import os
+import statistics
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+# プロジェクトルートをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkers import UnifiedAIChecker
+from utils.mock_llm_server import MockLLMSettings, start_server
+
+SAMPLE_HTML = "<html><head><title>サンプル歯科医院 {n}</title></head><body></body></html>"
+SAMPLE_TEXT = """サンプル歯科医院
+ページ {n}
+当院ではインプラント治療を行っています。
+お電話でのご予約は 0776-11-2222 まで。
+診療時間
+9:00～12:30
+14:00～18:00
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AIチェックのスループット計測（モックサーバー使用）")
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=1.0, help="モックの平均遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.2, help="モックの遅延のばらつき（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    settings = MockLLMSettings(args.latency, args.jitter, args.error_rate, seed=0)
+    server = start_server(settings, port=0)
+    port = server.server_address[1]
+
+    config = {
+        "api": {"backend": "mock", "mock": {"url": f"http://127.0.0.1:{port}/generate"}},
+        # 毎回AIを呼び出すよう段落キャッシュは無効化
+        "cache": {"paragraph": {"enabled": False}},
+    }
+    master_data = {"医院名": "サンプル歯科医院", "電話番号": "0776-11-2222", "診療時間": "9:00～12:30 / 14:00～18:00"}
+    checker = UnifiedAIChecker(config, master_data=master_data, ng_rules=[{"bad": "諦める", "good": "あきらめる"}])
+
+    def check_page(n):
+        start = time.perf_counter()
+        soup = BeautifulSoup(SAMPLE_HTML.format(n=n), "html.parser")
+        checker.check(f"https://example.com/page{n}/", SAMPLE_TEXT.format(n=n), soup)
+        return time.perf_counter() - start
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as executor:
+        durations = list(executor.map(check_page, range(args.pages)))
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    durations.sort()
+    p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+    print(f"ページ数: {args.pages} / 並列数: {args.workers}")
+    print(f"所要時間: {elapsed:.2f}秒 ({args.pages / elapsed:.2f} ページ/秒)")
+    print(f"ページあたり: 中央値 {statistics.median(durations):.2f}秒 / p95 {p95:.2f}秒")
+    print(f"モックへのリクエスト: {settings.request_count}件 (エラー {settings.error_count}件)")
+
+
+if __name__ == "__main__":
+    main()
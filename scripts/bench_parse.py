@@ -0,0 +1,86 @@
+"""
+HTML解析のスループット計測
+
+合成したHTMLを、スレッドのみで解析した場合とプロセスプール（crawler.parse_processes）で
+解析した場合のページ/秒を比較する。解析はCPU処理のため、スレッドでは GIL により並列化されない。
+ネットワーク・APIキーは不要。
+
+使い方:
+    python scripts/bench_parse.py --pages 200 --threads 8 --processes 4
+"""
+
+import argparse
+import concurrent.futures
+import os
+import pickle
+import sys
+import time
+
+# プロジェクトルートをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.crawler import WebCrawler
+
+SECTION_HTML = """
+<section class="section section-{n}">
+  <div class="container"><div class="row"><div class="col">
+    <h2 class="title">診療内容 {n}</h2>
+    <p>当院では患者様一人ひとりに合わせた治療計画をご提案しています。痛みの少ない治療を心がけ、
+    丁寧なカウンセリングを行っております。お気軽にご相談ください。</p>
+    <ul class="menu"><li><a href="/treatment/{n}/">詳しく見る</a></li><li><a href="tel:0776-11-2222">お電話</a></li></ul>
+    <img src="/img/{n}.jpg" alt="診療風景 {n}">
+  </div></div></div>
+</section>
+"""
+
+PAGE_HTML = """<html><head><title>サンプル歯科医院 ページ{n}</title>
+<meta name="description" content="サンプル歯科医院のページ{n}です">
+<script async src="https://www.googletagmanager.com/gtag/js?id=G-ABCDE12345"></script>
+<style>.section {{ margin: 0; }}</style></head>
+<body><header class="header"><nav>{nav}</nav></header><main>{sections}</main>
+<footer class="footer"><p>〒000-0000 サンプル県サンプル市1-2-3 TEL 0776-11-2222</p></footer></body></html>
+"""
+
+
+def build_page(n: int, sections: int) -> str:
+    nav = "".join(f'<a href="/page{i}/">ページ{i}</a>' for i in range(20))
+    return PAGE_HTML.format(n=n, nav=nav, sections="".join(SECTION_HTML.format(n=i) for i in range(sections)))
+
+
+def run(crawler: WebCrawler, pages: list, threads: int) -> float:
+    """全ページを解析し、所要時間（秒）を返す"""
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda item: crawler.parse_page(*item), pages))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML解析のスループット計測（スレッド / プロセスプール）")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--sections", type=int, default=60, help="1ページあたりのセクション数（HTMLの大きさ）")
+    parser.add_argument("--threads", type=int, default=8, help="解析を呼び出すスレッド数（pipeline.workers.parse）")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="解析プロセス数（crawler.parse_processes）")
+    args = parser.parse_args()
+
+    pages = [(f"https://example.com/page{n}/", build_page(n, args.sections)) for n in range(args.pages)]
+    html_bytes = sum(len(html.encode("utf-8")) for _, html in pages) / len(pages)
+
+    thread_crawler = WebCrawler({})
+    thread_seconds = run(thread_crawler, pages, args.threads)
+
+    process_crawler = WebCrawler({"crawler": {"parse_processes": args.processes}})
+    # プロセスの起動時間を計測に含めないよう、先に1ページ解析しておく
+    process_crawler.parse_page(*pages[0])
+    process_seconds = run(process_crawler, pages, args.threads)
+    facts_bytes = len(pickle.dumps(process_crawler.parse_page(*pages[0])))
+    process_crawler.close()
+
+    print(f"ページ数: {args.pages} / HTML: 平均 {html_bytes / 1024:.0f}KB / CPUコア数: {os.cpu_count()}")
+    print(f"スレッドのみ ({args.threads}スレッド): {thread_seconds:.2f}秒 ({args.pages / thread_seconds:.1f} ページ/秒)")
+    print(f"プロセスプール ({args.processes}プロセス): {process_seconds:.2f}秒 ({args.pages / process_seconds:.1f} ページ/秒)")
+    print(f"速度比: {thread_seconds / process_seconds:.2f}倍 / プロセス間で受け渡すデータ: 1ページあたり {facts_bytes / 1024:.1f}KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+サイト共通の指摘の集約
+
+フッター・ヘッダー等の共通部分にある誤りは全ページで同じ指摘になるため、
+チェック項目ごとに内容が同じ指摘をまとめ、「サイト全体」の1行に集約する。
+ページ固有の指摘はページごとの行に残す。
+"""
+
+import re
+import unicodedata
+from typing import Dict, List
+
+# 詳細が「★」で始まる独立した指摘の並びになっているチェック項目（指摘単位で集約する）
+SPLITTABLE_CHECKS = {"誤字脱字", "NG表現", "詳細情報の整合性", "AI統合チェック"}
+
+# ページ単位の状態を表すチェック項目（中断したページの「未チェック」等。集約せずページごとの行に残す）
+PER_PAGE_CHECKS = {"未チェック"}
+
+SITE_WIDE_LABEL = "サイト全体"
+
+
+def normalize_details(text: str) -> str:
+    """比較用に指摘を正規化（全角・半角の統一、空白の除去）"""
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", text))
+
+
+def split_findings(details: str) -> List[str]:
+    """詳細を「★」で始まる指摘ごとに分割（継続行は直前の指摘に含める）"""
+    blocks = []
+    for line in details.split("\n"):
+        stripped = line.strip()
+        if stripped.startswith("★") or not blocks:
+            blocks.append(stripped)
+        elif stripped:
+            blocks[-1] += "\n" + stripped
+    return [b for b in blocks if b]
+
+
+class FindingAggregator:
+    """チェック結果のうち、複数ページに共通する指摘をサイト全体の行に集約する"""
+
+    def __init__(self, config: Dict):
+        """
+        Args:
+            config: 設定辞書（output.aggregation を参照）
+        """
+        aggregation_config = config.get("output", {}).get("aggregation", {})
+        self.enabled = aggregation_config.get("enabled", True)
+        # このページ数以上で同じ指摘があればサイト全体の指摘とみなす
+        self.min_pages = max(2, aggregation_config.get("min_pages", 3))
+        # 対象ページをすべて列挙する上限（超える場合は件数と一部のページのみ記載）
+        self.list_limit = aggregation_config.get("list_limit", 10)
+        self.sample_size = aggregation_config.get("sample_size", 5)
+
+    def aggregate(self, results: List[Dict]) -> List[Dict]:
+        """
+        チェック結果を集約
+
+        Args:
+            results: CheckResult.to_dict() のリスト
+
+        Returns:
+            サイト全体の行を先頭に、ページごとの行（共通の指摘を除いたもの）を続けたリスト
+        """
+        if not self.enabled:
+            return results
+
+        # 1. 指摘単位に分解し、(チェック項目, 結果, 正規化した指摘) ごとに出現ページを数える
+        units_by_row = []
+        pages_by_key: Dict[tuple, List[str]] = {}
+        first_unit: Dict[tuple, tuple] = {}
+        for result in results:
+            if result["status"] == "ok" or result["check_name"] in PER_PAGE_CHECKS:
+                units_by_row.append(None)
+                continue
+            if result["check_name"] in SPLITTABLE_CHECKS:
+                units = split_findings(result["details"])
+            else:
+                units = [result["details"]]
+            keyed = []
+            for unit in units:
+                key = (result["check_name"], result["status"], normalize_details(unit))
+                pages = pages_by_key.setdefault(key, [])
+                if result["page_url"] not in pages:
+                    pages.append(result["page_url"])
+                first_unit.setdefault(key, (unit, result))
+                keyed.append((key, unit))
+            units_by_row.append(keyed)
+
+        site_wide = {key for key, pages in pages_by_key.items() if len(pages) >= self.min_pages}
+        if not site_wide:
+            return results
+
+        # 2. サイト全体の行（最初に出現した順）
+        aggregated = []
+        for key in first_unit:
+            if key not in site_wide:
+                continue
+            unit, result = first_unit[key]
+            pages = pages_by_key[key]
+            aggregated.append({
+                "page_url": f"{SITE_WIDE_LABEL}（{len(pages)}ページ）",
+                "check_name": result["check_name"],
+                "status": result["status"],
+                "details": f"{unit}\n\n{self._describe_pages(pages)}",
+                "severity": result["severity"],
+                "affected_pages": pages,
+            })
+
+        # 3. ページごとの行（サイト全体に集約した指摘を除く。残りがなければ行ごと省略）
+        for result, keyed in zip(results, units_by_row):
+            if keyed is None:
+                aggregated.append(result)
+                continue
+            remaining = [unit for key, unit in keyed if key not in site_wide]
+            if len(remaining) == len(keyed):
+                aggregated.append(result)
+            elif remaining:
+                aggregated.append(dict(result, details="\n\n".join(remaining)))
+        return aggregated
+
+    def _describe_pages(self, pages: List[str]) -> str:
+        """対象ページの一覧（多い場合は件数と一部のみ）"""
+        if len(pages) <= self.list_limit:
+            return f"対象ページ（{len(pages)}件）:\n" + "\n".join(pages)
+        sample = "\n".join(pages[:self.sample_size])
+        return f"対象ページ（{len(pages)}件、うち{self.sample_size}件を表示）:\n{sample}\n他{len(pages) - self.sample_size}ページ"
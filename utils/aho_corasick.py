@@ -0,0 +1,76 @@
+"""
+Aho-Corasick法による複数パターン一括照合
+
+文字列（文字の並び）や形態素の基本形の並びなど、任意の系列に対して
+登録した全パターンを1回の走査で検出する
+"""
+
+from collections import deque
+from typing import Any, Hashable, Iterator, List, Sequence, Tuple
+
+
+class AhoCorasick:
+    """複数パターンを同時に照合するオートマトン"""
+
+    def __init__(self):
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, Any]]] = [[]]
+        self._built = False
+
+    def add(self, pattern: Sequence[Hashable], value: Any):
+        """
+        パターンを登録
+
+        Args:
+            pattern: パターン（文字列、または基本形のリストなど）
+            value: 照合時に返す値
+        """
+        if not pattern:
+            return
+        state = 0
+        for symbol in pattern:
+            next_state = self._goto[state].get(symbol)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[state][symbol] = next_state
+            state = next_state
+        self._out[state].append((len(pattern), value))
+        self._built = False
+
+    def build(self):
+        """失敗遷移を構築（パターン登録後、照合前に1回呼び出す）"""
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for symbol, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and symbol not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(symbol, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+        self._built = True
+
+    def iter_matches(self, sequence: Sequence[Hashable]) -> Iterator[Tuple[int, int, Any]]:
+        """
+        系列を1回走査して全パターンの出現を列挙
+
+        Yields:
+            (開始位置, 終了位置（含まない）, 登録時の値)
+        """
+        if not self._built:
+            self.build()
+        state = 0
+        for i, symbol in enumerate(sequence):
+            while state and symbol not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(symbol, 0)
+            for length, value in self._out[state]:
+                yield i + 1 - length, i + 1, value
@@ -0,0 +1,122 @@
+"""
+AI指摘の構造化出力
+
+統合AIチェックの応答を JSON（レスポンススキーマ指定）で受け取り、
+指摘ごとの項目（分類・該当箇所・修正案・理由）に分解・検証する
+"""
+
+import json
+import re
+from typing import Dict, List, Optional
+
+# 分類 → CheckResult の check_name
+CATEGORIES = {
+    "誤字脱字": "誤字脱字",
+    "NG表現": "NG表現",
+    "整合性": "詳細情報の整合性",
+    "Meta情報": "Meta情報",
+}
+
+# モデルに指定するレスポンススキーマ（OpenAPI 形式のサブセット）
+FINDINGS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "findings": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "category": {"type": "string", "description": "誤字脱字 / NG表現 / 整合性 / Meta情報 のいずれか"},
+                    "excerpt": {"type": "string", "description": "ページ内の該当箇所（原文のまま）"},
+                    "suggestion": {"type": "string", "description": "修正案"},
+                    "reason": {"type": "string", "description": "指摘理由"},
+                    "paragraph": {"type": "integer", "description": "指摘が由来する段落番号（段落番号がない場合は0）"},
+                },
+                "required": ["category", "excerpt", "suggestion", "reason"],
+            },
+        },
+    },
+    "required": ["findings"],
+}
+
+
+class AIFinding:
+    """AIによる指摘1件"""
+
+    def __init__(self, category: str, excerpt: str, suggestion: str, reason: str = "", paragraph: Optional[int] = None):
+        """
+        Args:
+            category: 分類（CATEGORIES のキー）
+            excerpt: 該当箇所
+            suggestion: 修正案
+            reason: 指摘理由
+            paragraph: 由来する段落番号（段落キャッシュ使用時のみ）
+        """
+        self.category = category
+        self.excerpt = excerpt
+        self.suggestion = suggestion
+        self.reason = reason
+        self.paragraph = paragraph
+
+    @property
+    def check_name(self) -> str:
+        return CATEGORIES.get(self.category, self.category)
+
+    def key(self) -> tuple:
+        """重複判定のキー（段落番号は含まない）"""
+        return (self.category, self.excerpt, self.suggestion)
+
+    def to_finding(self) -> str:
+        """レポートに記載する形式に変換"""
+        reason = f"（{self.reason}）" if self.reason else ""
+        return f"★ [{self.category}]: 「{self.excerpt}」 → 「{self.suggestion}{reason}」"
+
+    def to_dict(self) -> Dict:
+        """段落キャッシュへの保存用（段落番号は保存しない）"""
+        return {"category": self.category, "excerpt": self.excerpt, "suggestion": self.suggestion, "reason": self.reason}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "AIFinding":
+        return cls(data["category"], data["excerpt"], data["suggestion"], data.get("reason", ""))
+
+
+def parse_findings(text: str, paragraph_count: int = 0) -> List[AIFinding]:
+    """
+    構造化出力の応答を検証して指摘のリストに変換
+
+    項目が欠けている指摘・未知の分類の指摘は除外する
+
+    Args:
+        text: モデルの応答（JSON）
+        paragraph_count: 送信した段落数（範囲外の段落番号は無視）
+
+    Returns:
+        指摘のリスト
+
+    Raises:
+        ValueError: 応答が JSON として解釈できない、または findings がない場合
+    """
+    # スキーマ非対応のバックエンドでコードブロックに包まれて返る場合に対応
+    stripped = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip())
+    try:
+        data = json.loads(stripped)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"AIの応答がJSONではありません: {e}")
+    if not isinstance(data, dict) or not isinstance(data.get("findings"), list):
+        raise ValueError("AIの応答に findings がありません")
+
+    findings = []
+    for item in data["findings"]:
+        if not isinstance(item, dict):
+            continue
+        category = item.get("category")
+        excerpt = item.get("excerpt")
+        suggestion = item.get("suggestion")
+        if category not in CATEGORIES or not isinstance(excerpt, str) or not isinstance(suggestion, str) or not excerpt:
+            print(f"警告 (AI指摘の検証): 不正な指摘を除外しました: {item}")
+            continue
+        paragraph = item.get("paragraph")
+        if not isinstance(paragraph, int) or not 1 <= paragraph <= paragraph_count:
+            paragraph = None
+        findings.append(AIFinding(category, excerpt, suggestion, str(item.get("reason") or ""), paragraph))
+    return findings
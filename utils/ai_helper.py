@@ -1,73 +1,186 @@
 """
-Claude API連携ヘルパー
+AI連携ヘルパー
 
-Claude APIを使用したテキスト分析機能を提供
+LLMバックエンド（Gemini API / ローカルのモックサーバー）を使用したテキスト分析機能を提供
 """
 
-import os
-import streamlit as st
-from typing import Optional
-import google.generativeai as genai
+import time
+from typing import Callable, Dict, Optional
+
+from utils.ai_metrics import AIUsageTracker
+from utils.budget import BudgetExceededError, CancelledError, RunBudget
+from utils.cassette import CassetteMissError
+from utils.limits import shared_limits
+from utils.llm_backends import LLMResponse, create_backend
+
+# 再試行しても結果が変わらないエラー（カセットの未記録・APIキー未設定・応答の形式の不正・予算超過・中断）
+NON_RETRYABLE_ERRORS = (CassetteMissError, ValueError, BudgetExceededError, CancelledError)
 
 
 class AIHelper:
-    """Gemini APIを使用したAI支援機能"""
+    """LLMバックエンドを使用したAI支援機能"""
     
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, usage_tracker: Optional[AIUsageTracker] = None, caller: str = "AIHelper",
+                 budget: Optional[RunBudget] = None):
         """
         Args:
             config: 設定辞書
+            usage_tracker: AI呼び出しの記録先（省略時は記録しない）
+            caller: 記録に使用する呼び出し元チェッカー名
+            budget: 実行予算（省略時は無制限）
+        
+        Raises:
+            ValueError: APIキーが見つからない、またはバックエンドの指定が不正な場合
         """
         self.config = config
+        self.backend = create_backend(config)
+        self.model_name = self.backend.model_name
+        self.usage_tracker = usage_tracker
+        self.caller = caller
+        self.budget = budget
         api_config = config.get("api", {})
+        self.max_retries = api_config.get("max_retries", 0)
+        self.retry_backoff = api_config.get("retry_backoff", 1.0)
+    
+    def _call(self, request: Callable[[], LLMResponse], page_url: str = "", prompt_chars: int = 0) -> LLMResponse:
+        """
+        モデルを呼び出し、トークン数・処理時間・リトライ回数を記録
+        
+        失敗時は api.max_retries 回まで待機時間を倍にしながら再試行する（NON_RETRYABLE_ERRORS は再試行しない）
+        
+        Raises:
+            BudgetExceededError: 実行予算の上限に達している場合（モデルは呼び出さない）
+            CancelledError: 実行が中断された場合（呼び出し前・再試行の待機中）
+            Exception: 全ての試行に失敗した場合、最後のエラー
+        """
+        if self.budget:
+            self.budget.cancel_token.check()
+            self.budget.acquire_ai_call()
+        start = time.perf_counter()
+        retries = 0
+        while True:
+            try:
+                # バッチ実行時は全プロセス合計の同時呼び出し数を制限
+                with shared_limits().ai_slot():
+                    response = request()
+                break
+            except NON_RETRYABLE_ERRORS:
+                self._record(page_url, start, retries, None, prompt_chars)
+                raise
+            except Exception:
+                if retries >= self.max_retries:
+                    self._record(page_url, start, retries, None, prompt_chars)
+                    raise
+                if self.budget:
+                    if self.budget.cancel_token.wait(self.retry_backoff * (2 ** retries)):
+                        self._record(page_url, start, retries, None, prompt_chars)
+                        self.budget.cancel_token.check()
+                else:
+                    time.sleep(self.retry_backoff * (2 ** retries))
+                retries += 1
+        
+        self._record(page_url, start, retries, response, prompt_chars)
+        if self.budget:
+            # トークン数が返されないバックエンドでは文字数で代用
+            self.budget.add_tokens((response.prompt_tokens or prompt_chars) + (response.response_tokens or 0))
+        return response
+    
+    def close(self):
+        """実行の終了時に呼び出す（モデル側に作成したコンテキストキャッシュ等を削除）"""
+        self.backend.close()
+    
+    def _record(self, page_url: str, start: float, retries: int, response: Optional[LLMResponse], prompt_chars: int = 0):
+        """AI呼び出し1回分を usage_tracker に記録"""
+        if not self.usage_tracker:
+            return
+        self.usage_tracker.record(
+            caller=self.caller,
+            page_url=page_url,
+            latency=time.perf_counter() - start,
+            success=response is not None,
+            retries=retries,
+            prompt_tokens=response.prompt_tokens if response else None,
+            response_tokens=response.response_tokens if response else None,
+            cached_tokens=response.cached_tokens if response else None,
+            prompt_chars=prompt_chars
+        )
+    
+    def generate(self, prompt: str, page_url: str = "") -> str:
+        """
+        プロンプトをそのまま送信し、応答テキストを返す（クリーニングなし）
+        
+        Raises:
+            Exception: バックエンドでのエラー
+        """
+        return self._call(lambda: self.backend.generate(prompt), page_url, len(prompt)).text
+    
+    def check_with_static_prompt(self, static_prompt: str, page_prompt: str, page_url: str = "") -> Optional[str]:
+        """
+        固定部（実行中不変）とページ部に分けてAIでチェック
         
-        # APIキーの取得候補
-        key_names = ["GEMINI_API_KEY", "GOOGLE_API_KEY"]
-        api_key = None
+        固定部はコンテキストキャッシュに載せ、リクエストごとにはページ部のみを送信する
+        
+        Args:
+            static_prompt: 指示・マスターデータ・NGルールなど実行中に変化しない部分
+            page_prompt: ページ固有の部分
+            page_url: 記録用の対象ページURL
+        
+        Returns:
+            AIの分析結果、エラー時はNone
         
-        # 1. st.secrets から取得
+        Raises:
+            BudgetExceededError: 実行予算の上限に達している場合
+            CancelledError: 実行が中断された場合
+        """
         try:
-            for kn in key_names:
-                if kn in st.secrets:
-                    api_key = st.secrets[kn]
-                    break
-            
-            # セクション分けされている場合([gemini] api_key = "...")
-            if not api_key:
-                if "gemini" in st.secrets and "api_key" in st.secrets["gemini"]:
-                    api_key = st.secrets["gemini"]["api_key"]
-                elif "google" in st.secrets and "api_key" in st.secrets["google"]:
-                    api_key = st.secrets["google"]["api_key"]
-        except Exception:
-            # st.secrets が使えない環境（通常実行時など）
-            pass
-            
-        # 2. 環境変数 から取得
-        if not api_key:
-            for kn in key_names:
-                api_key = os.environ.get(kn)
-                if api_key:
-                    break
-            
-        if not api_key:
-            raise ValueError(
-                "Gemini APIキーが見つかりません。\n"
-                "以下のいずれかを設定してください：\n"
-                "1. Streamlit Secrets (GEMINI_API_KEY または GOOGLE_API_KEY)\n"
-                "2. 環境変数 (GEMINI_API_KEY または GOOGLE_API_KEY)"
+            response = self._call(
+                lambda: self.backend.generate_with_prefix(static_prompt, page_prompt),
+                page_url,
+                len(static_prompt) + len(page_prompt)
             )
+            return self._cleanup_ai_response(response.text)
+        
+        except (BudgetExceededError, CancelledError):
+            raise
+        except Exception as e:
+            print(f"AI分析エラー: {e}")
+            return None
+    
+    def check_structured(self, static_prompt: str, page_prompt: str, response_schema: Dict, page_url: str = "") -> Optional[str]:
+        """
+        check_with_static_prompt の構造化出力版（レスポンススキーマに従う JSON を応答させる）
         
-        genai.configure(api_key=api_key)
-        self.model_name = api_config.get("model", "gemini-2.0-flash")
-        self.model = genai.GenerativeModel(self.model_name)
+        応答の検証・解析は呼び出し側で行う（クリーニング処理は行わない）
+        
+        Returns:
+            AIの応答（JSON文字列）、エラー時はNone
+        
+        Raises:
+            BudgetExceededError: 実行予算の上限に達している場合
+            CancelledError: 実行が中断された場合
+        """
+        try:
+            response = self._call(
+                lambda: self.backend.generate_with_prefix(static_prompt, page_prompt, response_schema),
+                page_url,
+                len(static_prompt) + len(page_prompt)
+            )
+            return response.text
+        
+        except (BudgetExceededError, CancelledError):
+            raise
+        except Exception as e:
+            print(f"AI分析エラー: {e}")
+            return None
     
-    def check_text(self, text: str, check_type: str = "typo") -> Optional[str]:
+    def check_text(self, text: str, check_type: str = "typo", page_url: str = "") -> Optional[str]:
         """
         テキストをAIでチェック
         
         Args:
             text: チェック対象のテキスト
             check_type: チェックタイプ ("typo", "natural", "consistency"など)
+            page_url: 記録用の対象ページURL
         
         Returns:
             AIの分析結果、エラー時はNone
@@ -76,7 +189,7 @@ class AIHelper:
             # チェックタイプに応じたプロンプトを生成
             prompt = self._get_prompt(text, check_type)
             
-            response = self.model.generate_content(prompt)
+            response = self._call(lambda: self.backend.generate(prompt), page_url, len(prompt))
             return self._cleanup_ai_response(response.text)
         
         except Exception as e:
@@ -0,0 +1,141 @@
+"""
+AI呼び出しの計測
+
+モデル呼び出しごとのトークン数（usage_metadata）、処理時間、リトライ回数、
+呼び出し元チェッカーを記録し、実行単位で集計する
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+
+def percentile(values: List[float], ratio: float) -> float:
+    """パーセンタイル値（最近傍法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(ratio * len(ordered))) - 1))
+    return ordered[index]
+
+
+class AIUsageTracker:
+    """1回の実行におけるAI呼び出しの記録・集計（スレッドセーフ）"""
+
+    def __init__(self, config: Optional[Dict] = None):
+        """
+        Args:
+            config: 設定辞書（api.pricing から概算費用の単価を取得）
+        """
+        pricing = (config or {}).get("api", {}).get("pricing", {})
+        self.input_price = pricing.get("input_per_million", 0.0)
+        self.output_price = pricing.get("output_per_million", 0.0)
+        self.cached_price = pricing.get("cached_input_per_million", self.input_price)
+        self.currency = pricing.get("currency", "USD")
+        self.records: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        caller: str,
+        page_url: str,
+        latency: float,
+        success: bool,
+        retries: int = 0,
+        prompt_tokens: Optional[int] = None,
+        response_tokens: Optional[int] = None,
+        cached_tokens: Optional[int] = None,
+        prompt_chars: int = 0
+    ):
+        """
+        AI呼び出し1回分を記録
+
+        Args:
+            caller: 呼び出し元チェッカー名
+            page_url: 対象ページのURL
+            latency: 処理時間（秒、リトライを含む）
+            success: 応答を取得できた場合True
+            retries: リトライ回数
+            prompt_tokens: 入力トークン数（キャッシュ分を含む）
+            response_tokens: 出力トークン数
+            cached_tokens: コンテキストキャッシュから読み込まれた入力トークン数
+            prompt_chars: 送信したプロンプトの文字数（実行前の見積もりの補正に使用）
+        """
+        with self._lock:
+            self.records.append({
+                "caller": caller,
+                "page_url": page_url,
+                "latency": latency,
+                "success": success,
+                "retries": retries,
+                "prompt_tokens": prompt_tokens or 0,
+                "response_tokens": response_tokens or 0,
+                "cached_tokens": cached_tokens or 0,
+                "prompt_chars": prompt_chars,
+            })
+
+    def take(self, page_url: str) -> List[Dict]:
+        """ページのAI呼び出しの記録を取り出す（分散チェックのワーカーから投入側に返す）"""
+        with self._lock:
+            taken = [r for r in self.records if r["page_url"] == page_url]
+            self.records = [r for r in self.records if r["page_url"] != page_url]
+        return taken
+
+    def extend(self, records: List[Dict]):
+        """ワーカーで記録したAI呼び出しを追加"""
+        with self._lock:
+            self.records.extend(records)
+
+    def cost(self, prompt_tokens: int, response_tokens: int, cached_tokens: int) -> float:
+        """概算費用（api.pricing の100万トークンあたり単価から算出）"""
+        uncached = max(0, prompt_tokens - cached_tokens)
+        return (
+            uncached * self.input_price
+            + cached_tokens * self.cached_price
+            + response_tokens * self.output_price
+        ) / 1_000_000
+
+    def _aggregate(self, records: List[Dict]) -> Dict:
+        latencies = [r["latency"] for r in records]
+        prompt_tokens = sum(r["prompt_tokens"] for r in records)
+        response_tokens = sum(r["response_tokens"] for r in records)
+        cached_tokens = sum(r["cached_tokens"] for r in records)
+        return {
+            "calls": len(records),
+            "errors": sum(1 for r in records if not r["success"]),
+            "retries": sum(r["retries"] for r in records),
+            "prompt_tokens": prompt_tokens,
+            "response_tokens": response_tokens,
+            "cached_tokens": cached_tokens,
+            "prompt_chars": sum(r["prompt_chars"] for r in records),
+            "cost": self.cost(prompt_tokens, response_tokens, cached_tokens),
+            "latency_total": sum(latencies),
+            "latency_p50": percentile(latencies, 0.50),
+            "latency_p95": percentile(latencies, 0.95),
+        }
+
+    def summary(self, top_pages: int = 10) -> Dict:
+        """
+        実行全体の集計
+
+        Returns:
+            {"total": 全体集計, "by_checker": {チェッカー名: 集計},
+             "top_pages": 費用の高いページの集計リスト, "currency": 通貨}
+        """
+        with self._lock:
+            records = list(self.records)
+
+        by_checker = {}
+        by_page = {}
+        for r in records:
+            by_checker.setdefault(r["caller"], []).append(r)
+            by_page.setdefault(r["page_url"], []).append(r)
+
+        pages = [dict(self._aggregate(rs), page_url=url) for url, rs in by_page.items()]
+        pages.sort(key=lambda p: p["prompt_tokens"] + p["response_tokens"], reverse=True)
+
+        return {
+            "total": self._aggregate(records),
+            "by_checker": {name: self._aggregate(rs) for name, rs in by_checker.items()},
+            "top_pages": pages[:top_pages],
+            "currency": self.currency,
+        }
@@ -0,0 +1,155 @@
+"""
+複数医院の一括チェック
+
+DC-config.xlsx のディレクトリまたは一覧ファイルを受け取り、医院ごとのチェックをプロセスプールで並行して実行する。
+AI の同時呼び出し数・1分あたりの呼び出し数・呼び出し回数とトークン数の上限、ホストごとの同時リクエスト数は
+全プロセスで共有する（utils.limits）。
+"""
+
+import concurrent.futures
+import glob
+import multiprocessing
+import os
+import time
+import traceback
+from typing import Dict, List, Tuple
+
+from utils.limits import SharedLimits, install
+from utils.reporter import ExcelReporter
+from utils.runner import ClinicJob, count_statuses, run_clinic, write_reports
+
+
+def discover_configs(source: str) -> List[str]:
+    """
+    チェック対象の DC-config.xlsx の一覧
+
+    Args:
+        source: ディレクトリ（直下の *.xlsx）または一覧ファイル（1行1パス、# 以降はコメント、相対パスは一覧ファイルの場所から）
+    """
+    if os.path.isdir(source):
+        # Excel の一時ファイル（~$ で始まる）は除外
+        return sorted(p for p in glob.glob(os.path.join(source, "*.xlsx")) if not os.path.basename(p).startswith("~$"))
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                paths.append(line if os.path.isabs(line) else os.path.join(base_dir, line))
+    return paths
+
+
+def _init_worker(limits: SharedLimits):
+    install(limits)
+
+
+def _run_one(path: str, config: Dict, output_dir: str, formats: Tuple[str, ...], auth_id: str, auth_pass: str) -> Dict:
+    """1医院分のチェック（ワーカープロセスで実行）。失敗しても例外は送出せず、summary に記録する"""
+    summary = {"config_path": path, "clinic_name": os.path.basename(path), "pages": 0, "errors": 0, "warnings": 0,
+               "elapsed": 0.0, "ai_calls": 0, "tokens": 0, "cost": 0.0, "reports": [], "failure": ""}
+    started = time.perf_counter()
+    try:
+        job = ClinicJob.from_excel(path)
+        summary["clinic_name"] = job.clinic_name
+        report = run_clinic(job, config, auth_id, auth_pass)
+        if not report["checked_urls"]:
+            summary["failure"] = "有効なページ情報を取得できませんでした"
+            return summary
+        summary["reports"] = write_reports(report, config, output_dir, formats)
+        summary["pages"] = len(report["checked_urls"])
+        counts = count_statuses(report["results"])
+        summary["errors"], summary["warnings"] = counts["error"], counts["warning"]
+        total = (report["ai_usage"] or {}).get("total", {})
+        summary["ai_calls"] = total.get("calls", 0)
+        summary["tokens"] = total.get("prompt_tokens", 0) + total.get("response_tokens", 0)
+        summary["cost"] = total.get("cost", 0.0)
+    except Exception as e:
+        print(f"エラー (一括チェック: {path}): {e}")
+        traceback.print_exc()
+        summary["failure"] = str(e)
+    finally:
+        summary["elapsed"] = time.perf_counter() - started
+    return summary
+
+
+class BatchRunner:
+    """複数医院のチェックをプロセスプールで実行"""
+
+    def __init__(self, config: Dict, output_dir: str = "reports", formats: Tuple[str, ...] = ("xlsx", "json"),
+                 auth_id: str = "", auth_pass: str = ""):
+        """
+        Args:
+            config: 設定辞書（batch を参照）
+            output_dir: レポートの出力先
+            formats: 医院ごとのレポートの形式
+            auth_id: Basic認証ID
+            auth_pass: Basic認証パスワード
+        """
+        batch_config = config.get("batch", {})
+        self.config = config
+        self.output_dir = output_dir
+        self.formats = formats
+        self.auth_id = auth_id
+        self.auth_pass = auth_pass
+        # 同時にチェックする医院数
+        self.processes = max(1, batch_config.get("processes", 4))
+        # 全医院合計のAI同時呼び出し数（APIのレート制限に合わせる）
+        self.ai_concurrency = batch_config.get("ai_concurrency", 8)
+        # 同一ホストへの同時リクエスト数（医院をまたいで共有する外部リンク先を含む）
+        self.per_host = batch_config.get("per_host_concurrency", 4)
+        # 全医院合計の1分あたりのAI呼び出し数・AI呼び出し回数・トークン数の上限（0 は無制限。医院ごとの上限は budget）
+        self.ai_per_minute = batch_config.get("ai_requests_per_minute", 0)
+        self.max_ai_calls = batch_config.get("max_ai_calls", 0)
+        self.max_tokens = batch_config.get("max_tokens", 0)
+
+    def run(self, paths: List[str], on_done=None) -> Dict:
+        """
+        一括チェックを実行
+
+        Args:
+            paths: DC-config.xlsx のパスのリスト
+            on_done: 医院ごとのチェックが終わるたびに summary を渡して呼び出す関数
+
+        Returns:
+            {"clinics": [医院ごとの summary（paths の順）], "pages", "elapsed", "pages_per_minute"}
+        """
+        started = time.perf_counter()
+        summaries: Dict[str, Dict] = {}
+        with multiprocessing.Manager() as manager:
+            limits = SharedLimits.create(
+                manager, self.ai_concurrency, self.per_host,
+                max_ai_calls=self.max_ai_calls, max_tokens=self.max_tokens, ai_per_minute=self.ai_per_minute
+            )
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=min(self.processes, max(1, len(paths))),
+                initializer=_init_worker,
+                initargs=(limits,)
+            ) as executor:
+                futures = [
+                    executor.submit(_run_one, path, self.config, self.output_dir, self.formats, self.auth_id, self.auth_pass)
+                    for path in paths
+                ]
+                for future in concurrent.futures.as_completed(futures):
+                    summary = future.result()
+                    summaries[summary["config_path"]] = summary
+                    if on_done:
+                        on_done(summary)
+
+        elapsed = time.perf_counter() - started
+        pages = sum(s["pages"] for s in summaries.values())
+        return {
+            "clinics": [summaries[path] for path in paths],
+            "pages": pages,
+            "elapsed": elapsed,
+            "pages_per_minute": pages / elapsed * 60 if elapsed else 0.0,
+        }
+
+    def write_summary(self, result: Dict) -> str:
+        """一括チェックの集計表（Excel）を出力し、そのパスを返す"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"一括チェック集計_{time.strftime('%Y%m%d_%H%M%S')}.xlsx")
+        data = ExcelReporter(self.config).generate_batch_summary(result)
+        with open(path, "wb") as f:
+            f.write(data.getvalue())
+        return path
@@ -0,0 +1,150 @@
+"""
+実行予算
+
+1回の実行で消費できるトークン数・AI呼び出し回数・実行時間の上限を管理する。
+上限に達した後のAI呼び出しは行わず、実行時間の上限を超えたページはチェックを省略する。
+実行時間の上限と利用者による中止は CancelToken で取得・リンク確認・AI呼び出しに伝え、実行中の通信も打ち切る。
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+from utils.limits import SharedQuotaExceeded, shared_limits
+
+
+class BudgetExceededError(RuntimeError):
+    """実行予算の上限に達した"""
+
+
+class CancelledError(RuntimeError):
+    """チェックが中断された（利用者による中止・実行時間の上限）"""
+
+
+class CancelToken:
+    """実行の中断の通知（スレッドセーフ。取得・リンク確認・AI呼び出しが処理の区切りごとに確認する）"""
+
+    def __init__(self):
+        self.reason = ""
+        self.deadline: Optional[float] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+
+    def set_deadline(self, seconds: float):
+        """今から seconds 秒後に中断する"""
+        self.deadline = time.monotonic() + seconds
+
+    def cancel(self, reason: str = "中止した"):
+        """
+        中断を通知（2回目以降は何もしない）
+
+        Args:
+            reason: 中断の理由（「〜ため」に続く形。レポートの「未チェック」の行に表示）
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self.reason = reason
+                self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("実行時間の上限に達した")
+        return self._event.is_set()
+
+    def check(self):
+        """
+        Raises:
+            CancelledError: 中断されている場合
+        """
+        if self.cancelled:
+            raise CancelledError(f"{self.reason}ため中断しました")
+
+    def wait(self, seconds: float) -> bool:
+        """最大 seconds 秒待機（中断された時点で戻る。中断された場合 True）"""
+        if self.deadline is not None:
+            seconds = min(seconds, max(0.0, self.deadline - time.monotonic()))
+        self._event.wait(seconds)
+        return self.cancelled
+
+    def timeout(self, seconds: float) -> float:
+        """通信のタイムアウト（中断の期限を超えない値。期限を過ぎていても最小 0.1 秒）"""
+        if self.deadline is None:
+            return seconds
+        return max(0.1, min(seconds, self.deadline - time.monotonic()))
+
+
+class RunBudget:
+    """1回の実行の予算（スレッドセーフ、0 は無制限）"""
+
+    def __init__(self, max_tokens: int = 0, max_ai_calls: int = 0, max_seconds: float = 0,
+                 cancel_token: Optional[CancelToken] = None):
+        """
+        Args:
+            max_tokens: 入力・出力を合わせたトークン数の上限
+            max_ai_calls: AI呼び出し回数の上限（リトライは含まない）
+            max_seconds: 実行時間の上限（秒、start() からの経過時間。超えた時点で cancel_token も中断する）
+            cancel_token: 実行の中断の通知（省略時は新しく作成。cancel_token.cancel() で実行を中止できる）
+        """
+        self.max_tokens = max_tokens
+        self.max_ai_calls = max_ai_calls
+        self.max_seconds = max_seconds
+        self.cancel_token = cancel_token or CancelToken()
+        self.tokens = 0
+        self.ai_calls = 0
+        self.started_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "RunBudget":
+        """設定（budget）から生成"""
+        budget_config = config.get("budget", {})
+        return cls(
+            max_tokens=budget_config.get("max_tokens", 0),
+            max_ai_calls=budget_config.get("max_ai_calls", 0),
+            max_seconds=budget_config.get("max_minutes", 0) * 60
+        )
+
+    def start(self):
+        """実行時間の計測を開始"""
+        self.started_at = time.monotonic()
+        if self.max_seconds:
+            self.cancel_token.set_deadline(self.max_seconds)
+
+    def elapsed(self) -> float:
+        """開始からの経過時間（秒）"""
+        if self.started_at is None:
+            return 0.0
+        return time.monotonic() - self.started_at
+
+    def time_exceeded(self) -> bool:
+        """実行時間の上限を超えている場合True"""
+        return bool(self.max_seconds) and self.elapsed() >= self.max_seconds
+
+    def acquire_ai_call(self):
+        """
+        AI呼び出し1回分の予算を確保
+
+        バッチ実行時は全医院合計の上限（utils.limits）も確認する
+
+        Raises:
+            BudgetExceededError: いずれかの上限に達している場合
+        """
+        with self._lock:
+            if self.max_ai_calls and self.ai_calls >= self.max_ai_calls:
+                raise BudgetExceededError(f"AI呼び出し回数の上限（{self.max_ai_calls}回）に達しました")
+            if self.max_tokens and self.tokens >= self.max_tokens:
+                raise BudgetExceededError(f"トークン数の上限（{self.max_tokens:,}）に達しました")
+            if self.time_exceeded():
+                raise BudgetExceededError(f"実行時間の上限（{self.max_seconds / 60:g}分）に達しました")
+            try:
+                shared_limits().acquire_ai_call()
+            except SharedQuotaExceeded as e:
+                raise BudgetExceededError(str(e)) from e
+            self.ai_calls += 1
+
+    def add_tokens(self, tokens: int):
+        """消費したトークン数を加算（バッチ実行時は全医院合計にも加算）"""
+        with self._lock:
+            self.tokens += tokens
+        shared_limits().add_tokens(tokens)
@@ -0,0 +1,134 @@
+"""
+AI応答の記録・再生（カセット）
+
+モデルへの全リクエストについて「プロンプトのハッシュ → 応答」をディスクに記録し、
+2回目以降は記録済みの応答を遅延なしで返す。プロンプト調整や
+_cleanup_ai_response のデバッグ、回帰確認・性能測定を再現可能かつ高速に行うためのもの。
+
+モード:
+    record: 常にモデルに問い合わせ、応答を記録（既存の記録は上書き）
+    replay: 記録済みの応答のみを返す（未記録のプロンプトはエラー）
+    auto:   記録があれば再生し、なければ問い合わせて記録
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from typing import Callable, Dict, List, Optional
+
+from utils.llm_backends import LLMBackend, LLMResponse
+
+MODES = ("record", "replay", "auto")
+
+
+class CassetteMissError(KeyError):
+    """replay モードで未記録のプロンプトが要求された"""
+
+
+class CassetteBackend(LLMBackend):
+    """他のバックエンドを包み、応答を記録・再生するバックエンド"""
+
+    def __init__(self, config: dict, inner_factory: Callable[[], LLMBackend]):
+        """
+        Args:
+            config: 設定辞書（api.cassette を参照）
+            inner_factory: 実際に問い合わせるバックエンドを生成する関数
+                           （replay で全て記録済みの場合は生成しない = APIキー不要）
+        """
+        super().__init__(config)
+        cassette_config = self.api_config.get("cassette", {})
+        self.mode = cassette_config.get("mode", "auto")
+        if self.mode not in MODES:
+            raise ValueError(f"未対応のカセットモードです: {self.mode}（{', '.join(MODES)} のいずれかを指定してください）")
+        self.path = cassette_config.get("path", ".cassettes")
+        # キーの算出前にプロンプトから除去する正規表現（実行日など、毎回変わる部分）
+        self.ignore_patterns: List[re.Pattern] = [re.compile(p) for p in cassette_config.get("ignore_patterns", [])]
+
+        self._inner_factory = inner_factory
+        self._inner: Optional[LLMBackend] = None
+        self._lock = threading.Lock()
+        if self.mode == "record":
+            # 記録時は必ず問い合わせるため、APIキー未設定等のエラーをここで検出する
+            self._inner = inner_factory()
+        os.makedirs(self.path, exist_ok=True)
+
+    @property
+    def inner(self) -> LLMBackend:
+        """実際に問い合わせるバックエンド（初回使用時に生成）"""
+        with self._lock:
+            if self._inner is None:
+                self._inner = self._inner_factory()
+            return self._inner
+
+    def generate(self, prompt: str, response_schema: Optional[Dict] = None) -> LLMResponse:
+        return self._play(prompt, response_schema, lambda: self.inner.generate(prompt, response_schema))
+
+    def generate_with_prefix(self, prefix: str, payload: str, response_schema: Optional[Dict] = None) -> LLMResponse:
+        # キーは連結後のプロンプトで算出（コンテキストキャッシュの有無で記録が変わらないように）
+        return self._play(
+            prefix + "\n\n" + payload,
+            response_schema,
+            lambda: self.inner.generate_with_prefix(prefix, payload, response_schema)
+        )
+
+    def close(self):
+        with self._lock:
+            inner = self._inner
+        if inner is not None:
+            inner.close()
+
+    def _play(self, prompt: str, response_schema: Optional[Dict], call: Callable[[], LLMResponse]) -> LLMResponse:
+        key = self._key(prompt, response_schema)
+        if self.mode != "record":
+            recorded = self._load(key)
+            if recorded is not None:
+                return recorded
+            if self.mode == "replay":
+                raise CassetteMissError(f"カセットに記録がありません（キー: {key[:12]}）")
+
+        response = call()
+        self._save(key, prompt, response)
+        return response
+
+    def _key(self, prompt: str, response_schema: Optional[Dict] = None) -> str:
+        for pattern in self.ignore_patterns:
+            prompt = pattern.sub("", prompt)
+        raw = f"{self.model_name}\0{prompt}"
+        if response_schema:
+            # スキーマ指定の有無で応答の形式が変わるため別の記録とする
+            raw += "\0" + json.dumps(response_schema, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def _load(self, key: str) -> Optional[LLMResponse]:
+        try:
+            with open(self._file(key), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        return LLMResponse(
+            text=data["text"],
+            prompt_tokens=data.get("prompt_tokens"),
+            response_tokens=data.get("response_tokens"),
+            cached_tokens=data.get("cached_tokens")
+        )
+
+    def _save(self, key: str, prompt: str, response: LLMResponse):
+        data = {
+            "model": self.model_name,
+            "prompt": prompt,
+            "text": response.text,
+            "prompt_tokens": response.prompt_tokens,
+            "response_tokens": response.response_tokens,
+            "cached_tokens": response.cached_tokens,
+        }
+        # 並列実行中の書き込みでファイルが壊れないよう、一時ファイルに書いてから置き換える
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._file(key))
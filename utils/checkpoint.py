@@ -0,0 +1,220 @@
+"""
+チェックの途中経過の記録（再開用）
+
+ページ・チェッカー単位の結果を完了するたびに追記専用のファイル（JSON Lines）に記録する。
+画面の再読み込み・セッション切れ・プロセスの異常終了で中断した場合、実行IDを指定して再開すると、
+記録済みの結果を再利用して未完了の分のみをチェックする（AI呼び出しの費用を二重に払わない）。
+全ページのチェックが完了した実行は再開の必要がないため、記録を削除する。
+"""
+
+import json
+import os
+import secrets
+import threading
+import time
+from typing import Dict, List, Optional
+
+# 一覧の作成時に記録の末尾から読み込む単位（バイト）
+TAIL_CHUNK = 65536
+
+
+class RunJournal:
+    """1回のチェックの記録（スレッドセーフ）"""
+
+    def __init__(self, path: str, run_id: str, records: Optional[List[Dict]] = None, fsync: bool = False):
+        """
+        Args:
+            path: 記録ファイルのパス
+            run_id: 実行ID
+            records: 読み込み済みの記録（再開時）
+            fsync: 1件ごとにディスクへの書き込みを待つ（プロセスの異常終了に加えOSの停止にも備える）
+        """
+        self.path = path
+        self.run_id = run_id
+        self.fsync = fsync
+        self.params: Dict = {}
+        self.order: Optional[List[str]] = None
+        self.pages: Dict[str, Dict] = {}
+        self.units: Dict[str, Dict[str, Dict]] = {}
+        self.done: set = set()
+        self.finished = False
+        self._lock = threading.Lock()
+        for record in records or []:
+            self._apply(record)
+
+    @staticmethod
+    def _directory(config: Dict) -> str:
+        return config.get("checkpoint", {}).get("dir", ".cache/runs")
+
+    @classmethod
+    def is_enabled(cls, config: Dict) -> bool:
+        return config.get("checkpoint", {}).get("enabled", True)
+
+    @classmethod
+    def create(cls, config: Dict, params: Dict) -> "RunJournal":
+        """
+        新しい実行の記録を作成
+
+        Args:
+            config: 設定辞書（checkpoint を参照）
+            params: 再開に必要な実行条件（医院の情報・チェック対象URL等。JSONに変換できること）
+        """
+        directory = cls._directory(config)
+        os.makedirs(directory, exist_ok=True)
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+        journal = cls(os.path.join(directory, f"{run_id}.jsonl"), run_id, fsync=config.get("checkpoint", {}).get("fsync", False))
+        journal._append({"kind": "start", "run_id": run_id, "created": time.time(), "params": params})
+        return journal
+
+    @classmethod
+    def open(cls, config: Dict, run_id: str) -> "RunJournal":
+        """
+        記録済みの実行を読み込み（再開用）
+
+        Raises:
+            ValueError: 指定した実行IDの記録がない場合
+        """
+        path = os.path.join(cls._directory(config), f"{run_id}.jsonl")
+        if not os.path.exists(path):
+            raise ValueError(f"実行ID {run_id} の記録が見つかりません")
+        return cls(path, run_id, cls._read(path), fsync=config.get("checkpoint", {}).get("fsync", False))
+
+    @staticmethod
+    def _read(path: str) -> List[Dict]:
+        records = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # 書き込み途中で中断した最終行は無視
+                    continue
+        return records
+
+    @classmethod
+    def list_runs(cls, config: Dict) -> List[Dict]:
+        """
+        再開できる実行（完了していない記録）の一覧（新しい順）
+
+        画面の再描画ごとに呼ばれるため、各記録の先頭行（実行条件）と末尾の完了ページ数のみを読み込む
+
+        Returns:
+            [{"run_id", "created", "clinic_name", "pages", "done"}, ...]
+        """
+        directory = cls._directory(config)
+        if not os.path.isdir(directory):
+            return []
+        runs = []
+        for name in sorted(os.listdir(directory), reverse=True):
+            if not name.endswith(".jsonl"):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                start = cls._read_header(path)
+                done = cls._read_done(path)
+            except OSError:
+                # 一覧の作成中に完了して削除された記録
+                continue
+            if start.get("kind") != "start" or done is None:
+                continue
+            job = start.get("params", {}).get("job", {})
+            runs.append({
+                "run_id": name[:-len(".jsonl")],
+                "created": start.get("created", 0),
+                "clinic_name": job.get("clinic_name", ""),
+                "pages": len(job.get("urls", [])),
+                "done": done,
+            })
+        return runs
+
+    @staticmethod
+    def _read_header(path: str) -> Dict:
+        """先頭行（実行の開始の記録）"""
+        with open(path, "r", encoding="utf-8") as f:
+            try:
+                return json.loads(f.readline())
+            except json.JSONDecodeError:
+                return {}
+
+    @staticmethod
+    def _read_done(path: str) -> Optional[int]:
+        """
+        末尾から最後の page_done の記録を探し、完了したページ数を返す（完了した実行は None）
+
+        page_done の後に続くのは実行中のページの記録のみのため、通常は末尾の数十KBで見つかる
+        """
+        with open(path, "rb") as f:
+            end = f.seek(0, os.SEEK_END)
+            tail = b""
+            while end > 0:
+                start = max(0, end - TAIL_CHUNK)
+                f.seek(start)
+                tail = f.read(end - start) + tail
+                end = start
+                lines = tail.split(b"\n")
+                # 途中から読み込んだ先頭の行は、さらに前を読み込んでから判定
+                for line in reversed(lines if end == 0 else lines[1:]):
+                    if b'"page_done"' not in line and b'"finish"' not in line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if record.get("kind") == "finish":
+                        return None
+                    if record.get("kind") == "page_done":
+                        return record.get("done", 0)
+                tail = lines[0] if end > 0 else b""
+        return 0
+
+    def _apply(self, record: Dict):
+        kind = record.get("kind")
+        if kind == "start":
+            self.params = dict(record.get("params", {}), created=record.get("created", 0))
+        elif kind == "order":
+            self.order = record["urls"]
+        elif kind == "page":
+            self.pages[record["url"]] = record
+        elif kind == "unit":
+            self.units.setdefault(record["url"], {})[record["unit"]] = record
+        elif kind == "page_done":
+            self.done.add(record["url"])
+        elif kind == "finish":
+            self.finished = True
+
+    def _append(self, record: Dict):
+        with self._lock:
+            if record["kind"] == "page_done":
+                # 完了ページ数も記録（一覧の作成時は末尾のみを読み込むため）
+                record["done"] = len(self.done | {record["url"]})
+            line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self._apply(record)
+
+    def record_order(self, urls: List[str]):
+        """チェック順（再開時も同じ順序でレポートを作成するため）"""
+        self._append({"kind": "order", "urls": urls})
+
+    def record_page(self, url: str, decision: Dict):
+        """ページの割り当て（重複ページ・テンプレート群）"""
+        self._append(dict(decision, kind="page", url=url))
+
+    def record_unit(self, url: str, unit: str, results: List[Dict], state=None):
+        """ページ・チェッカー単位の結果"""
+        self._append({"kind": "unit", "url": url, "unit": unit, "results": results, "state": state})
+
+    def record_page_done(self, url: str):
+        """ページの全てのチェックが完了"""
+        self._append({"kind": "page_done", "url": url})
+
+    def finish(self):
+        """全ページのチェックが完了（再開の必要がないため記録を削除）"""
+        self._append({"kind": "finish"})
+        try:
+            os.remove(self.path)
+        except OSError as e:
+            print(f"警告 (途中経過の記録の削除): {e}")
@@ -0,0 +1,244 @@
+"""
+マスターデータとの整合性の機械判定
+
+'チェックリスト' シートのマスターデータ（ExcelHandler.get_all_master_data()）を基に、
+医院名の表記ゆれ、電話番号・郵便番号の半角表記、住所の全角表記と一致、
+診療時間の一致を文字列ルールで判定する。AIチェックの前に実行する。
+"""
+
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+# 医院名から除いて固有部分（例: 「山田」）を取り出すための一般的な接尾語（長いもの優先）
+CLINIC_SUFFIXES = [
+    "矯正歯科クリニック", "歯科クリニック", "デンタルクリニック", "デンタルオフィス",
+    "矯正歯科", "歯科医院", "歯科", "クリニック", "医院",
+]
+
+HYPHENS = "-－ー―‐−–—"
+TILDES = "~～〜"
+
+PHONE_PATTERN = re.compile(
+    rf"(?<![0-9０-９])[0-9０-９]{{2,4}}[{HYPHENS}]?[0-9０-９]{{2,4}}[{HYPHENS}]?[0-9０-９]{{4}}(?![0-9０-９])"
+)
+POSTAL_PATTERN = re.compile(rf"〒\s*([0-9０-９]{{3}}[{HYPHENS}]?[0-9０-９]{{4}})")
+TIME_RANGE_PATTERN = re.compile(
+    rf"(\d{{1,2}})\s*[:：時]\s*(\d{{2}})?\s*分?\s*[{TILDES}{HYPHENS}]\s*(\d{{1,2}})\s*[:：時]\s*(\d{{2}})?"
+)
+
+# 「診療時間」の見出しから何行先までを診療時間表とみなすか
+HOURS_TABLE_WINDOW = 30
+
+
+def normalize_width(text: str) -> str:
+    """NFKC正規化（全角英数字→半角）し、ハイフン・波線の異体字を統一"""
+    text = unicodedata.normalize("NFKC", text)
+    text = re.sub(f"[{HYPHENS}]", "-", text)
+    return re.sub(f"[{TILDES}]", "~", text)
+
+
+def _normalize_with_map(text: str) -> Tuple[str, List[int]]:
+    """
+    1文字ずつ正規化（空白除去）し、正規化後の各文字が元の何文字目かの対応表を返す
+
+    Returns:
+        (正規化後の文字列, 正規化後の位置 → 元の位置 の対応リスト)
+    """
+    chars = []
+    index_map = []
+    for i, c in enumerate(text):
+        if c.isspace():
+            continue
+        for n in normalize_width(c):
+            if n.isspace():
+                continue
+            chars.append(n)
+            index_map.append(i)
+    return "".join(chars), index_map
+
+
+def _original_span(line: str, index_map: List[int], start: int, end: int) -> str:
+    """正規化後の範囲に対応する元の文字列を取得"""
+    return line[index_map[start]:index_map[end - 1] + 1]
+
+
+def _has_fullwidth_ascii(text: str) -> bool:
+    """全角英数字・全角ハイフンを含むか"""
+    return any(normalize_width(c) != c and normalize_width(c) in "0123456789-" for c in text)
+
+
+def _has_halfwidth_digits(text: str) -> bool:
+    """半角数字・半角ハイフンを含むか"""
+    return bool(re.search(r"[0-9\-]", text))
+
+
+def parse_time_ranges(text: str) -> List[str]:
+    """テキストから時間帯（例: 9:00~12:30）を抽出し、正規化した文字列で返す"""
+    ranges = []
+    for m in TIME_RANGE_PATTERN.finditer(normalize_width(text)):
+        start = f"{int(m.group(1))}:{m.group(2) or '00'}"
+        end = f"{int(m.group(3))}:{m.group(4) or '00'}"
+        ranges.append(f"{start}~{end}")
+    return ranges
+
+
+class ConsistencyReport:
+    """機械判定の結果"""
+
+    def __init__(self):
+        self.findings: List[str] = []
+        self.rules_applied: List[str] = []
+
+    @property
+    def all_passed(self) -> bool:
+        """適用したルールがあり、全て問題なしの場合にTrue"""
+        return bool(self.rules_applied) and not self.findings
+
+    def add(self, finding: str):
+        if finding not in self.findings:
+            self.findings.append(finding)
+
+
+class ConsistencyRuleEngine:
+    """マスターデータに基づく整合性ルールエンジン"""
+
+    def __init__(self, master_data: Dict):
+        """
+        Args:
+            master_data: ExcelHandler.get_all_master_data() の戻り値
+        """
+        self.master_data = master_data or {}
+
+        self.clinic_name = self._master_str("医院名")
+        self.clinic_stem = self._clinic_stem(self.clinic_name) if self.clinic_name else None
+        if self.clinic_stem:
+            suffixes = "|".join(re.escape(normalize_width(s)) for s in CLINIC_SUFFIXES)
+            self._clinic_variant_pattern = re.compile(
+                re.escape(normalize_width(self.clinic_stem)) + f"(?:{suffixes})"
+            )
+
+        address = self._master_str("住所") or ""
+        postal = POSTAL_PATTERN.search(address) or re.search(rf"[0-9０-９]{{3}}[{HYPHENS}][0-9０-９]{{4}}", address)
+        self.postal_code = normalize_width(postal.group(postal.lastindex or 0)) if postal else None
+        if postal:
+            address = address.replace(postal.group(0), "")
+        address_norm, _ = _normalize_with_map(address.replace("〒", ""))
+        # 番地までを照合対象とする（ビル名は別の行に書かれることが多いため）
+        core = re.match(r"^\D+[\d\-丁目番地号の]*\d", address_norm)
+        self.address_core = core.group(0) if core else (address_norm or None)
+        locality = re.match(r"^\D+", self.address_core) if self.address_core else None
+        self.address_locality = locality.group(0) if locality and len(locality.group(0)) >= 4 else None
+
+        hours = self._master_str("診療時間")
+        self.hours_ranges = set(parse_time_ranges(hours)) if hours else set()
+
+    def _master_str(self, key: str) -> Optional[str]:
+        value = self.master_data.get(key)
+        return str(value).strip() if value else None
+
+    def _clinic_stem(self, name: str) -> Optional[str]:
+        """医院名から一般的な接尾語を除いた固有部分を取得"""
+        compact = re.sub(r"\s", "", name)
+        for suffix in CLINIC_SUFFIXES:
+            if compact.endswith(suffix) and len(compact) > len(suffix) + 1:
+                return compact[:-len(suffix)]
+        return None
+
+    def check(self, page_content: str) -> ConsistencyReport:
+        """
+        ページテキストを全ルールで判定
+
+        Args:
+            page_content: ページのテキストコンテンツ
+
+        Returns:
+            ConsistencyReport
+        """
+        report = ConsistencyReport()
+        lines = [line for line in page_content.split("\n") if line.strip()]
+
+        self._check_phone_width(lines, report)
+        self._check_postal_code(lines, report)
+        if self.clinic_name:
+            self._check_clinic_name(lines, report)
+        if self.address_core:
+            self._check_address(lines, report)
+        if self.hours_ranges:
+            self._check_hours(lines, report)
+
+        return report
+
+    def _check_phone_width(self, lines: List[str], report: ConsistencyReport):
+        """電話番号の半角表記"""
+        report.rules_applied.append("電話番号（半角）")
+        for line in lines:
+            for m in PHONE_PATTERN.finditer(line):
+                if _has_fullwidth_ascii(m.group(0)):
+                    report.add(f"★ [整合性]: 「{m.group(0)}」 ⇒ 電話番号は半角で表記してください（{normalize_width(m.group(0))}）")
+
+    def _check_postal_code(self, lines: List[str], report: ConsistencyReport):
+        """郵便番号の半角表記とマスターデータとの一致"""
+        report.rules_applied.append("郵便番号")
+        for line in lines:
+            for m in POSTAL_PATTERN.finditer(line):
+                code = m.group(1)
+                if _has_fullwidth_ascii(code):
+                    report.add(f"★ [整合性]: 「〒{code}」 ⇒ 郵便番号は半角で表記してください（〒{normalize_width(code)}）")
+                normalized = normalize_width(code).replace("-", "")
+                if self.postal_code and normalized != self.postal_code.replace("-", ""):
+                    report.add(f"★ [整合性]: 「〒{code}」 ⇒ 郵便番号がマスターデータ（〒{self.postal_code}）と一致しません")
+
+    def _check_clinic_name(self, lines: List[str], report: ConsistencyReport):
+        """医院名の表記ゆれ（全角/半角・空白の違い、略称や別の接尾語）"""
+        report.rules_applied.append("医院名")
+        name_norm, _ = _normalize_with_map(self.clinic_name)
+        for line in lines:
+            line_norm, index_map = _normalize_with_map(line)
+
+            # 正規化後は一致するが、元の表記が異なる（全角/半角の混在など）
+            start = line_norm.find(name_norm)
+            while start >= 0:
+                original = _original_span(line, index_map, start, start + len(name_norm))
+                if original != self.clinic_name:
+                    report.add(f"★ [整合性]: 「{original}」 ⇒ 医院名の表記が統一されていません（正: {self.clinic_name}）")
+                start = line_norm.find(name_norm, start + 1)
+
+            # 固有部分 + 別の接尾語（略称・旧称）
+            if self.clinic_stem:
+                for m in self._clinic_variant_pattern.finditer(line_norm):
+                    if m.group(0) != name_norm:
+                        original = _original_span(line, index_map, m.start(), m.end())
+                        report.add(f"★ [整合性]: 「{original}」 ⇒ 医院名の表記が統一されていません（正: {self.clinic_name}）")
+
+    def _check_address(self, lines: List[str], report: ConsistencyReport):
+        """所在地の全角表記とマスターデータとの一致"""
+        report.rules_applied.append("所在地")
+        for line in lines:
+            line_norm, index_map = _normalize_with_map(line)
+            start = line_norm.find(self.address_core)
+            if start >= 0:
+                original = _original_span(line, index_map, start, start + len(self.address_core))
+                if _has_halfwidth_digits(original):
+                    report.add(f"★ [整合性]: 「{original}」 ⇒ 住所内の数字・ハイフンは全角で表記してください")
+                continue
+
+            # 同じ市区町村名の後に異なる番地が書かれている
+            if self.address_locality:
+                m = re.search(re.escape(self.address_locality) + r"[\d\-丁目番地号の]*\d", line_norm)
+                if m:
+                    original = _original_span(line, index_map, m.start(), m.end())
+                    report.add(f"★ [整合性]: 「{original}」 ⇒ 所在地がマスターデータ（{self.master_data.get('住所')}）と一致しません")
+
+    def _check_hours(self, lines: List[str], report: ConsistencyReport):
+        """診療時間表の時間帯とマスターデータとの一致"""
+        report.rules_applied.append("診療時間")
+        for i, line in enumerate(lines):
+            if "診療時間" not in line:
+                continue
+            for table_line in lines[i:i + HOURS_TABLE_WINDOW]:
+                for time_range in parse_time_ranges(table_line):
+                    if time_range not in self.hours_ranges:
+                        report.add(
+                            f"★ [整合性]: 「{table_line.strip()}」 ⇒ 診療時間がマスターデータ（{self.master_data.get('診療時間')}）と一致しません"
+                        )
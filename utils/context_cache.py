@@ -0,0 +1,176 @@
+"""
+プロンプト固定部のコンテキストキャッシュ
+
+実行中に変化しない指示・マスターデータ・NGルールをモデル側にキャッシュし、
+ページごとのリクエストではページ固有の部分だけを送信する
+"""
+
+import datetime
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+
+# キャッシュの有効期間の残りがこの割合を下回ったら延長（実行中に失効しないよう）
+REFRESH_MARGIN = 0.25
+
+
+class LocalContextCache:
+    """コンテキストキャッシュのローカル代替
+
+    固定部をメモリ上に保持し、送信時に「固定部 + ページ部」を連結する。
+    キャッシュ非対応モデルやテスト時に使用する。
+    """
+
+    def __init__(self, generate_fn: Callable[..., Any]):
+        """
+        Args:
+            generate_fn: プロンプト全文（と generate() のキーワード引数）を受け取りモデルの応答を返す関数
+        """
+        self._generate_fn = generate_fn
+        self._prefixes: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def generate(self, prefix: str, payload: str, **kwargs):
+        """固定部とページ部から応答を生成（kwargs は generation_config 等としてそのまま渡す）"""
+        self._lookup(prefix)
+        return self._generate_fn(prefix + "\n\n" + payload, **kwargs)
+
+    def _lookup(self, prefix: str) -> str:
+        """固定部を登録済みか確認し、キーを返す"""
+        key = _prefix_key(prefix)
+        with self._lock:
+            if key in self._prefixes:
+                self.hits += 1
+            else:
+                self._prefixes[key] = prefix
+                self.misses += 1
+        return key
+
+    def close(self):
+        """保持している資源を解放（ローカル代替では何もしない）"""
+
+
+class GeminiContextCache:
+    """Geminiのコンテキストキャッシュを使用した固定部の再利用
+
+    固定部ごとに CachedContent を1回だけ作成し、以降はキャッシュを参照する
+    モデルにページ部のみを送信する。作成に失敗した場合（トークン数が下限未満、
+    モデル非対応など）は LocalContextCache にフォールバックする。
+    有効期間の終了が近づいたら延長し、失効していた場合は通常送信に切り替えて次回作り直す。
+    作成したキャッシュは close() で削除する（有効期間の終了まで課金されるため）。
+    """
+
+    def __init__(self, model_name: str, fallback: LocalContextCache, ttl_minutes: int = 60):
+        """
+        Args:
+            model_name: モデル名
+            fallback: キャッシュ作成失敗時に使用するローカル代替
+            ttl_minutes: キャッシュの有効期間（分）
+        """
+        self.model_name = model_name
+        self.fallback = fallback
+        self.ttl = datetime.timedelta(minutes=ttl_minutes)
+        # 固定部ごとのキャッシュ済みモデル（作成中は他のスレッドが完了を待つ）
+        self._models: Dict[str, Future] = {}
+        # 固定部ごとの作成済みキャッシュ {"cached", "expires"}（expires は time.monotonic() 基準）
+        self._caches: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def generate(self, prefix: str, payload: str, **kwargs):
+        """固定部とページ部から応答を生成（Geminiの応答オブジェクトを返す）"""
+        key = _prefix_key(prefix)
+        model = self._get_cached_model(key, prefix)
+        if model is None:
+            return self.fallback.generate(prefix, payload, **kwargs)
+        self._refresh(key)
+        try:
+            return model.generate_content(payload, **kwargs)
+        except Exception as e:
+            if not _is_not_found(e):
+                raise
+            print(f"コンテキストキャッシュが失効していました（通常送信に切り替えます）: {e}")
+            self._forget(key)
+            return self.fallback.generate(prefix, payload, **kwargs)
+
+    def _get_cached_model(self, key: str, prefix: str):
+        """
+        固定部に対応するキャッシュ済みモデルを取得（初回・失効後のみ作成）
+        
+        作成（ネットワーク呼び出し）はロックの外で行い、同じ固定部を待つスレッドのみが完了を待つ
+        """
+        with self._lock:
+            future = self._models.get(key)
+            creating = future is None
+            if creating:
+                future = self._models[key] = Future()
+        if not creating:
+            return future.result()
+
+        model = None
+        try:
+            import google.generativeai as genai
+            from google.generativeai import caching
+
+            cached = caching.CachedContent.create(
+                model=f"models/{self.model_name}",
+                display_name=f"dental-checker-{key[:12]}",
+                contents=[{"role": "user", "parts": [{"text": prefix}]}],
+                ttl=self.ttl,
+            )
+            with self._lock:
+                self._caches[key] = {"cached": cached, "expires": time.monotonic() + self.ttl.total_seconds()}
+            model = genai.GenerativeModel.from_cached_content(cached_content=cached)
+        except Exception as e:
+            print(f"コンテキストキャッシュ作成エラー（通常送信に切り替えます）: {e}")
+        future.set_result(model)
+        return model
+
+    def _refresh(self, key: str):
+        """有効期間の残りが少ないキャッシュを延長（延長に失敗した場合は失効時に通常送信へ切り替える）"""
+        ttl_seconds = self.ttl.total_seconds()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._caches.get(key)
+            if not entry or entry["expires"] - now > ttl_seconds * REFRESH_MARGIN:
+                return
+            # 他のスレッドが重ねて延長しないよう、先に期限を更新
+            entry["expires"] = now + ttl_seconds
+        try:
+            entry["cached"].update(ttl=self.ttl)
+        except Exception as e:
+            print(f"警告 (コンテキストキャッシュの延長): {e}")
+
+    def _forget(self, key: str):
+        """失効したキャッシュを破棄（次回の呼び出しで作り直す）"""
+        with self._lock:
+            self._models.pop(key, None)
+            self._caches.pop(key, None)
+
+    def close(self):
+        """作成したキャッシュを削除（実行の終了時）"""
+        with self._lock:
+            caches, self._caches = list(self._caches.values()), {}
+            self._models.clear()
+        for entry in caches:
+            try:
+                entry["cached"].delete()
+            except Exception as e:
+                print(f"警告 (コンテキストキャッシュの削除): {e}")
+
+
+def _is_not_found(error: Exception) -> bool:
+    """キャッシュが存在しない（失効した）ことを示すエラーか"""
+    try:
+        from google.api_core import exceptions
+    except ImportError:
+        return False
+    return isinstance(error, exceptions.NotFound)
+
+
+def _prefix_key(prefix: str) -> str:
+    """固定部のハッシュキーを生成"""
+    return hashlib.sha256(prefix.encode("utf-8")).hexdigest()
@@ -4,13 +4,21 @@
 ウェブサイトからページを取得し、解析する
 """
 
+import concurrent.futures
 import requests
+import threading
+import urllib3
 from bs4 import BeautifulSoup
+from charset_normalizer import detect
 from typing import Dict, List, Optional, Tuple
 from urllib.parse import urljoin, urlparse
 import time
 import re
-import streamlit as st
+
+from utils.budget import CancelledError, CancelToken
+from utils.limits import shared_limits
+from utils.near_duplicates import NearDuplicateDetector
+from utils.page_facts import PageFacts, extract_page_facts
 
 
 class WebCrawler:
@@ -25,6 +33,9 @@ class WebCrawler:
         self.crawler_config = config.get("crawler", {})
         self.user_agent = self.crawler_config.get("user_agent", "DentalCheckerBot/1.0")
         self.timeout = self.crawler_config.get("timeout", 10)
+        # 1ページの受信にかける時間の上限（timeout は受信が途切れた時間のため、少しずつ送信し続けるサーバーで止まらないように）
+        self.response_deadline = self.crawler_config.get("response_deadline", 60)
+        self.cancel_token = CancelToken()
         self.max_pages = self.crawler_config.get("max_pages", 20)
         
         # 除外パターン
@@ -35,12 +46,27 @@ class WebCrawler:
         auth_config = self.crawler_config.get("auth", {})
         if auth_config.get("username") and auth_config.get("password"):
             self.auth = (auth_config["username"], auth_config["password"])
+        
+        # 取得したページの SimHash（ほぼ同一ページの検出用）
+        self.near_duplicates = NearDuplicateDetector(config)
+        
+        # HTMLの解析を行うプロセス数（0 なら呼び出し元のスレッドで解析）
+        self.parse_processes = self.crawler_config.get("parse_processes", 0)
+        self._parse_pool = None
+        self._parse_pool_lock = threading.Lock()
+        
+        # 直前の crawl_site() で巡回ページ数の上限に達したか（画面での警告表示用）
+        self.limit_reached = False
     
     def set_auth(self, username: str, password: str):
         """Basic認証情報を設定"""
         if username and password:
             self.auth = (username, password)
     
+    def set_cancel_token(self, cancel_token: CancelToken):
+        """実行の中断の通知を設定（中断されると受信中のページも打ち切る）"""
+        self.cancel_token = cancel_token
+    
     def is_excluded(self, url: str) -> bool:
         """
         URLが除外パターンにマッチするかチェック
@@ -66,28 +92,121 @@ class WebCrawler:
         Returns:
             (テキストコンテンツ, BeautifulSoupオブジェクト) のタプル、失敗時はNone
         """
+        html = self.fetch_html(url)
+        if html is None:
+            return None
+        return self.parse_html(url, html)
+    
+    def fetch_html(self, url: str) -> Optional[str]:
+        """
+        ページのHTMLを取得（ネットワーク処理のみ）
+        
+        Args:
+            url: 取得するURL
+        
+        Returns:
+            HTML文字列、失敗時はNone
+        
+        Raises:
+            CancelledError: 実行が中断された場合（受信中のページは破棄）
+        """
+        self.cancel_token.check()
         try:
             headers = {"User-Agent": self.user_agent}
-            response = requests.get(
-                url,
-                headers=headers,
-                auth=self.auth,
-                timeout=self.timeout
-            )
-            response.raise_for_status()
-            response.encoding = response.apparent_encoding
-            
-            soup = BeautifulSoup(response.text, "html.parser")
-            
-            # テキストコンテンツを抽出
-            text_content = soup.get_text(separator="\n", strip=True)
-            
-            return text_content, soup
+            with shared_limits().host_slot(url):
+                response = requests.get(
+                    url,
+                    headers=headers,
+                    auth=self.auth,
+                    timeout=self.cancel_token.timeout(self.timeout),
+                    stream=True
+                )
+                try:
+                    response.raise_for_status()
+                    body = self._read_body(url, response)
+                finally:
+                    response.close()
+            if body is None:
+                return None
+            # response.apparent_encoding と同じ判定（本文を分割して受信したため直接判定）
+            return str(body, detect(body)["encoding"] or "utf-8", errors="replace")
         
         except requests.exceptions.RequestException as e:
             print(f"ページ取得エラー ({url}): {e}")
             return None
     
+    def _read_body(self, url: str, response: requests.Response) -> Optional[bytes]:
+        """本文を受信（response_deadline を超えた場合は None。中断された場合は CancelledError）"""
+        started = time.monotonic()
+        chunks = []
+        while True:
+            # iter_content は指定サイズが揃うまで戻らないため、届いた分ずつ読み込んで経過時間を確認
+            # （iter_content と同様に、受信の停止・途中切断を requests の例外に変換）
+            try:
+                chunk = response.raw.read1(65536, decode_content=True)
+            except urllib3.exceptions.ProtocolError as e:
+                raise requests.exceptions.ChunkedEncodingError(e) from e
+            except urllib3.exceptions.HTTPError as e:
+                raise requests.exceptions.ConnectionError(e) from e
+            if not chunk:
+                break
+            chunks.append(chunk)
+            self.cancel_token.check()
+            if self.response_deadline and time.monotonic() - started > self.response_deadline:
+                print(f"ページ取得エラー ({url}): 受信が {self.response_deadline}秒以内に完了しませんでした")
+                return None
+        return b"".join(chunks)
+    
+    def parse_html(self, url: str, html: str) -> Tuple[str, BeautifulSoup]:
+        """
+        HTMLを解析してテキストを抽出（CPU処理のみ）
+        
+        Args:
+            url: ページのURL
+            html: HTML文字列
+        
+        Returns:
+            (テキストコンテンツ, BeautifulSoupオブジェクト) のタプル
+        """
+        facts = self.parse_page(url, html)
+        return facts.text, facts.soup
+    
+    def parse_page(self, url: str, html: str) -> PageFacts:
+        """
+        HTMLを解析（crawler.parse_processes が1以上ならプロセスプールで解析）
+        
+        プロセスプールで解析した場合、soup はチェッカーが参照する要素のみの要約HTMLから生成される
+        
+        Args:
+            url: ページのURL
+            html: HTML文字列
+        
+        Returns:
+            解析済みのページ
+        """
+        if self.parse_processes > 0:
+            min_length = self.near_duplicates.min_length if self.near_duplicates.enabled else None
+            facts = self._get_parse_pool().submit(extract_page_facts, url, html, min_length).result()
+        else:
+            soup = BeautifulSoup(html, "html.parser")
+            # テキストコンテンツを抽出
+            facts = PageFacts(url, soup.get_text(separator="\n", strip=True), soup=soup)
+        self.near_duplicates.add(url, facts.text, facts.fingerprint)
+        return facts
+    
+    def _get_parse_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        with self._parse_pool_lock:
+            if self._parse_pool is None:
+                self._parse_pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.parse_processes)
+            return self._parse_pool
+    
+    def close(self):
+        """解析用のプロセスプールを終了"""
+        with self._parse_pool_lock:
+            if self._parse_pool is not None:
+                self._parse_pool.shutdown()
+                self._parse_pool = None
+    
     def get_internal_links(self, base_url: str, soup: BeautifulSoup, root_url: Optional[str] = None) -> List[str]:
         """
         ページ内の内部リンクを取得
@@ -137,7 +256,7 @@ class WebCrawler:
         to_visit = [start_url]
         excluded_count = 0
         
-        while to_visit and len(visited) < self.max_pages:
+        while to_visit and len(visited) < self.max_pages and not self.cancel_token.cancelled:
             url = to_visit.pop(0)
             
             if url in visited:
@@ -150,7 +269,10 @@ class WebCrawler:
                 continue
             
             print(f"クロール中: {url}")
-            result = self.fetch_page(url)
+            try:
+                result = self.fetch_page(url)
+            except CancelledError:
+                break
             
             if result:
                 text_content, soup = result
@@ -163,12 +285,11 @@ class WebCrawler:
                         to_visit.append(link)
                 
                 # サーバーに負荷をかけないよう少し待機
-                time.sleep(0.5)
+                self.cancel_token.wait(0.5)
         
-        if len(visited) >= self.max_pages:
+        self.limit_reached = len(visited) >= self.max_pages
+        if self.limit_reached:
             print(f"⚠️ クロール上限（{self.max_pages}ページ）に達したため、収集を中断しました。")
-            if hasattr(st, "warning"):
-                st.warning(f"⚠️ 巡回ページ数が上限（{self.max_pages}）に達しました。一部のページが漏れている可能性があります。")
 
         if excluded_count > 0:
             print(f"\n除外したページ: {excluded_count}件")
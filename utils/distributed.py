@@ -0,0 +1,540 @@
+"""
+複数のワーカーでの分散チェック
+
+チェックを作業単位（ページの取得・ページ内リンクの確認・ページのAIチェック）に分割して待ち行列（utils.work_queue）に投入し、
+1台または複数台のワーカープロセスが貸し出しを受けて実行する。重複ページ・テンプレート群の判定と機械判定（CPU）は
+投入側（run_clinic を実行するプロセス）で行い、結果を run_checks() と同じ形式・順序にまとめる。
+
+ワーカーの起動（ブローカー・SQLite ファイルを指定。Basic認証情報は環境変数 BASIC_AUTH_ID / BASIC_AUTH_PASS）:
+    python -m utils.distributed --queue http://192.168.0.10:8767 --threads 4
+    python -m utils.distributed --queue .cache/work_queue.sqlite3 --kinds fetch links
+"""
+
+import argparse
+import os
+import secrets
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+
+from bs4 import BeautifulSoup
+
+from checkers import RESOURCE_AI, RESOURCE_CLASSES, RESOURCE_CPU, RESOURCE_NETWORK, CheckResult, LinkChecker, PhoneChecker, UnifiedAIChecker
+from utils.ai_metrics import AIUsageTracker
+from utils.budget import BudgetExceededError, CancelledError, CancelToken, RunBudget
+from utils.checkpoint import RunJournal
+from utils.crawler import WebCrawler
+from utils.page_clustering import TemplateSampler
+from utils.page_facts import PageFacts, extract_page_facts
+from utils.page_priority import PagePrioritizer
+from utils.runner import ProgressReporter, finalize_results, load_config, unchecked_result
+from utils.work_queue import UNIT_AI, UNIT_DONE, UNIT_FETCH, UNIT_KINDS, UNIT_LINKS, open_work_queue
+
+# 進捗の統計（Pipeline.metrics() と同じ形式）に表示する段階名
+UNIT_STAGES = {UNIT_FETCH: "取得", UNIT_LINKS: "ネットワーク", UNIT_AI: "AI"}
+# 失敗した単位の「未チェック」の行に記載するチェックの名前
+UNIT_CHECK_NAMES = {UNIT_LINKS: "リンク確認", UNIT_AI: "AIチェック"}
+
+
+class _RunContext:
+    """ワーカー側の1回の実行分のチェッカー（実行の条件ごとに初期化して使い回す）"""
+
+    def __init__(self, config: Dict, params: Dict, auth_id: str, auth_pass: str, cancel_token: CancelToken):
+        run_config = config.copy()
+        ng_rules = params.get("ng_rules")
+        if ng_rules:
+            run_config["ng_words_rules"] = ng_rules
+        auth = (auth_id, auth_pass) if auth_id and auth_pass else None
+
+        self.crawler = WebCrawler(run_config)
+        if auth:
+            self.crawler.set_auth(auth_id, auth_pass)
+        self.crawler.set_cancel_token(cancel_token)
+        self.min_length = self.crawler.near_duplicates.min_length if self.crawler.near_duplicates.enabled else None
+        self.network_checkers = [
+            c for c in [LinkChecker(run_config, auth=auth, cancel_token=cancel_token)] if c.is_enabled() and c.resource_class == RESOURCE_NETWORK
+        ]
+        # AI呼び出しの記録は単位の結果として投入側に返す（予算は投入側で管理し、ワーカーでは中断のみ確認）
+        self.usage_tracker = AIUsageTracker(run_config)
+        self.ai_checker = UnifiedAIChecker(
+            run_config, master_data=params.get("master_data"), ng_rules=ng_rules, usage_tracker=self.usage_tracker,
+            budget=RunBudget(cancel_token=cancel_token)
+        )
+
+    def close(self):
+        self.crawler.close()
+        self.ai_checker.close()
+
+
+class UnitWorker:
+    """待ち行列から作業単位の貸し出しを受けて実行するワーカー（スレッドごとに1単位ずつ）"""
+
+    def __init__(self, config: Dict, queue, kinds=UNIT_KINDS, threads: int = 1, auth_id: str = "", auth_pass: str = "",
+                 cancel_token: Optional[CancelToken] = None):
+        """
+        Args:
+            config: 設定辞書（distributed を参照）
+            queue: WorkQueue または RemoteWorkQueue
+            kinds: 実行する単位の種類（例: AIの呼び出しは特定のPCのみで行う場合に限定）
+            threads: 同時に実行する単位の数
+            auth_id: Basic認証ID
+            auth_pass: Basic認証パスワード
+            cancel_token: 中断の通知（中断されると実行中の単位を打ち切り、再実行に回す）
+        """
+        distributed_config = config.get("distributed", {})
+        self.config = config
+        self.queue = queue
+        self.kinds = list(kinds)
+        self.threads = max(1, threads)
+        self.auth_id = auth_id
+        self.auth_pass = auth_pass
+        self.cancel_token = cancel_token or CancelToken()
+        self.lease_seconds = distributed_config.get("lease_seconds", 120)
+        self.poll_interval = distributed_config.get("poll_interval", 0.5)
+        self.name = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(2)}"
+        self._runs: Dict[str, _RunContext] = {}
+        self._active: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        """ワーカーのスレッドと貸し出し期限の延長を開始"""
+        for i in range(self.threads):
+            thread = threading.Thread(target=self._work, args=(f"{self.name}:{i}",), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._renew, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        """実行中の単位が終わるのを待って停止"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        for context in self._runs.values():
+            context.close()
+
+    def _renew(self):
+        """実行中の単位の貸し出し期限を延長（期限の 1/3 ごと）し、終了した実行のチェッカーを解放"""
+        while not self._stop.wait(self.lease_seconds / 3):
+            self._release_finished_runs()
+            with self._lock:
+                active = dict(self._active)
+            by_worker = {}
+            for unit_id, worker in active.items():
+                by_worker.setdefault(worker, []).append(unit_id)
+            for worker, unit_ids in by_worker.items():
+                try:
+                    self.queue.renew(unit_ids, worker, self.lease_seconds)
+                except Exception as e:
+                    print(f"警告 (貸し出し期限の延長): {e}")
+
+    def _release_finished_runs(self):
+        """投入側が削除した実行のチェッカーを解放（コンテキストキャッシュ等を削除）"""
+        with self._lock:
+            run_ids = list(self._runs)
+        for run_id in run_ids:
+            try:
+                finished = self.queue.run_params(run_id) is None
+            except Exception as e:
+                print(f"警告 (実行の状態の取得): {e}")
+                return
+            if not finished:
+                continue
+            with self._lock:
+                context = self._runs.pop(run_id, None)
+            if context:
+                context.close()
+
+    def _work(self, worker: str):
+        while not self._stop.is_set():
+            try:
+                unit = self.queue.lease(worker, self.kinds, self.lease_seconds)
+            except Exception as e:
+                print(f"警告 (作業単位の取得): {e}")
+                self._stop.wait(self.poll_interval * 4)
+                continue
+            if unit is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            with self._lock:
+                self._active[unit["unit_id"]] = worker
+            try:
+                self._execute(worker, unit)
+            finally:
+                with self._lock:
+                    self._active.pop(unit["unit_id"], None)
+
+    def _context(self, run_id: str) -> _RunContext:
+        with self._lock:
+            context = self._runs.get(run_id)
+        if context is None:
+            params = self.queue.run_params(run_id)
+            if params is None:
+                raise ValueError(f"実行 {run_id} の条件が登録されていません")
+            context = _RunContext(self.config, params, self.auth_id, self.auth_pass, self.cancel_token)
+            with self._lock:
+                context = self._runs.setdefault(run_id, context)
+        return context
+
+    def _execute(self, worker: str, unit: Dict):
+        started = time.perf_counter()
+        try:
+            context = self._context(unit["run_id"])
+            handler = {UNIT_FETCH: self._fetch, UNIT_LINKS: self._check_links, UNIT_AI: self._check_ai}[unit["kind"]]
+            data = handler(context, unit["payload"])
+        except Exception as e:
+            if not isinstance(e, CancelledError):
+                print(f"エラー ({unit['kind']} at {unit['key']}, {unit['attempts']}回目): {e}")
+            try:
+                self.queue.fail(unit["unit_id"], worker, str(e))
+            except Exception as fail_error:
+                print(f"警告 (作業単位の失敗の記録): {fail_error}")
+            return
+        result = {"data": data, "worker": worker, "seconds": time.perf_counter() - started}
+        try:
+            if not self.queue.complete(unit["unit_id"], worker, result):
+                print(f"警告 (作業単位の完了): 貸し出し期限切れのため結果を破棄しました ({unit['kind']} at {unit['key']})")
+        except Exception as e:
+            # 記録できなかった単位は貸し出し期限の経過後に再実行される
+            print(f"警告 (作業単位の完了の記録): {e}")
+
+    @staticmethod
+    def _fetch(context: _RunContext, payload: Dict) -> Optional[Dict]:
+        """ページを取得・解析（取得できなかった場合は None）"""
+        html = context.crawler.fetch_html(payload["url"])
+        if html is None:
+            return None
+        facts = extract_page_facts(payload["url"], html, context.min_length)
+        return {"text": facts.text, "skeleton": facts.skeleton, "dom": sorted(facts.dom), "fingerprint": facts.fingerprint}
+
+    @staticmethod
+    def _check_links(context: _RunContext, payload: Dict) -> Dict:
+        soup = BeautifulSoup(payload["skeleton"], "html.parser")
+        results = []
+        for checker in context.network_checkers:
+            results.extend(r.to_dict() for r in checker.check(payload["url"], payload["text"], soup))
+        return {"results": results}
+
+    @staticmethod
+    def _check_ai(context: _RunContext, payload: Dict) -> Dict:
+        soup = BeautifulSoup(payload["skeleton"], "html.parser")
+        results = context.ai_checker.check_ai(
+            payload["url"], payload["text"], soup, payload["light_consistency"], payload["include_typo"]
+        )
+        return {"results": [r.to_dict() for r in results], "usage": context.usage_tracker.take(payload["url"])}
+
+
+def run_checks_distributed(urls: List[str], config: dict, queue, auth_id: str = "", auth_pass: str = "", ng_rules: Optional[List[dict]] = None, master_data: Optional[dict] = None, usage_tracker: Optional[AIUsageTracker] = None, budget: Optional[RunBudget] = None, inbound_counts: Optional[Dict[str, int]] = None, progress: Optional[ProgressReporter] = None, journal: Optional[RunJournal] = None):
+    """
+    チェックを作業単位に分割してワーカーで実行（引数・戻り値は run_checks() と同じ）
+
+    distributed.local_threads のワーカーを同じプロセスで起動する（0 の場合は他のワーカープロセスのみで実行）。
+    投入側が中断した場合も、同じ実行IDで再開すると完了済みの単位の結果を待ち行列から再利用する
+    （journal はチェック順と実行IDのみに使用）
+
+    Args:
+        queue: WorkQueue または RemoteWorkQueue
+    """
+    all_results = []
+    progress = progress or ProgressReporter()
+    budget = budget or RunBudget()
+    budget.start()
+    cancel_token = budget.cancel_token
+    usage_tracker = usage_tracker or AIUsageTracker(config)
+    distributed_config = config.get("distributed", {})
+    poll_interval = distributed_config.get("poll_interval", 0.5)
+
+    run_config = config.copy()
+    if ng_rules:
+        run_config["ng_words_rules"] = ng_rules
+    auth = (auth_id, auth_pass) if auth_id and auth_pass else None
+
+    if journal and journal.order:
+        urls = journal.order
+    else:
+        urls = PagePrioritizer(run_config).order(urls, inbound_counts)
+        if journal:
+            journal.record_order(urls)
+    run_id = journal.run_id if journal else f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+
+    # 投入側ではページの割り当てと機械判定を行う（取得・リンク確認・AIはワーカー）
+    crawler = WebCrawler(run_config)
+    near_duplicates = crawler.near_duplicates
+    checkers = [
+        LinkChecker(run_config, auth=auth),
+        PhoneChecker(run_config),
+        UnifiedAIChecker(run_config, master_data=master_data, ng_rules=ng_rules)
+    ]
+    checkers_by_resource = {
+        resource: [c for c in checkers if c.is_enabled() and c.resource_class == resource]
+        for resource in RESOURCE_CLASSES
+    }
+    local_checkers = [c for c in checkers_by_resource[RESOURCE_AI] if isinstance(c, UnifiedAIChecker)]
+    sampler = TemplateSampler(run_config)
+    sampling_active = sampler.is_active(len(urls))
+
+    queue.register_run(run_id, {"ng_rules": ng_rules, "master_data": master_data})
+    for url in urls:
+        queue.enqueue(run_id, UNIT_FETCH, url, {"url": url})
+
+    local_worker = None
+    local_threads = distributed_config.get("local_threads", 2)
+    if local_threads > 0:
+        local_worker = UnitWorker(
+            config, queue, threads=local_threads, auth_id=auth_id, auth_pass=auth_pass, cancel_token=cancel_token
+        )
+        local_worker.start()
+
+    pages = {}
+    tasks: Dict[str, Dict] = {}
+    remaining = set(urls)
+    stats = {kind: {"seconds": 0.0, "workers": set()} for kind in UNIT_KINDS}
+    started = time.perf_counter()
+    done = 0
+    dropped = 0
+    skipped = False
+
+    def set_unit(task, unit, results):
+        """単位の結果を記録し、ページ全体の完了を待たずに通知"""
+        task["units"][unit] = results
+        progress.add_results(results)
+
+    def run_checker(task, unit, func):
+        try:
+            set_unit(task, unit, [r.to_dict() for r in func()])
+        except Exception as e:
+            print(f"エラー ({unit} at {task['url']}): {e}")
+
+    def metrics() -> List[Dict]:
+        try:
+            counts = queue.progress(run_id)
+        except Exception as e:
+            print(f"警告 (進捗の取得): {e}")
+            counts = {kind: {} for kind in UNIT_KINDS}
+        elapsed = max(1e-9, time.perf_counter() - started)
+        rows = []
+        for kind, stage in UNIT_STAGES.items():
+            workers = len(stats[kind]["workers"])
+            processed = counts.get(kind, {}).get(UNIT_DONE, 0)
+            rows.append({
+                "stage": stage,
+                "workers": workers,
+                "queue_depth": counts.get(kind, {}).get("pending", 0),
+                "processed": processed,
+                "dropped": counts.get(kind, {}).get("failed", 0),
+                "throughput": processed / elapsed,
+                "utilization": min(1.0, stats[kind]["seconds"] / (elapsed * workers)) if workers else 0.0,
+            })
+        return rows
+
+    def finish_page(task):
+        nonlocal done
+        # ページ内の結果はチェック順（run_checks() の段階順）に並ぶ
+        for results in task["units"].values():
+            all_results.extend(results)
+        task["pending"] = set()
+        remaining.discard(task["url"])
+        done += 1
+
+    def on_fetched(url: str, data: Optional[Dict]):
+        nonlocal dropped, skipped
+        if data is None:
+            remaining.discard(url)
+            dropped += 1
+            return
+        facts = PageFacts(url, data["text"], data["skeleton"], set(data["dom"]), data["fingerprint"])
+        near_duplicates.add(url, facts.text, facts.fingerprint)
+        content, soup = facts.text, facts.soup
+        pages[url] = (content, soup)
+        task = tasks[url] = {"url": url, "units": {}, "pending": set()}
+        if cancel_token.cancelled:
+            skipped = True
+            set_unit(task, "未チェック", [unchecked_result(url, cancel_token.reason)])
+            finish_page(task)
+            return
+
+        duplicate_of = near_duplicates.match(url)
+        cluster = None
+        if not duplicate_of and sampling_active:
+            cluster = sampler.assign(url, content, soup, dom=facts.dom)
+        if duplicate_of:
+            rep_url, score = duplicate_of
+            set_unit(task, "重複ページ", [CheckResult(
+                page_url=url,
+                check_name="重複ページ",
+                status="ok",
+                details=f"{rep_url} とほぼ同一の内容（類似度 {score:.0%}）のため、AI・リンクのチェックは代表ページの結果を参照してください",
+                severity="low"
+            ).to_dict()])
+
+        for checker in checkers_by_resource[RESOURCE_CPU]:
+            run_checker(task, checker.__class__.__name__, lambda: checker.check(url, content, soup))
+        ai_options = {}
+        for checker in local_checkers:
+            def check_local():
+                results, light_consistency, include_typo = checker.check_local(url, content, soup)
+                ai_options[checker] = (light_consistency, include_typo)
+                return results
+            run_checker(task, f"{checker.__class__.__name__}.local", check_local)
+
+        if not duplicate_of and checkers_by_resource[RESOURCE_NETWORK]:
+            # 結果が届く前に並び順の位置を確保
+            task["units"][UNIT_LINKS] = []
+            task["pending"].add(UNIT_LINKS)
+            queue.enqueue(run_id, UNIT_LINKS, url, {"url": url, "text": content, "skeleton": data["skeleton"]})
+        if not duplicate_of and not (cluster and not cluster.is_sampled(url)):
+            for checker, (light_consistency, include_typo) in ai_options.items():
+                unit = f"{checker.__class__.__name__}.ai"
+                try:
+                    budget.acquire_ai_call()
+                except BudgetExceededError as e:
+                    set_unit(task, unit, [CheckResult(
+                        page_url=url,
+                        check_name="AI統合チェック",
+                        status="warning",
+                        details=f"★ 実行予算の上限に達したため、AIチェックを省略しました（{e}）",
+                        severity="medium"
+                    ).to_dict()])
+                    continue
+                task["units"][UNIT_AI] = []
+                task["pending"].add(UNIT_AI)
+                queue.enqueue(run_id, UNIT_AI, url, {
+                    "url": url, "text": content, "skeleton": data["skeleton"],
+                    "light_consistency": light_consistency, "include_typo": include_typo,
+                })
+        if not task["pending"]:
+            finish_page(task)
+
+    def on_checked(unit: Dict):
+        task = tasks.get(unit["key"])
+        # 再開前の割り当てで投入した単位等、このページで待っていない単位は無視
+        if not task or unit["kind"] not in task["pending"]:
+            return
+        if unit["status"] == UNIT_DONE:
+            data = unit["result"]["data"]
+            set_unit(task, unit["kind"], data["results"])
+            # 再開前に取り出し済みの単位のAI利用は、中断前の実行で集計済み
+            usage = [] if unit.get("collected") else data.get("usage", [])
+            if usage:
+                usage_tracker.extend(usage)
+                budget.add_tokens(sum(r["prompt_tokens"] + r["response_tokens"] for r in usage))
+        else:
+            # 再実行しても失敗した単位は、チェックしていないことがレポートで分かるよう行を残す
+            print(f"エラー ({unit['kind']} at {unit['key']}): {unit['error']}")
+            check_name = UNIT_CHECK_NAMES[unit["kind"]]
+            set_unit(task, unit["kind"], [CheckResult(
+                page_url=task["url"],
+                check_name="未チェック",
+                status="warning",
+                details=f"★ {check_name}が再実行しても失敗したため、このページの{check_name}の結果はありません（{unit['error']}）",
+                severity="medium"
+            ).to_dict()])
+        task["pending"].discard(unit["kind"])
+        if not task["pending"]:
+            finish_page(task)
+
+    total_tasks = len(urls)
+    progress.update(0, total_tasks, all_results, [])
+    # 投入側の再開時は、完了済みの単位を取り出し済みのものも含めて読み直す
+    include_collected = bool(journal)
+    try:
+        while remaining and not cancel_token.cancelled:
+            try:
+                units = queue.collect(run_id, include_collected=include_collected)
+            except Exception as e:
+                print(f"警告 (結果の取得): {e}")
+                units = []
+            include_collected = False
+            for unit in units:
+                if unit["status"] == UNIT_DONE:
+                    stats[unit["kind"]]["seconds"] += unit["result"].get("seconds", 0.0)
+                    stats[unit["kind"]]["workers"].add(unit["result"].get("worker"))
+                if unit["kind"] == UNIT_FETCH:
+                    if unit["key"] in remaining and unit["key"] not in tasks:
+                        on_fetched(unit["key"], unit["result"]["data"] if unit["status"] == UNIT_DONE else None)
+                else:
+                    on_checked(unit)
+            if units:
+                progress.update(done + dropped, total_tasks, all_results, metrics())
+            else:
+                cancel_token.wait(poll_interval)
+    finally:
+        if local_worker:
+            local_worker.stop()
+        crawler.close()
+        for checker in checkers:
+            checker.close()
+
+    # 中断した場合、結果の揃っていないページに「未チェック」の行を付ける（取得前のページは行のみ）
+    for url in urls:
+        if url not in remaining:
+            continue
+        skipped = True
+        if url in tasks:
+            set_unit(tasks[url], "未チェック", [unchecked_result(url, cancel_token.reason, partial=True)])
+            finish_page(tasks[url])
+        else:
+            all_results.append(unchecked_result(url, cancel_token.reason))
+            progress.add_results(all_results[-1:])
+            remaining.discard(url)
+    progress.update(done + dropped, total_tasks, all_results, metrics())
+
+    progress.finish(metrics())
+    if journal and not skipped:
+        journal.finish()
+    # 中断した場合は、残りの単位をワーカーが実行しないよう削除し、完了済みの単位は再開時の再利用のために残す
+    # （再開できない場合＝チェックポイントなしは全て削除）
+    try:
+        if skipped and journal:
+            queue.discard_pending(run_id)
+        else:
+            queue.purge(run_id)
+    except Exception as e:
+        print(f"警告 (作業単位の削除): {e}")
+
+    if not pages:
+        if cancel_token.cancelled:
+            progress.error(f"{cancel_token.reason}ため、ページを取得する前に中断しました")
+        else:
+            progress.error("入力されたURLから有効なページ情報を取得できませんでした")
+        return [], [], {}
+
+    all_results, checked_urls = finalize_results(all_results, urls, set(pages), near_duplicates, sampler)
+    return all_results, checked_urls, pages
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="分散チェックのワーカー")
+    parser.add_argument("--queue", help="ブローカーのURL、または SQLite ファイルのパス（省略時は distributed.queue）")
+    parser.add_argument("--config", help="設定ファイル（省略時は config.yaml）")
+    parser.add_argument("--threads", type=int, help="同時に実行する単位の数（省略時は distributed.worker_threads）")
+    parser.add_argument("--kinds", nargs="+", choices=list(UNIT_KINDS), default=list(UNIT_KINDS), help="実行する単位の種類")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    distributed_config = config.get("distributed", {})
+    target = args.queue or distributed_config.get("queue")
+    if not target:
+        parser.error("--queue または distributed.queue を指定してください")
+    worker = UnitWorker(
+        config, open_work_queue(target, config), kinds=args.kinds,
+        threads=args.threads or distributed_config.get("worker_threads", 4),
+        auth_id=os.environ.get("BASIC_AUTH_ID", ""), auth_pass=os.environ.get("BASIC_AUTH_PASS", "")
+    )
+    worker.start()
+    print(f"分散チェックのワーカー起動: {worker.name}（{target}、{worker.threads}スレッド、{' '.join(worker.kinds)}）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        worker.cancel_token.cancel("ワーカーを停止した")
+        worker.stop()
+
+
+if __name__ == "__main__":
+    main()
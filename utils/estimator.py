@@ -0,0 +1,193 @@
+"""
+実行前の見積もり
+
+URL抽出時に取得したページ本文・有効なチェック・プロンプト固定部と、過去の実行で
+記録した応答時間などの統計から、チェック開始前にAI呼び出し回数・トークン数・
+概算費用・リンク確認数・所要時間を予測する
+"""
+
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup
+
+from utils.ai_metrics import AIUsageTracker
+from utils.pipeline import stage_workers
+
+# 外部リンクの確認前の待機時間（LinkChecker._check_link と同じ値）
+EXTERNAL_LINK_WAIT = 1.0
+
+# 実行履歴がない場合の初期値（config.yaml の estimator で上書き可能）
+DEFAULT_STATS = {
+    "ai_latency": 5.0,        # AI呼び出し1回の応答時間（秒）
+    "tokens_per_char": 1.0,   # プロンプト1文字あたりの入力トークン数
+    "response_tokens": 200,   # AI呼び出し1回あたりの出力トークン数
+    "fetch_seconds": 1.0,     # ページ取得1件の所要時間（秒）
+    "link_seconds": 0.5,      # リンク確認1件の所要時間（秒、外部リンクの待機を除く）
+    "time_scale": 1.0,        # 実測の所要時間 / 見積もりの所要時間
+}
+
+
+class RunStatsStore:
+    """過去の実行の統計（指数移動平均）をJSONファイルに保存する"""
+
+    def __init__(self, config: Dict):
+        """
+        Args:
+            config: 設定辞書（estimator を参照）
+        """
+        estimator_config = config.get("estimator", {})
+        self.path = estimator_config.get("stats_path", ".cache/run_stats.json")
+        # 新しい実行の重み（0〜1）
+        self.smoothing = estimator_config.get("smoothing", 0.3)
+        self.stats = {key: estimator_config.get(key, value) for key, value in DEFAULT_STATS.items()}
+        self.runs = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self.runs = data.get("runs", 0)
+        self.stats.update({key: value for key, value in data.get("stats", {}).items() if key in self.stats})
+
+    def _save(self):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"runs": self.runs, "stats": self.stats}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _blend(self, key: str, observed: float):
+        if self.runs == 0:
+            self.stats[key] = observed
+        else:
+            self.stats[key] = (1 - self.smoothing) * self.stats[key] + self.smoothing * observed
+
+    def update(self, ai_usage: Optional[Dict], elapsed: float, estimate: Optional[Dict] = None):
+        """
+        実行結果から統計を更新して保存
+
+        Args:
+            ai_usage: AIUsageTracker.summary() の結果
+            elapsed: 実測の所要時間（秒）
+            estimate: 実行前の見積もり（RunEstimator.estimate() の結果）
+        """
+        total = (ai_usage or {}).get("total", {})
+        succeeded = total.get("calls", 0) - total.get("errors", 0)
+        if succeeded > 0:
+            self._blend("ai_latency", total["latency_p50"])
+            self._blend("response_tokens", total["response_tokens"] / succeeded)
+            if total.get("prompt_chars") and total.get("prompt_tokens"):
+                self._blend("tokens_per_char", total["prompt_tokens"] / total["prompt_chars"])
+        if estimate and estimate.get("base_seconds"):
+            self._blend("time_scale", elapsed / estimate["base_seconds"])
+        self.runs += 1
+        self._save()
+
+
+class RunEstimator:
+    """チェック開始前の所要時間・消費量の見積もり"""
+
+    def __init__(self, config: Dict, stats: Optional[RunStatsStore] = None):
+        """
+        Args:
+            config: 設定辞書
+            stats: 過去の実行の統計（省略時は設定ファイルから読み込む）
+        """
+        self.config = config
+        self.stats = (stats or RunStatsStore(config)).stats
+        self.workers = stage_workers(config)
+        self.context_cache_enabled = config.get("api", {}).get("context_cache", {}).get("enabled", True)
+        self.tracker = AIUsageTracker(config)
+
+    def estimate(
+        self,
+        urls: List[str],
+        pages: Dict[str, Tuple[str, BeautifulSoup]],
+        link_checker=None,
+        ai_checker=None,
+        skip_ai: Optional[Set[str]] = None
+    ) -> Dict:
+        """
+        見積もりを算出
+
+        Args:
+            urls: チェック対象URLのリスト
+            pages: URL抽出時に取得したページ {url: (本文, soup)}。
+                   含まれないURLは取得済みページの平均値で見積もる
+            link_checker: 有効な LinkChecker（None ならリンク確認なし）
+            ai_checker: 有効な UnifiedAIChecker（None ならAI呼び出しなし）
+            skip_ai: AIチェックを行わないページ（テンプレート群のサンプリング対象外）
+
+        Returns:
+            {"pages", "ai_calls", "prompt_tokens", "cached_tokens", "response_tokens",
+             "total_tokens", "cost", "currency", "link_probes", "external_probes",
+             "seconds", "base_seconds"（実測による補正前の所要時間）}
+        """
+        ai_calls = 0
+        static_chars = 0
+        page_chars = 0
+        link_targets = {}
+        known = [url for url in urls if url in pages]
+
+        for url in known:
+            content, soup = pages[url]
+            if ai_checker and url not in (skip_ai or set()):
+                static_len, page_len = ai_checker.estimate_prompt(url, content, soup)
+                if page_len:
+                    ai_calls += 1
+                    static_chars += static_len
+                    page_chars += page_len
+            if link_checker:
+                base_domain = urlparse(url).netloc
+                for target in link_checker.collect_targets(url, soup):
+                    # 確認結果はチェッカー内でキャッシュされるため、URLごとに1回
+                    link_targets.setdefault(target, link_checker.is_internal(target, base_domain))
+
+        # URL抽出時に取得していないページは平均値で補完
+        unknown = len(urls) - len(known)
+        if known and unknown:
+            ratio = unknown / len(known)
+            ai_calls += round(ai_calls * ratio)
+            static_chars += round(static_chars * ratio)
+            page_chars += round(page_chars * ratio)
+
+        tokens_per_char = self.stats["tokens_per_char"]
+        prompt_tokens = round((static_chars + page_chars) * tokens_per_char)
+        # プロンプト固定部はコンテキストキャッシュから読み込まれる（キャッシュ対象外のモデルでは上振れする）
+        cached_tokens = round(static_chars * tokens_per_char) if self.context_cache_enabled else 0
+        response_tokens = round(ai_calls * self.stats["response_tokens"])
+
+        link_probes = len(link_targets)
+        external_probes = sum(1 for internal in link_targets.values() if not internal)
+        if known and unknown:
+            link_probes += round(link_probes * unknown / len(known))
+            external_probes += round(external_probes * unknown / len(known))
+
+        # 各段階は並行して進むため、所要時間は最も時間のかかる段階で決まる
+        fetch_seconds = len(urls) * self.stats["fetch_seconds"] / self.workers["fetch"]
+        link_seconds = (link_probes * self.stats["link_seconds"] + external_probes * EXTERNAL_LINK_WAIT) / self.workers["network"]
+        ai_seconds = ai_calls * self.stats["ai_latency"] / self.workers["ai"]
+        base_seconds = max(fetch_seconds, link_seconds, ai_seconds)
+
+        return {
+            "pages": len(urls),
+            "ai_calls": ai_calls,
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "response_tokens": response_tokens,
+            "total_tokens": prompt_tokens + response_tokens,
+            "cost": self.tracker.cost(prompt_tokens, response_tokens, cached_tokens),
+            "currency": self.tracker.currency,
+            "link_probes": link_probes,
+            "external_probes": external_probes,
+            "seconds": base_seconds * self.stats["time_scale"],
+            "base_seconds": base_seconds,
+        }
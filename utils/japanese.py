@@ -0,0 +1,43 @@
+"""
+日本語テキスト処理
+
+janome による形態素解析の共通ヘルパー
+"""
+
+import threading
+from typing import List
+
+from janome.tokenizer import Tokenizer
+
+_tokenizer = None
+_lock = threading.Lock()
+
+
+def tokenize(text: str) -> List:
+    """
+    テキストを形態素解析してトークンのリストを返す
+
+    辞書の読み込みは初回のみ行い、以降は同じ Tokenizer を共有する
+    （スレッド間で同時に解析しないようロックする）
+
+    Args:
+        text: 解析対象のテキスト
+
+    Returns:
+        janome のトークンのリスト
+    """
+    global _tokenizer
+    with _lock:
+        if _tokenizer is None:
+            _tokenizer = Tokenizer()
+        return list(_tokenizer.tokenize(text))
+
+
+def lemma_of(token) -> str:
+    """トークンの基本形（基本形がない場合は表層形）"""
+    return token.base_form if token.base_form and token.base_form != "*" else token.surface
+
+
+def pos_of(token) -> str:
+    """トークンの品詞（大分類）"""
+    return token.part_of_speech.split(",")[0]
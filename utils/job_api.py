@@ -0,0 +1,301 @@
+"""
+チェックジョブの HTTP API
+
+制作管理ツール等からチェックを自動で投入するためのローカルHTTPサーバー。
+画面と同じジョブの待ち行列（utils.jobs）に投入するため、画面・API から同じ条件で投入しても二重に実行しない。
+
+エンドポイント:
+    POST /jobs                    ジョブを投入（JSON、または DC-config.xlsx 本体）。202 と {"job_id", "status"} を返す
+    POST /jobs/<job_id>/cancel    ジョブを中止（実行中のジョブはそれまでの結果でレポートを作成）。202 と {"job_id", "status"} を返す
+    GET  /jobs                    ジョブの一覧（新しい順）
+    GET  /jobs/<job_id>           ジョブの状態（?results=1 で途中結果・結果を含める）
+    GET  /jobs/<job_id>/report.xlsx | report.json | pages.zip   完了したジョブのレポート
+
+JSON で投入する場合:
+    {"clinic_name": "...", "url": "https://...", "urls": [...], "correct_phone": "...",
+     "ng_rules": [...], "master_data": {...}, "owner": "...", "budget": {"max_tokens": 0, "max_ai_calls": 0, "max_minutes": 0}}
+    urls を省略した場合は url から巡回してチェック対象を収集する。
+DC-config.xlsx を投入する場合は Content-Type: application/vnd.openxmlformats-officedocument.spreadsheetml.sheet で
+ファイル本体を送信する（?owner=... で利用者を指定）。
+
+使い方（画面とは別に単独で起動する場合。ジョブ表・キャッシュは画面と共有）:
+    python -m utils.job_api --port 8766
+
+config.yaml:
+    jobs:
+      api:
+        enabled: true      # 画面（app.py）の起動時に同じプロセスで API サーバーも起動
+        port: 8766
+        token: ""          # 指定時は Authorization: Bearer <token> を要求
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from utils.budget import RunBudget
+from utils.jobs import JOB_DONE, JobQueue
+from utils.runner import ClinicJob, load_config
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# レポートのファイル名と、ジョブ表に記録したパスの拡張子・Content-Type
+REPORT_FILES = {
+    "report.xlsx": (".xlsx", XLSX_CONTENT_TYPE),
+    "report.json": (".json", "application/json; charset=utf-8"),
+    "pages.zip": (".zip", "application/zip"),
+}
+
+
+def _job_summary(job: Dict) -> Dict:
+    """API の応答に含めるジョブの情報（投入時の条件は含めない）"""
+    return {
+        "job_id": job["job_id"],
+        "clinic_name": job["clinic_name"],
+        "owner": job["owner"],
+        "status": job["status"],
+        "submitted_at": job["submitted_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "done": job["done"],
+        "total": job["total"],
+        "errors": job["errors"],
+        "warnings": job["warnings"],
+        "message": job["message"],
+        "run_id": job["run_id"],
+        "reports": [name for name, (suffix, _) in REPORT_FILES.items() if any(p.endswith(suffix) for p in job["reports"])],
+    }
+
+
+# JSON で指定できる予算の項目
+BUDGET_KEYS = ("max_tokens", "max_ai_calls", "max_minutes")
+
+
+def _job_from_json(body) -> ClinicJob:
+    """JSON の投入内容からチェック条件を作成（不足・型の誤りがあれば ValueError）"""
+    if not isinstance(body, dict):
+        raise ValueError("JSON のオブジェクトを送信してください")
+    if not body.get("clinic_name") or not (body.get("url") or body.get("urls")):
+        raise ValueError("clinic_name と url（または urls）を指定してください")
+    for key in ("clinic_name", "url", "correct_phone", "owner"):
+        if body.get(key) is not None and not isinstance(body[key], str):
+            raise ValueError(f"{key} は文字列で指定してください")
+    urls = body.get("urls") or None
+    if urls is not None and not (isinstance(urls, list) and all(isinstance(u, str) for u in urls)):
+        raise ValueError("urls は URL（文字列）のリストで指定してください")
+    ng_rules = body.get("ng_rules")
+    if ng_rules is not None and not (isinstance(ng_rules, list) and all(_is_ng_rule(rule) for rule in ng_rules)):
+        raise ValueError('ng_rules は {"bad": "...", "good": "..."}（文字列）のリストで指定してください')
+    if body.get("master_data") is not None and not isinstance(body["master_data"], dict):
+        raise ValueError("master_data はオブジェクトで指定してください")
+    return ClinicJob(
+        body["clinic_name"], body.get("url") or urls[0], urls=urls, correct_phone=body.get("correct_phone", ""),
+        ng_rules=body.get("ng_rules"), master_data=body.get("master_data")
+    )
+
+
+def _is_ng_rule(rule) -> bool:
+    """NGルール（表記規定の1行）の形式か（bad・good が文字列のオブジェクト）"""
+    return isinstance(rule, dict) and all(isinstance(rule.get(key), str) for key in ("bad", "good"))
+
+
+def _budget_from_json(value) -> RunBudget:
+    """JSON の budget から実行予算を作成（数値でない・負の値があれば ValueError）"""
+    if not isinstance(value, dict):
+        raise ValueError("budget はオブジェクトで指定してください")
+    for key in BUDGET_KEYS:
+        number = value.get(key, 0)
+        if isinstance(number, bool) or not isinstance(number, (int, float)) or number < 0:
+            raise ValueError(f"budget.{key} は 0 以上の数値で指定してください")
+    return RunBudget.from_config({"budget": {key: value[key] for key in BUDGET_KEYS if key in value}})
+
+
+def _job_from_excel(data: bytes) -> ClinicJob:
+    """DC-config.xlsx の本体からチェック条件を作成（一時ファイルに保存して読み込む。読み込めなければ ValueError）"""
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        return ClinicJob.from_excel(path)
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"DC-config.xlsx を読み込めませんでした: {e}") from e
+    finally:
+        os.remove(path)
+
+
+def _make_handler(queue: JobQueue, token: str = ""):
+    class JobAPIHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if not self._authorized():
+                return
+            url = urlparse(self.path)
+            parts = [p for p in url.path.split("/") if p]
+            if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel":
+                self._cancel(parts[1])
+                return
+            if parts != ["jobs"]:
+                self._send_json(404, {"error": "not found"})
+                return
+            query = parse_qs(url.query)
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+            except ValueError:
+                length = -1
+            if length < 0:
+                self._send_json(400, {"error": "invalid Content-Length"})
+                return
+            data = self.rfile.read(length)
+            content_type = self.headers.get("Content-Type", "").split(";")[0].strip()
+            budget = None
+            try:
+                if content_type in (XLSX_CONTENT_TYPE, "application/octet-stream"):
+                    job = _job_from_excel(data)
+                    owner = query.get("owner", ["api"])[0]
+                else:
+                    body = json.loads(data or b"{}")
+                    job = _job_from_json(body)
+                    owner = body.get("owner") or "api"
+                    if body.get("budget"):
+                        budget = _budget_from_json(body["budget"])
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": "invalid json"})
+                return
+            except ValueError as e:
+                self._send_json(400, {"error": str(e)})
+                return
+
+            job_id = queue.submit(owner, job, budget=budget)
+            self._send_json(202, {"job_id": job_id, "status": queue.get(job_id)["status"]})
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            url = urlparse(self.path)
+            parts = [p for p in url.path.split("/") if p]
+            if parts == ["jobs"]:
+                self._send_json(200, {"jobs": [_job_summary(job) for job in queue.list_jobs()]})
+                return
+            if len(parts) < 2 or parts[0] != "jobs":
+                self._send_json(404, {"error": "not found"})
+                return
+
+            job = queue.get(parts[1])
+            if not job:
+                self._send_json(404, {"error": "job not found"})
+                return
+            if len(parts) == 2:
+                summary = _job_summary(job)
+                if parse_qs(url.query).get("results", ["0"])[0] not in ("0", ""):
+                    summary["results"] = self._results(job)
+                self._send_json(200, summary)
+            elif len(parts) == 3 and parts[2] in REPORT_FILES:
+                self._send_report(job, parts[2])
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def _cancel(self, job_id: str):
+            job = queue.get(job_id)
+            if not job:
+                self._send_json(404, {"error": "job not found"})
+                return
+            status = queue.cancel(job_id)
+            if status is None:
+                self._send_json(409, {"error": "job is already finished", "status": job["status"]})
+                return
+            self._send_json(202, {"job_id": job_id, "status": status})
+
+        def _results(self, job: Dict):
+            """完了したジョブは全ての結果、実行中のジョブはこれまでの結果"""
+            if job["status"] == JOB_DONE:
+                return queue.load_report(job["job_id"])["results"]
+            progress = queue.progress(job["job_id"])
+            return progress.results if progress else []
+
+        def _send_report(self, job: Dict, name: str):
+            suffix, content_type = REPORT_FILES[name]
+            path = next((p for p in job["reports"] if p.endswith(suffix)), None)
+            if job["status"] != JOB_DONE or not path:
+                self._send_json(409, {"error": "report is not ready", "status": job["status"]})
+                return
+            with open(path, "rb") as f:
+                payload = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.send_header("Content-Disposition", f'attachment; filename="{job["job_id"]}-{name}"')
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _authorized(self) -> bool:
+            if token and self.headers.get("Authorization", "") != f"Bearer {token}":
+                self._send_json(401, {"error": "unauthorized"})
+                return False
+            return True
+
+        def _send_json(self, status: int, data: dict):
+            payload = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            # 進捗のポーリングでログが大量に出力されないよう抑制
+            pass
+
+    return JobAPIHandler
+
+
+def start_server(queue: JobQueue, host: str = "127.0.0.1", port: int = 8766, token: str = "") -> ThreadingHTTPServer:
+    """
+    API サーバーをバックグラウンドスレッドで起動（画面と同じプロセスで起動する場合）
+
+    Returns:
+        起動したサーバー（停止時は server.shutdown() を呼ぶ）。port=0 の場合は
+        server.server_address[1] で割り当てられたポートを取得できる
+    """
+    server = ThreadingHTTPServer((host, port), _make_handler(queue, token))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def api_token(config: Dict) -> str:
+    """API のトークン（jobs.api.token、なければ環境変数 JOB_API_TOKEN）"""
+    return config.get("jobs", {}).get("api", {}).get("token") or os.environ.get("JOB_API_TOKEN", "")
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="チェックジョブの HTTP API")
+    parser.add_argument("--config", help="設定ファイル（省略時は config.yaml）")
+    parser.add_argument("--host", help="待ち受けるアドレス（省略時は jobs.api.host）")
+    parser.add_argument("--port", type=int, help="ポート（省略時は jobs.api.port）")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    api_config = config.get("jobs", {}).get("api", {})
+    host = args.host or api_config.get("host", "127.0.0.1")
+    port = args.port or api_config.get("port", 8766)
+
+    # Basic認証情報は環境変数から取得（コマンドライン版と同じ）
+    queue = JobQueue(config, os.environ.get("BASIC_AUTH_ID", ""), os.environ.get("BASIC_AUTH_PASS", ""))
+    queue.start()
+    server = ThreadingHTTPServer((host, port), _make_handler(queue, api_token(config)))
+    print(f"チェックジョブ API 起動: http://{host}:{port}/jobs")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
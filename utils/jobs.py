@@ -0,0 +1,482 @@
+"""
+バックグラウンドのチェックジョブ
+
+画面・HTTP API（utils.job_api）から投入したチェックを、画面のスクリプトとは別のワーカースレッドで実行する。
+ジョブの状態は SQLite のジョブ表に保存し、画面は進捗・途中結果をポーリングして表示する
+（画面の操作・再読み込みでチェックが止まらない）。
+複数の利用者のジョブは、実行中のジョブが少ない利用者から順に割り当てて（公平なスケジューリング）同時に実行する。
+ジョブ表は複数のプロセス（画面と単独起動の API サーバー等）で共有でき、同じ条件のジョブは二重に実行しない。
+実行中のジョブは定期的に生存を記録し、記録が途絶えたジョブ（サーバーの停止等で中断）は途中経過の記録
+（utils.checkpoint）から再開する。中止を要求したジョブは、待機中なら実行せず、実行中ならそれまでの結果でレポートを作成する。
+"""
+
+import hashlib
+import json
+import os
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional, Tuple
+
+from utils.budget import CancelToken, RunBudget
+from utils.runner import ClinicJob, ProgressReporter, count_statuses, page_texts_zip, resume_clinic, run_clinic, write_reports
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+STATUS_LABELS = {
+    JOB_QUEUED: "待機中",
+    JOB_RUNNING: "実行中",
+    JOB_DONE: "完了",
+    JOB_FAILED: "失敗",
+    JOB_CANCELLED: "中止",
+}
+
+_COLUMNS = (
+    "job_id", "owner", "clinic_name", "status", "submitted_at", "started_at", "finished_at", "run_id",
+    "params", "done", "total", "errors", "warnings", "reports", "message", "fingerprint", "worker", "heartbeat_at",
+    "cancel_requested"
+)
+
+# 作成後に追加した列（既存のジョブ表に追加する）
+_ADDED_COLUMNS = {
+    "fingerprint": "TEXT", "worker": "TEXT", "heartbeat_at": "REAL", "cancel_requested": "INTEGER NOT NULL DEFAULT 0"
+}
+
+
+class JobStore:
+    """ジョブ表（SQLite、スレッドセーフ）"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLiteファイルのパス
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " job_id TEXT PRIMARY KEY,"
+                " owner TEXT NOT NULL,"
+                " clinic_name TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " submitted_at REAL NOT NULL,"
+                " started_at REAL,"
+                " finished_at REAL,"
+                " run_id TEXT,"
+                " params TEXT NOT NULL,"
+                " done INTEGER NOT NULL DEFAULT 0,"
+                " total INTEGER NOT NULL DEFAULT 0,"
+                " errors INTEGER NOT NULL DEFAULT 0,"
+                " warnings INTEGER NOT NULL DEFAULT 0,"
+                " reports TEXT NOT NULL DEFAULT '[]',"
+                " message TEXT NOT NULL DEFAULT '')"
+            )
+            existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for name, column_type in _ADDED_COLUMNS.items():
+                if name not in existing:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {column_type}")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, submitted_at)")
+            self._conn.commit()
+
+    def _row(self, row) -> Dict:
+        job = dict(zip(_COLUMNS, row))
+        job["params"] = json.loads(job["params"])
+        job["reports"] = json.loads(job["reports"])
+        return job
+
+    def insert(self, owner: str, clinic_name: str, params: Dict, run_id: Optional[str] = None, fingerprint: Optional[str] = None) -> str:
+        """
+        ジョブを追加（fingerprint が同じジョブが待機中・実行中なら追加せず、そのジョブIDを返す）
+        """
+        job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+        with self._lock:
+            # 複数のプロセスから同時に投入されても二重に追加しないよう、確認と追加を1つのトランザクションで行う
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if fingerprint:
+                    row = self._conn.execute(
+                        "SELECT job_id FROM jobs WHERE fingerprint = ? AND status IN (?, ?)", (fingerprint, JOB_QUEUED, JOB_RUNNING)
+                    ).fetchone()
+                    if row:
+                        self._conn.rollback()
+                        return row[0]
+                self._conn.execute(
+                    "INSERT INTO jobs (job_id, owner, clinic_name, status, submitted_at, run_id, params, fingerprint) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, owner, clinic_name, JOB_QUEUED, time.time(), run_id, json.dumps(params, ensure_ascii=False, default=str), fingerprint)
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return job_id
+
+    def claim(self, job_id: str, worker: str) -> bool:
+        """待機中のジョブを実行中にする（他のプロセスが先に取り出した場合は False）"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, worker = ?, heartbeat_at = ? WHERE job_id = ? AND status = ?",
+                (JOB_RUNNING, now, worker, now, job_id, JOB_QUEUED)
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job_ids: List[str]):
+        """実行中のジョブの生存を記録"""
+        with self._lock:
+            self._conn.executemany("UPDATE jobs SET heartbeat_at = ? WHERE job_id = ?", [(time.time(), job_id) for job_id in job_ids])
+            self._conn.commit()
+
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        """
+        ジョブの中止を要求（待機中のジョブは中止済みにし、実行中のジョブは実行しているプロセスが中断する）
+
+        Returns:
+            要求後の状態（完了・失敗・中止済みのジョブ、存在しないジョブは None）
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, message = ? WHERE job_id = ? AND status = ?",
+                (JOB_CANCELLED, time.time(), "実行前に中止しました", job_id, JOB_QUEUED)
+            )
+            if cursor.rowcount:
+                self._conn.commit()
+                return JOB_CANCELLED
+            cursor = self._conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE job_id = ? AND status = ?", (job_id, JOB_RUNNING)
+            )
+            self._conn.commit()
+        return JOB_RUNNING if cursor.rowcount else None
+
+    def cancel_requested(self, job_ids: List[str]) -> List[str]:
+        """中止を要求されたジョブ（指定したジョブのうち）"""
+        if not job_ids:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT job_id FROM jobs WHERE cancel_requested = 1 AND job_id IN ({', '.join('?' for _ in job_ids)})", job_ids
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def owner_stats(self) -> Dict[str, Tuple[int, float]]:
+        """利用者ごとの (実行中のジョブ数, 直近のジョブの開始時刻)（全プロセス分）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT owner, SUM(status = ?), MAX(COALESCE(started_at, 0)) FROM jobs GROUP BY owner", (JOB_RUNNING,)
+            ).fetchall()
+        return {owner: (running or 0, last_started or 0.0) for owner, running, last_started in rows}
+
+    def update(self, job_id: str, **fields):
+        """指定した列を更新（reports はリストのまま渡す）"""
+        if "reports" in fields:
+            fields["reports"] = json.dumps(fields["reports"], ensure_ascii=False)
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """ジョブの一覧（新しい順。status 指定時はその状態のみを古い順）"""
+        with self._lock:
+            if status:
+                rows = self._conn.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE status = ? ORDER BY submitted_at LIMIT ?", (status, limit)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM jobs ORDER BY submitted_at DESC LIMIT ?", (limit,)
+                ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def requeue_stale(self, max_age: float) -> int:
+        """
+        生存の記録が max_age 秒以上途絶えた実行中のジョブ（実行していたプロセスの停止で中断）を待機中に戻す
+
+        Returns:
+            戻した件数
+        """
+        with self._lock:
+            # 中止を要求された後に中断したジョブは再開しない
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, finished_at = ?, message = ?"
+                " WHERE status = ? AND COALESCE(heartbeat_at, 0) < ? AND cancel_requested = 1",
+                (JOB_CANCELLED, time.time(), "中止しました", JOB_RUNNING, time.time() - max_age)
+            )
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND COALESCE(heartbeat_at, 0) < ?",
+                (JOB_QUEUED, JOB_RUNNING, time.time() - max_age)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+
+class JobProgress(ProgressReporter):
+    """ジョブの進捗をジョブ表に記録し、途中結果を保持"""
+
+    def __init__(self, store: JobStore, job_id: str, interval: float = 2.0):
+        super().__init__()
+        self.store = store
+        self.job_id = job_id
+        self.interval = interval
+        self.stage_metrics: List[Dict] = []
+        self.done = 0
+        self.total = 0
+        # 処理速度（ページ/秒）と残り秒数の見込み
+        self.rate = 0.0
+        self.eta: Optional[float] = None
+        # これまでに届いた結果（HTTP API からの参照用。届いた順）
+        self._results: List[Dict] = []
+        self._last_saved = 0.0
+
+    def start(self, run_id: Optional[str]):
+        if run_id:
+            self.store.update(self.job_id, run_id=run_id)
+
+    def add_results(self, results: List[Dict]):
+        super().add_results(results)
+        with self._results_lock:
+            self._results.extend(results)
+
+    @property
+    def results(self) -> List[Dict]:
+        """これまでに届いた結果の複製"""
+        with self._results_lock:
+            return list(self._results)
+
+    def update(self, done: int, total: int, results: List[Dict], metrics: List[Dict]):
+        self.stage_metrics = metrics
+        self.done, self.total = done, total
+        self.rate, self.eta = self.pace(done, total)
+        now = time.monotonic()
+        if now - self._last_saved < self.interval and done < total:
+            return
+        self._last_saved = now
+        self.store.update(self.job_id, done=done, total=total, errors=self.counts["error"], warnings=self.counts["warning"])
+
+
+class JobQueue:
+    """チェックジョブの待ち行列とワーカースレッド"""
+
+    def __init__(self, config: Dict, auth_id: str = "", auth_pass: str = ""):
+        """
+        Args:
+            config: 設定辞書（jobs を参照）
+            auth_id: Basic認証ID
+            auth_pass: Basic認証パスワード
+        """
+        jobs_config = config.get("jobs", {})
+        self.config = config
+        self.auth_id = auth_id
+        self.auth_pass = auth_pass
+        # 同時に実行するジョブ数
+        self.workers = max(1, jobs_config.get("workers", 2))
+        self.output_dir = jobs_config.get("output_dir", ".cache/jobs")
+        self.store = JobStore(jobs_config.get("db_path", ".cache/jobs.sqlite3"))
+        # 生存を記録する間隔と、中断とみなすまでの時間（秒）
+        self.heartbeat_interval = jobs_config.get("heartbeat_seconds", 10)
+        self.stale_after = jobs_config.get("stale_seconds", 60)
+        # ジョブ表を共有する他のプロセスと区別するための名前
+        self.worker_name = f"{socket.gethostname()}:{os.getpid()}"
+        # このプロセスで実行中のジョブの進捗（途中結果の参照用）と中断の通知
+        self._running: Dict[str, JobProgress] = {}
+        self._cancel_tokens: Dict[str, CancelToken] = {}
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        """ワーカースレッドと生存記録のスレッドを起動"""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _heartbeat(self):
+        """
+        実行中のジョブの生存を記録し、中断したジョブ（自他のプロセスの停止）を待機中に戻す
+
+        他のプロセス（API サーバー等）で中止を要求された実行中のジョブもここで中断する
+        """
+        while True:
+            if self._running:
+                self.store.heartbeat(list(self._running))
+                for job_id in self.store.cancel_requested(list(self._cancel_tokens)):
+                    self._cancel_running(job_id)
+            requeued = self.store.requeue_stale(self.stale_after)
+            if requeued:
+                print(f"中断したジョブ {requeued}件を再開します")
+                with self._cond:
+                    self._cond.notify_all()
+            time.sleep(self.heartbeat_interval)
+
+    def submit(self, owner: str, job: ClinicJob, budget: Optional[RunBudget] = None,
+               inbound_counts: Optional[Dict[str, int]] = None, estimate: Optional[Dict] = None,
+               run_id: Optional[str] = None) -> str:
+        """
+        ジョブを投入
+
+        Args:
+            owner: 投入した利用者（公平なスケジューリングの単位）
+            job: チェック条件
+            budget: 実行予算（省略時は config の budget）
+            inbound_counts: URL抽出時に数えた被リンク数（チェック順の決定に使用）
+            estimate: 実行前の見積もり
+            run_id: 中断したチェックの実行ID（指定時はその記録から再開）
+
+        Returns:
+            ジョブID（同じ条件のジョブが待機中・実行中の場合はそのジョブID）
+        """
+        budget = budget or RunBudget.from_config(self.config)
+        params = {
+            "job": job.to_dict(),
+            "budget": {"max_tokens": budget.max_tokens, "max_ai_calls": budget.max_ai_calls, "max_seconds": budget.max_seconds},
+            "inbound_counts": inbound_counts,
+            "estimate": estimate,
+        }
+        # チェック対象・条件が同じジョブは、投入元（画面・API）や予算が異なっても同じ作業とみなす
+        fingerprint = hashlib.sha256(
+            json.dumps({"job": params["job"], "run_id": run_id}, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        job_id = self.store.insert(owner, job.clinic_name, params, run_id=run_id, fingerprint=fingerprint)
+        with self._cond:
+            self._cond.notify()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self.store.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """
+        ジョブを中止（実行中のジョブは取得・リンク確認・AI呼び出しを打ち切り、それまでの結果でレポートを作成）
+
+        Returns:
+            JobStore.request_cancel() と同じ
+        """
+        status = self.store.request_cancel(job_id)
+        if status == JOB_RUNNING:
+            # このプロセスで実行中なら直ちに中断（他のプロセスでは生存記録の間隔で中断）
+            self._cancel_running(job_id)
+        return status
+
+    def _cancel_running(self, job_id: str):
+        token = self._cancel_tokens.get(job_id)
+        if token:
+            token.cancel("利用者が中止した")
+
+    def list_jobs(self, limit: int = 50) -> List[Dict]:
+        return self.store.list_jobs(limit=limit)
+
+    def progress(self, job_id: str) -> Optional[JobProgress]:
+        """実行中のジョブの進捗（途中結果 results・段階ごとの統計 stage_metrics。実行中でなければ None）"""
+        return self._running.get(job_id)
+
+    def load_report(self, job_id: str) -> Optional[Dict]:
+        """
+        完了したジョブのレポート
+
+        Returns:
+            JsonReporter の出力（clinic_name・checked_urls・results・ai_usage・pipeline）に
+            Excelレポート（excel_data）と診断用テキスト（pages_zip）のバイト列を加えた辞書。未完了の場合は None
+        """
+        job = self.store.get(job_id)
+        if not job or job["status"] != JOB_DONE:
+            return None
+        report = {"excel_data": None, "pages_zip": None}
+        for path in job["reports"]:
+            if path.endswith(".json"):
+                with open(path, "r", encoding="utf-8") as f:
+                    report.update(json.load(f))
+            else:
+                with open(path, "rb") as f:
+                    report["pages_zip" if path.endswith(".zip") else "excel_data"] = f.read()
+        return report
+
+    def _next_job(self) -> Dict:
+        """
+        次に実行するジョブを取り出す（待機中のジョブがなければ待つ）
+
+        実行中のジョブが少ない利用者、同数なら直近のジョブの開始が古い利用者を優先する（利用者ごとに順番に実行）。
+        同じ利用者のジョブは投入順。1人が大量に投入しても、後から投入した他の利用者のジョブが待たされ続けない。
+        ジョブ表を共有する全プロセスの実行状況で判定する
+        """
+        with self._cond:
+            while True:
+                queued = self.store.list_jobs(status=JOB_QUEUED, limit=1000)
+                if queued:
+                    stats = self.store.owner_stats()
+                    for job in sorted(queued, key=lambda j: (*stats.get(j["owner"], (0, 0.0)), j["submitted_at"])):
+                        if self.store.claim(job["job_id"], self.worker_name):
+                            return job
+                    continue
+                # 他のプロセスが投入したジョブも拾えるよう、通知がなくても定期的に確認
+                self._cond.wait(timeout=5)
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            try:
+                self._execute(job)
+            finally:
+                self._running.pop(job["job_id"], None)
+                self._cancel_tokens.pop(job["job_id"], None)
+
+    def _execute(self, job: Dict):
+        job_id = job["job_id"]
+        params = job["params"]
+        progress = JobProgress(self.store, job_id)
+        self._running[job_id] = progress
+        budget = RunBudget(**params["budget"])
+        self._cancel_tokens[job_id] = budget.cancel_token
+        if job["cancel_requested"]:
+            # 中止の要求と実行の開始が重なった場合
+            budget.cancel_token.cancel("利用者が中止した")
+        try:
+            if job["run_id"]:
+                report = resume_clinic(job["run_id"], self.config, self.auth_id, self.auth_pass, budget=budget, progress=progress)
+            else:
+                report = run_clinic(
+                    ClinicJob.from_dict(params["job"]), self.config, self.auth_id, self.auth_pass, budget=budget,
+                    progress=progress, inbound_counts=params["inbound_counts"], estimate=params["estimate"]
+                )
+            if not report["checked_urls"]:
+                if report["interrupted"]:
+                    self.store.update(job_id, status=JOB_CANCELLED, finished_at=time.time(), message=f"{report['interrupted']}ため中断しました")
+                else:
+                    self.store.update(job_id, status=JOB_FAILED, finished_at=time.time(), message="有効なページ情報を取得できませんでした")
+                return
+            output_dir = os.path.join(self.output_dir, job_id)
+            reports = write_reports(report, self.config, output_dir)
+            with open(os.path.join(output_dir, "pages.zip"), "wb") as f:
+                f.write(page_texts_zip(report["pages"]))
+            reports.append(os.path.join(output_dir, "pages.zip"))
+            counts = count_statuses(report["results"])
+            self.store.update(
+                job_id, status=JOB_DONE, finished_at=time.time(), reports=reports,
+                done=len(report["checked_urls"]), total=len(report["checked_urls"]),
+                errors=counts["error"], warnings=counts["warning"],
+                message=f"{report['interrupted']}ため、一部のページは未チェックです" if report["interrupted"] else ""
+            )
+        except Exception as e:
+            print(f"エラー (ジョブ: {job_id}): {e}")
+            traceback.print_exc()
+            self.store.update(job_id, status=JOB_FAILED, finished_at=time.time(), message=str(e))
@@ -0,0 +1,138 @@
+"""
+プロセス間で共有する同時実行数・AI利用量の制限
+
+バッチ実行では複数の医院を別々のプロセスで並行してチェックするため、
+AI API の同時呼び出し数・1分あたりの呼び出し数（APIのレート制限）、全医院合計のAI呼び出し回数・トークン数の上限と、
+ホストごとの同時リクエスト数（相手サーバーへの配慮）を全プロセスで共有する。
+制限は SharedLimits.create() で作成し、各プロセスで install() する。
+単独実行（画面・コマンドライン）では制限を設定しないため何もしない。
+"""
+
+import time
+import zlib
+from contextlib import contextmanager, nullcontext
+from typing import List, Optional
+from urllib.parse import urlparse
+
+
+class SharedQuotaExceeded(Exception):
+    """全プロセス合計のAI利用量の上限に達した（RunBudget が BudgetExceededError に変換する）"""
+
+
+class SharedLimits:
+    """AI呼び出し・ホストごとのリクエストの同時実行数と、全プロセス合計のAI利用量の制限"""
+
+    def __init__(self, ai_semaphore=None, host_semaphores: Optional[List] = None, usage=None, usage_lock=None,
+                 max_ai_calls: int = 0, max_tokens: int = 0, ai_per_minute: int = 0):
+        """
+        Args:
+            ai_semaphore: AI呼び出しの同時実行数を制限するセマフォ（None なら制限なし）
+            host_semaphores: ホストごとのリクエストを制限するセマフォの列（ホスト名のハッシュで割り当て）
+            usage: 全プロセス合計の利用量（ai_calls・tokens・次にAIを呼び出せる時刻 next_ai_at）を保持する共有辞書
+            usage_lock: usage を更新する際のロック
+            max_ai_calls: 全プロセス合計のAI呼び出し回数の上限（0 は無制限）
+            max_tokens: 全プロセス合計のトークン数の上限（0 は無制限）
+            ai_per_minute: 全プロセス合計の1分あたりのAI呼び出し数（0 は無制限）
+        """
+        self.ai_semaphore = ai_semaphore
+        self.host_semaphores = host_semaphores or []
+        self.usage = usage
+        self.usage_lock = usage_lock
+        self.max_ai_calls = max_ai_calls
+        self.max_tokens = max_tokens
+        self.ai_per_minute = ai_per_minute
+
+    @classmethod
+    def create(cls, manager, ai_concurrency: int = 0, per_host: int = 0, host_slots: int = 64,
+               max_ai_calls: int = 0, max_tokens: int = 0, ai_per_minute: int = 0) -> "SharedLimits":
+        """
+        プロセス間で共有する制限を作成
+
+        Args:
+            manager: multiprocessing.Manager()（セマフォ・利用量をプロセス間で共有するため）
+            ai_concurrency: 全プロセス合計のAI同時呼び出し数（0 は無制限）
+            per_host: 同一ホストへの同時リクエスト数（0 は無制限）
+            host_slots: ホストを割り当てるセマフォの数（異なるホストが同じセマフォを共有することがある）
+            max_ai_calls: 全プロセス合計のAI呼び出し回数の上限（0 は無制限）
+            max_tokens: 全プロセス合計のトークン数の上限（0 は無制限）
+            ai_per_minute: 全プロセス合計の1分あたりのAI呼び出し数（0 は無制限）
+        """
+        ai_semaphore = manager.BoundedSemaphore(ai_concurrency) if ai_concurrency > 0 else None
+        host_semaphores = [manager.BoundedSemaphore(per_host) for _ in range(host_slots)] if per_host > 0 else []
+        usage = usage_lock = None
+        if max_ai_calls > 0 or max_tokens > 0 or ai_per_minute > 0:
+            usage = manager.dict(ai_calls=0, tokens=0, next_ai_at=0.0)
+            usage_lock = manager.Lock()
+        return cls(ai_semaphore, host_semaphores, usage, usage_lock, max_ai_calls, max_tokens, ai_per_minute)
+
+    def acquire_ai_call(self):
+        """
+        全プロセス合計のAI呼び出し1回分の予算を確保（RunBudget.acquire_ai_call() から呼び出される）
+
+        Raises:
+            SharedQuotaExceeded: 呼び出し回数・トークン数の上限に達している場合
+        """
+        if self.usage is None or not (self.max_ai_calls or self.max_tokens):
+            return
+        with self.usage_lock:
+            if self.max_ai_calls and self.usage["ai_calls"] >= self.max_ai_calls:
+                raise SharedQuotaExceeded(f"一括チェック全体のAI呼び出し回数の上限（{self.max_ai_calls}回）に達しました")
+            if self.max_tokens and self.usage["tokens"] >= self.max_tokens:
+                raise SharedQuotaExceeded(f"一括チェック全体のトークン数の上限（{self.max_tokens:,}）に達しました")
+            self.usage["ai_calls"] += 1
+
+    def add_tokens(self, tokens: int):
+        """全プロセス合計の消費トークン数を加算"""
+        if self.usage is None or not self.max_tokens:
+            return
+        with self.usage_lock:
+            self.usage["tokens"] += tokens
+
+    def _wait_ai_rate(self):
+        """1分あたりの呼び出し数を超えないよう、前の呼び出しから一定間隔を空ける"""
+        if self.usage is None or not self.ai_per_minute:
+            return
+        with self.usage_lock:
+            # プロセス間で比較するため壁時計の時刻を使用
+            now = time.time()
+            start_at = max(now, self.usage["next_ai_at"])
+            self.usage["next_ai_at"] = start_at + 60.0 / self.ai_per_minute
+        if start_at > now:
+            time.sleep(start_at - now)
+
+    @contextmanager
+    def _acquire(self, semaphore):
+        semaphore.acquire()
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    def ai_slot(self):
+        """AI呼び出し1回分の枠を確保（with 文で使用。1分あたりの呼び出し数の制限では開始まで待機する）"""
+        self._wait_ai_rate()
+        if self.ai_semaphore is None:
+            return nullcontext()
+        return self._acquire(self.ai_semaphore)
+
+    def host_slot(self, url: str):
+        """URLのホストへのリクエスト1件分の枠を確保（with 文で使用）"""
+        if not self.host_semaphores:
+            return nullcontext()
+        host = urlparse(url).netloc.lower()
+        # プロセスごとに結果が変わる hash() ではなく crc32 で割り当てる
+        return self._acquire(self.host_semaphores[zlib.crc32(host.encode("utf-8")) % len(self.host_semaphores)])
+
+
+_installed = SharedLimits()
+
+
+def install(limits: SharedLimits):
+    """このプロセスで使用する制限を設定（バッチ実行のワーカープロセスの初期化時に呼び出す）"""
+    global _installed
+    _installed = limits
+
+
+def shared_limits() -> SharedLimits:
+    """このプロセスで使用する制限"""
+    return _installed
@@ -0,0 +1,209 @@
+"""
+LLMバックエンド
+
+AIHelper から呼び出すモデルの実装を切り替え可能にする
+- gemini: Google Gemini API
+- mock: ローカルのモックサーバー（utils/mock_llm_server.py）。負荷試験・オフライン検証用
+"""
+
+import os
+import sys
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+import requests
+
+from utils.context_cache import GeminiContextCache, LocalContextCache
+
+
+class LLMResponse:
+    """モデルの応答"""
+
+    def __init__(
+        self,
+        text: str,
+        prompt_tokens: Optional[int] = None,
+        response_tokens: Optional[int] = None,
+        cached_tokens: Optional[int] = None
+    ):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.response_tokens = response_tokens
+        self.cached_tokens = cached_tokens
+
+
+class LLMBackend(ABC):
+    """全バックエンドの基底クラス"""
+
+    def __init__(self, config: dict):
+        """
+        Args:
+            config: 設定辞書
+        """
+        self.config = config
+        self.api_config = config.get("api", {})
+        self.model_name = self.api_config.get("model", "gemini-2.0-flash")
+
+    @abstractmethod
+    def generate(self, prompt: str, response_schema: Optional[Dict] = None) -> LLMResponse:
+        """
+        プロンプトからテキストを生成
+
+        Args:
+            prompt: プロンプト全文
+            response_schema: 指定時は、このスキーマに従う JSON を応答させる
+
+        Returns:
+            LLMResponse（失敗時は例外を送出）
+        """
+        raise NotImplementedError
+
+    def generate_with_prefix(self, prefix: str, payload: str, response_schema: Optional[Dict] = None) -> LLMResponse:
+        """
+        固定部（実行中不変）とページ部からテキストを生成
+
+        既定では両者を連結して送信する。コンテキストキャッシュに対応する
+        バックエンドはオーバーライドして固定部をキャッシュに載せる。
+        """
+        return self.generate(prefix + "\n\n" + payload, response_schema)
+
+    def close(self):
+        """実行の終了時に呼び出す（モデル側に作成した資源を削除。既定では何もしない）"""
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini API"""
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        import google.generativeai as genai
+
+        api_key = self._resolve_api_key()
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(self.model_name)
+
+        local_cache = LocalContextCache(self.model.generate_content)
+        cache_config = self.api_config.get("context_cache", {})
+        if cache_config.get("enabled", True):
+            self.context_cache = GeminiContextCache(
+                self.model_name,
+                fallback=local_cache,
+                ttl_minutes=cache_config.get("ttl_minutes", 60)
+            )
+        else:
+            self.context_cache = local_cache
+
+    def generate(self, prompt: str, response_schema: Optional[Dict] = None) -> LLMResponse:
+        return self._to_response(self.model.generate_content(prompt, **self._options(response_schema)))
+
+    def generate_with_prefix(self, prefix: str, payload: str, response_schema: Optional[Dict] = None) -> LLMResponse:
+        return self._to_response(self.context_cache.generate(prefix, payload, **self._options(response_schema)))
+
+    def close(self):
+        self.context_cache.close()
+
+    def _options(self, response_schema: Optional[Dict]) -> Dict:
+        """generate_content のキーワード引数（スキーマ指定時は JSON モード）"""
+        if not response_schema:
+            return {}
+        return {"generation_config": {"response_mime_type": "application/json", "response_schema": response_schema}}
+
+    def _to_response(self, response) -> LLMResponse:
+        """Geminiの応答を LLMResponse に変換（usage_metadata からトークン数を取得）"""
+        usage = getattr(response, "usage_metadata", None)
+        return LLMResponse(
+            text=response.text,
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            response_tokens=getattr(usage, "candidates_token_count", None),
+            cached_tokens=getattr(usage, "cached_content_token_count", None)
+        )
+
+    def _resolve_api_key(self) -> str:
+        """APIキーを Streamlit Secrets → 環境変数 の順に取得"""
+        # APIキーの取得候補
+        key_names = ["GEMINI_API_KEY", "GOOGLE_API_KEY"]
+        api_key = None
+
+        # 1. st.secrets から取得（Streamlit の画面から実行している場合のみ。コマンドラインでは streamlit を読み込まない）
+        if "streamlit" in sys.modules:
+            try:
+                import streamlit as st
+
+                for kn in key_names:
+                    if kn in st.secrets:
+                        api_key = st.secrets[kn]
+                        break
+
+                # セクション分けされている場合([gemini] api_key = "...")
+                if not api_key:
+                    if "gemini" in st.secrets and "api_key" in st.secrets["gemini"]:
+                        api_key = st.secrets["gemini"]["api_key"]
+                    elif "google" in st.secrets and "api_key" in st.secrets["google"]:
+                        api_key = st.secrets["google"]["api_key"]
+            except Exception:
+                # st.secrets が使えない環境（secrets.toml がない場合など）
+                pass
+
+        # 2. 環境変数 から取得
+        if not api_key:
+            for kn in key_names:
+                api_key = os.environ.get(kn)
+                if api_key:
+                    break
+
+        if not api_key:
+            raise ValueError(
+                "Gemini APIキーが見つかりません。\n"
+                "以下のいずれかを設定してください：\n"
+                "1. Streamlit Secrets (GEMINI_API_KEY または GOOGLE_API_KEY)\n"
+                "2. 環境変数 (GEMINI_API_KEY または GOOGLE_API_KEY)"
+            )
+        return api_key
+
+
+class MockHTTPBackend(LLMBackend):
+    """ローカルのモックサーバー（utils/mock_llm_server.py）に問い合わせるバックエンド"""
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        mock_config = self.api_config.get("mock", {})
+        self.url = mock_config.get("url", "http://127.0.0.1:8765/generate")
+        self.timeout = mock_config.get("timeout", 30)
+
+    def generate(self, prompt: str, response_schema: Optional[Dict] = None) -> LLMResponse:
+        body = {"model": self.model_name, "prompt": prompt}
+        if response_schema:
+            body["response_schema"] = response_schema
+        response = requests.post(self.url, json=body, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        usage = data.get("usage", {})
+        return LLMResponse(
+            text=data.get("text", ""),
+            prompt_tokens=usage.get("prompt_tokens"),
+            response_tokens=usage.get("response_tokens")
+        )
+
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "mock": MockHTTPBackend,
+}
+
+
+def create_backend(config: dict) -> LLMBackend:
+    """
+    設定（api.backend）に応じたバックエンドを生成
+
+    api.cassette.mode が指定されている場合は、応答を記録・再生するカセットで包む
+    """
+    api_config = config.get("api", {})
+    name = api_config.get("backend", "gemini")
+    if name not in BACKENDS:
+        raise ValueError(f"未対応のAIバックエンドです: {name}（{', '.join(BACKENDS)} のいずれかを指定してください）")
+
+    mode = api_config.get("cassette", {}).get("mode", "off")
+    if mode and mode != "off":
+        from utils.cassette import CassetteBackend
+        return CassetteBackend(config, inner_factory=lambda: BACKENDS[name](config))
+    return BACKENDS[name](config)
@@ -0,0 +1,164 @@
+"""
+LLMモックサーバー
+
+ネットワークやAPIクォータなしで AI 呼び出しを含むチェックの負荷試験を行うための
+ローカルHTTPサーバー。遅延・エラー率・応答内容を設定できる。
+
+使い方:
+    python -m utils.mock_llm_server --port 8765 --latency 1.5 --jitter 0.5 --error-rate 0.05
+
+config.yaml:
+    api:
+      backend: "mock"
+      mock:
+        url: "http://127.0.0.1:8765/generate"
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+DEFAULT_RESPONSE = "問題なし"
+# レスポンススキーマ指定時（構造化出力）の既定の応答
+DEFAULT_JSON_RESPONSE = '{"findings": []}'
+
+
+class MockLLMSettings:
+    """モックサーバーの動作設定"""
+
+    def __init__(
+        self,
+        latency: float = 1.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        responses: Optional[List[Dict]] = None,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            latency: 応答までの平均遅延（秒）
+            jitter: 遅延のばらつき（秒、±の一様乱数）
+            error_rate: エラー（HTTP 503）を返す確率（0.0〜1.0）
+            responses: 定型応答のリスト。{"match": "部分文字列", "text": "応答"} の形式で、
+                       プロンプトに match を含む最初の応答を返す（match 省略時は常に一致）
+            seed: 乱数シード（再現性のある負荷試験用）
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.responses = responses or []
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.error_count = 0
+
+    def pick_response(self, prompt: str, structured: bool = False) -> str:
+        """プロンプトに一致する定型応答を選択（structured: レスポンススキーマ指定時）"""
+        default = DEFAULT_JSON_RESPONSE if structured else DEFAULT_RESPONSE
+        for response in self.responses:
+            if response.get("match", "") in prompt:
+                return response.get("text", default)
+        return default
+
+
+def _make_handler(settings: MockLLMSettings):
+    class MockLLMHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": "invalid json"})
+                return
+            prompt = body.get("prompt", "")
+
+            with settings.lock:
+                settings.request_count += 1
+                delay = max(0.0, settings.latency + settings.random.uniform(-settings.jitter, settings.jitter))
+                fail = settings.random.random() < settings.error_rate
+                if fail:
+                    settings.error_count += 1
+
+            time.sleep(delay)
+
+            if fail:
+                self._send_json(503, {"error": "mock error"})
+                return
+
+            text = settings.pick_response(prompt, structured=bool(body.get("response_schema")))
+            self._send_json(200, {
+                "text": text,
+                "usage": {
+                    # 日本語は概ね1文字 = 1トークンとして概算
+                    "prompt_tokens": len(prompt),
+                    "response_tokens": len(text),
+                },
+            })
+
+        def do_GET(self):
+            # 動作確認用の統計
+            with settings.lock:
+                stats = {"requests": settings.request_count, "errors": settings.error_count}
+            self._send_json(200, stats)
+
+        def _send_json(self, status: int, data: dict):
+            payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            # 負荷試験時にログが大量に出力されないよう抑制
+            pass
+
+    return MockLLMHandler
+
+
+def start_server(settings: MockLLMSettings, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """
+    モックサーバーをバックグラウンドスレッドで起動
+
+    Returns:
+        起動したサーバー（停止時は server.shutdown() を呼ぶ）。port=0 の場合は
+        server.server_address[1] で割り当てられたポートを取得できる
+    """
+    server = ThreadingHTTPServer((host, port), _make_handler(settings))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLMモックサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=1.0, help="平均遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延のばらつき（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="エラーを返す確率（0.0〜1.0）")
+    parser.add_argument("--responses", help="定型応答のJSONファイル（[{\"match\": ..., \"text\": ...}, ...]）")
+    parser.add_argument("--seed", type=int, help="乱数シード")
+    args = parser.parse_args()
+
+    responses = []
+    if args.responses:
+        with open(args.responses, "r", encoding="utf-8") as f:
+            responses = json.load(f)
+
+    settings = MockLLMSettings(args.latency, args.jitter, args.error_rate, responses, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), _make_handler(settings))
+    print(f"LLMモックサーバー起動: http://{args.host}:{args.port}/generate")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
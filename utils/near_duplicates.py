@@ -0,0 +1,142 @@
+"""
+ほぼ同一ページの検出（SimHash）
+
+ページ送り・印刷用ページ・?replytocom= 付きURL・タグ一覧など、exclude_patterns を
+すり抜けた内容がほぼ同じページを本文の SimHash で検出し、代表ページにまとめる
+"""
+
+import hashlib
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+FINGERPRINT_BITS = 64
+
+
+def simhash(text: str, shingle_size: int = 4) -> int:
+    """
+    本文の SimHash（64ビット）
+
+    空白を除去した文字 n-gram を特徴量とする（日本語は単語の区切りがないため）
+    """
+    compact = re.sub(r"\s+", "", text)
+    shingles = {compact[i:i + shingle_size] for i in range(max(1, len(compact) - shingle_size + 1))}
+    digests = [hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest() for s in shingles]
+
+    # ビット位置ごとに立っている特徴量の数を数え、過半数なら1（バイト単位で集計して高速化）
+    fingerprint = 0
+    half = len(digests) / 2
+    for position in range(8):
+        bit_counts = [0] * 8
+        for value, count in Counter(d[position] for d in digests).items():
+            for bit in range(8):
+                if value >> bit & 1:
+                    bit_counts[bit] += count
+        for bit, count in enumerate(bit_counts):
+            if count > half:
+                fingerprint |= 1 << (position * 8 + bit)
+    return fingerprint
+
+
+def similarity(a: int, b: int) -> float:
+    """2つの SimHash の類似度（一致するビットの割合）"""
+    return 1 - bin(a ^ b).count("1") / FINGERPRINT_BITS
+
+
+class NearDuplicateDetector:
+    """クロール中にページの SimHash を記録し、ほぼ同一のページをまとめる（スレッドセーフ）"""
+
+    def __init__(self, config: dict):
+        """
+        Args:
+            config: 設定辞書（crawler.near_duplicates を参照）
+        """
+        dedup_config = config.get("crawler", {}).get("near_duplicates", {})
+        self.enabled = dedup_config.get("enabled", True)
+        # ほぼ同一とみなす類似度（0.95 = 64ビット中3ビット以内の差）
+        self.threshold = dedup_config.get("similarity", 0.95)
+        # 極端に短いページ（リダイレクト先の空ページ等）は誤判定を避けるため対象外
+        self.min_length = dedup_config.get("min_length", 200)
+        self.fingerprints: Dict[str, int] = {}
+        # match() で確定した代表ページと重複ページ（到着順）
+        self.representatives: List[Tuple[str, int]] = []
+        self.duplicates: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, url: str, text: str, fingerprint: Optional[int] = None):
+        """
+        取得したページの SimHash を記録
+
+        Args:
+            fingerprint: 算出済みの SimHash（プロセスプールで解析した場合）
+        """
+        if not self.enabled or len(text) < self.min_length:
+            return
+        if fingerprint is None:
+            fingerprint = simhash(text)
+        with self._lock:
+            self.fingerprints[url] = fingerprint
+
+    def match(self, url: str) -> Optional[Tuple[str, float]]:
+        """
+        記録済みのページを到着順に代表ページと照合（ストリーミング処理用）
+
+        先に照合したページとほぼ同一なら重複ページとして記録し、そうでなければ代表ページとする
+
+        Returns:
+            重複ページの場合 (代表ページのURL, 類似度)、それ以外は None
+        """
+        with self._lock:
+            fingerprint = self.fingerprints.get(url)
+            if fingerprint is None:
+                return None
+            for rep_url, rep_fingerprint in self.representatives:
+                score = similarity(fingerprint, rep_fingerprint)
+                if score >= self.threshold:
+                    self.duplicates[url] = (rep_url, score)
+                    return rep_url, score
+            self.representatives.append((url, fingerprint))
+            return None
+
+    def restore(self, url: str, fingerprint: Optional[int], duplicate_of: Optional[Tuple[str, float]] = None):
+        """
+        記録済みの照合結果を復元（中断したチェックの再開用）
+
+        復元した代表ページは、その後に match() するページの照合対象になる
+
+        Args:
+            fingerprint: 代表ページの SimHash
+            duplicate_of: 重複ページの場合 (代表ページのURL, 類似度)
+        """
+        with self._lock:
+            if duplicate_of:
+                self.duplicates[url] = (duplicate_of[0], duplicate_of[1])
+            elif fingerprint is not None:
+                self.fingerprints[url] = fingerprint
+                self.representatives.append((url, fingerprint))
+
+    def resolve(self) -> Dict[str, Tuple[str, float]]:
+        """
+        ほぼ同一のページをまとめる
+
+        取得順に依存しないよう、URLの短い順（同じ長さなら辞書順）に代表ページを決める
+        （/page/ と /page/?replytocom=1 では /page/ が代表になる）
+
+        Returns:
+            {重複ページのURL: (代表ページのURL, 類似度)}
+        """
+        with self._lock:
+            items = sorted(self.fingerprints.items(), key=lambda item: (len(item[0]), item[0]))
+
+        representatives = []
+        duplicates = {}
+        for url, fingerprint in items:
+            for rep_url, rep_fingerprint in representatives:
+                score = similarity(fingerprint, rep_fingerprint)
+                if score >= self.threshold:
+                    duplicates[url] = (rep_url, score)
+                    break
+            else:
+                representatives.append((url, fingerprint))
+        return duplicates
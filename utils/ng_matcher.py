@@ -0,0 +1,112 @@
+"""
+NG表現の機械照合
+
+'表記規定' シートのNG表現（bad）を Aho-Corasick オートマトンにまとめ、
+表層形と形態素解析による基本形の両方で照合する。
+「諦めた」「諦めない」のような活用形も基本形「諦める」として検出できる。
+"""
+
+from typing import List
+
+from utils.aho_corasick import AhoCorasick
+from utils.japanese import lemma_of, pos_of, tokenize
+
+# 活用語の後ろに続けて表示に含める品詞（「諦め」+「た」→「諦めた」）
+TRAILING_POS = ("助動詞",)
+
+
+class NGMatch:
+    """NG表現の検出結果"""
+
+    def __init__(self, bad: str, good: str, surface: str, line_no: int, start: int):
+        self.bad = bad
+        self.good = good
+        self.surface = surface  # ページ上の実際の表記（活用形を含む）
+        self.line_no = line_no
+        self.start = start
+
+    def to_finding(self) -> str:
+        """レポート用の指摘文字列（★ bad⇒good）"""
+        if self.surface == self.bad:
+            return f"★ {self.bad}⇒{self.good}"
+        return f"★ {self.surface}（{self.bad}）⇒{self.good}"
+
+
+class NGExpressionMatcher:
+    """全NG表現を1回の走査で照合するマッチャー"""
+
+    def __init__(self, ng_rules: List[dict]):
+        """
+        Args:
+            ng_rules: ExcelHandler.get_ng_rules() の戻り値（{"bad": ..., "good": ...} のリスト）
+        """
+        self.rules = [r for r in ng_rules if r.get("bad") and r.get("good")]
+        self._surface_automaton = AhoCorasick()
+        self._lemma_automaton = AhoCorasick()
+
+        for index, rule in enumerate(self.rules):
+            bad = rule["bad"]
+            # 表層形（文字単位）
+            self._surface_automaton.add(bad, index)
+            # 基本形（形態素単位）
+            lemmas = [lemma_of(t) for t in tokenize(bad)]
+            self._lemma_automaton.add(lemmas, index)
+
+        self._surface_automaton.build()
+        self._lemma_automaton.build()
+
+    def match(self, text: str) -> List[NGMatch]:
+        """
+        テキスト中のNG表現を検出
+
+        Args:
+            text: チェック対象のテキスト（改行区切り）
+
+        Returns:
+            NGMatchのリスト（出現順、同じ箇所の重複は除外）
+        """
+        if not self.rules:
+            return []
+
+        matches = []
+        seen = set()
+        for line_no, line in enumerate(text.split("\n")):
+            if not line.strip():
+                continue
+            tokens = tokenize(line)
+
+            # トークン境界（文字位置）を記録
+            offsets = []
+            position = 0
+            for token in tokens:
+                offsets.append(position)
+                position += len(token.surface)
+            boundaries = set(offsets) | {position}
+
+            # 1. 表層形の照合（語の途中から始まる一致は除外: 「食事」中の「事」等）
+            for start, end, index in self._surface_automaton.iter_matches(line):
+                if start not in boundaries or end not in boundaries:
+                    continue
+                key = (line_no, start, index)
+                if key not in seen:
+                    seen.add(key)
+                    matches.append(self._build_match(index, line[start:end], line_no, start))
+
+            # 2. 基本形の照合（活用形の検出）
+            lemmas = [lemma_of(t) for t in tokens]
+            for start, end, index in self._lemma_automaton.iter_matches(lemmas):
+                while end < len(tokens) and pos_of(tokens[end]) in TRAILING_POS:
+                    end += 1
+                char_start = offsets[start]
+                key = (line_no, char_start, index)
+                if key not in seen:
+                    seen.add(key)
+                    surface = "".join(t.surface for t in tokens[start:end])
+                    matches.append(self._build_match(index, surface, line_no, char_start))
+
+        matches.sort(key=lambda m: (m.line_no, m.start))
+        return matches
+
+    def _build_match(self, index: int, surface: str, line_no: int, start: int) -> NGMatch:
+        rule = self.rules[index]
+        return NGMatch(rule["bad"], rule["good"], surface, line_no, start)
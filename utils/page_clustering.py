@@ -0,0 +1,222 @@
+"""
+テンプレート群のサンプリング
+
+症例紹介・コラムなど同じテンプレートで量産されたページを、DOM構造の特徴と
+本文の類似度でまとめ、AIチェックは各群の代表ページ（サンプル）のみに行う。
+群に属さないページ（固有ページ）は全てAIチェックの対象とする。
+"""
+
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from bs4 import BeautifulSoup
+
+# DOM構造の特徴から除外するタグ（テンプレートの判定に関係しない）
+IGNORED_TAGS = {"script", "style", "noscript", "svg", "br", "meta", "link"}
+
+
+def dom_signature(soup: BeautifulSoup, max_depth: int = 8) -> Set[str]:
+    """
+    DOM構造の特徴（タグ名とクラス名のパスの集合）
+
+    クラス名中の数字（post-123 等）は除去し、同じ要素の繰り返しは1つにまとめる
+    """
+    paths = set()
+    root = soup.body or soup
+
+    def walk(element, path: str, depth: int):
+        if depth > max_depth:
+            return
+        for child in element.find_all(recursive=False):
+            if child.name in IGNORED_TAGS:
+                continue
+            classes = ".".join(sorted(re.sub(r"\d+", "", c) for c in child.get("class", [])))
+            child_path = f"{path}>{child.name}" + (f".{classes}" if classes else "")
+            paths.add(child_path)
+            walk(child, child_path, depth + 1)
+
+    walk(root, "", 0)
+    return paths
+
+
+def text_shingles(text: str, size: int = 3) -> Set[str]:
+    """本文の文字 n-gram の集合（空白は除去）"""
+    compact = re.sub(r"\s+", "", text)
+    return {compact[i:i + size] for i in range(max(0, len(compact) - size + 1))}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    """集合の Jaccard 係数"""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class PageCluster:
+    """同じテンプレートのページ群"""
+
+    def __init__(self, cluster_id: int, urls: List[str], sampled: List[str]):
+        """
+        Args:
+            cluster_id: 群の番号（1始まり）
+            urls: 群に属するページのURL
+            sampled: AIチェックを行う代表ページのURL
+        """
+        self.cluster_id = cluster_id
+        self.urls = urls
+        self.sampled = sampled
+
+    def is_sampled(self, url: str) -> bool:
+        return url in self.sampled
+
+    def describe(self, url: str) -> str:
+        """レポートに記載する説明"""
+        if self.is_sampled(url):
+            return f"テンプレート群 #{self.cluster_id}（{len(self.urls)}ページ）の代表ページとしてAIチェックを実施しました"
+        return (
+            f"テンプレート群 #{self.cluster_id}（{len(self.urls)}ページ）に属するため、AIチェックは代表ページのみで実施し、"
+            "このページは機械判定（リンク・電話番号・NG表現・整合性・校正ルール）のみを行いました\n"
+            "代表ページ:\n" + "\n".join(sorted(self.sampled))
+        )
+
+
+class TemplateSampler:
+    """ページをテンプレート群に分類し、AIチェックの対象を決定"""
+
+    def __init__(self, config: dict):
+        """
+        Args:
+            config: 設定辞書（sampling を参照）
+        """
+        sampling_config = config.get("sampling", {})
+        self.enabled = sampling_config.get("enabled", False)
+        # このページ数未満のサイトでは全ページをAIチェック
+        self.min_pages = sampling_config.get("min_pages", 50)
+        self.sample_per_cluster = max(1, sampling_config.get("sample_per_cluster", 2))
+        # 同じ群とみなすDOM構造・本文の類似度（Jaccard係数）
+        self.dom_threshold = sampling_config.get("dom_threshold", 0.9)
+        self.text_threshold = sampling_config.get("text_threshold", 0.4)
+        # assign() で割り当てた群（到着順）
+        self._leaders: List[Tuple[Set[str], Set[str], PageCluster]] = []
+        self._lock = threading.Lock()
+
+    def is_active(self, page_count: int) -> bool:
+        """サンプリングを行うか"""
+        return self.enabled and page_count >= self.min_pages
+
+    def cluster(self, pages: Dict[str, Tuple[str, BeautifulSoup]]) -> List[PageCluster]:
+        """
+        ページをテンプレート群に分類
+
+        AIチェックを省略するページがある群（ページ数が sample_per_cluster を超える群）のみを返す。
+        各群の先頭ページ（リーダー）との類似度で貪欲に割り当てる。
+        代表ページは本文の長いページから sample_per_cluster 件選ぶ。
+
+        Args:
+            pages: {url: (本文, soup)}
+        """
+        leaders = []  # (DOM特徴, 本文特徴, 所属URLリスト)
+        for url in sorted(pages):
+            content, soup = pages[url]
+            dom = dom_signature(soup)
+            text = text_shingles(content)
+            for leader_dom, leader_text, members in leaders:
+                if jaccard(dom, leader_dom) >= self.dom_threshold and jaccard(text, leader_text) >= self.text_threshold:
+                    members.append(url)
+                    break
+            else:
+                leaders.append((dom, text, [url]))
+
+        clusters = []
+        for _, _, members in leaders:
+            if len(members) <= self.sample_per_cluster:
+                continue
+            by_length = sorted(members, key=lambda u: len(pages[u][0]), reverse=True)
+            clusters.append(PageCluster(len(clusters) + 1, members, by_length[:self.sample_per_cluster]))
+        return clusters
+
+    def assign(self, url: str, content: str, soup: BeautifulSoup, dom: Optional[Set[str]] = None) -> PageCluster:
+        """
+        ページを到着順に群へ割り当て（ストリーミング処理用）
+
+        群の先頭から sample_per_cluster 件が代表ページになる。
+        割り当ての時点で代表ページかどうかが確定するため、全ページの取得を待たずにAIチェックへ進める。
+
+        Args:
+            dom: 算出済みのDOM構造の特徴（プロセスプールで解析した場合。省略時は soup から算出）
+
+        Returns:
+            割り当てた群（固有ページの場合は1ページのみの群）
+        """
+        dom = dom if dom is not None else dom_signature(soup)
+        text = text_shingles(content)
+        with self._lock:
+            for leader_dom, leader_text, cluster in self._leaders:
+                if jaccard(dom, leader_dom) >= self.dom_threshold and jaccard(text, leader_text) >= self.text_threshold:
+                    cluster.urls.append(url)
+                    if len(cluster.sampled) < self.sample_per_cluster:
+                        cluster.sampled.append(url)
+                    return cluster
+            cluster = PageCluster(0, [url], [url])
+            self._leaders.append((dom, text, cluster))
+            return cluster
+
+    def leader_features(self, url: str) -> Optional[Dict[str, List[str]]]:
+        """群の先頭ページの特徴（記録用。先頭ページでなければ None）"""
+        with self._lock:
+            for dom, text, cluster in self._leaders:
+                if cluster.urls[0] == url:
+                    return {"dom": sorted(dom), "text": sorted(text)}
+        return None
+
+    def restore(self, url: str, leader_url: str, sampled: bool, features: Optional[Dict[str, List[str]]] = None) -> Optional[PageCluster]:
+        """
+        記録済みの割り当てを復元（中断したチェックの再開用）
+
+        先頭ページ（features を指定）を先に復元すること。復元した群には、その後に assign() するページも割り当てられる
+
+        Args:
+            leader_url: 群の先頭ページのURL
+            sampled: 代表ページか
+            features: 先頭ページの特徴（leader_features() の戻り値）
+
+        Returns:
+            復元した群（先頭ページが未復元の場合は None）
+        """
+        with self._lock:
+            if features is not None:
+                cluster = PageCluster(0, [url], [url])
+                self._leaders.append((set(features["dom"]), set(features["text"]), cluster))
+                return cluster
+            for _, _, cluster in self._leaders:
+                if cluster.urls[0] == leader_url:
+                    cluster.urls.append(url)
+                    if sampled:
+                        cluster.sampled.append(url)
+                    return cluster
+        return None
+
+    def assigned_clusters(self) -> List[PageCluster]:
+        """
+        assign() で割り当てた群のうち、AIチェックを省略したページがある群
+
+        番号は到着順に依存しないよう、先頭ページのURL順に振り直す（再開したチェックでも同じ番号になる）
+        """
+        with self._lock:
+            clusters = [cluster for _, _, cluster in self._leaders if len(cluster.urls) > self.sample_per_cluster]
+        clusters.sort(key=lambda cluster: cluster.urls[0])
+        for number, cluster in enumerate(clusters, 1):
+            cluster.cluster_id = number
+        return clusters
+
+    def plan(self, pages: Dict[str, Tuple[str, BeautifulSoup]]) -> Dict[str, PageCluster]:
+        """
+        URLごとの所属する群（固有ページは含まない）
+
+        Returns:
+            {url: PageCluster}。サンプリングを行わない場合は空
+        """
+        if not self.is_active(len(pages)):
+            return {}
+        return {url: cluster for cluster in self.cluster(pages) for url in cluster.urls}
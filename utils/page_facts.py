@@ -0,0 +1,103 @@
+"""
+ページの解析結果（プロセス間での受け渡し用）
+
+HTMLの解析（BeautifulSoup）は純粋なPythonのCPU処理のため、スレッドでは GIL により並列化されない。
+プロセスプールで解析する場合、soup はプロセス間で受け渡せない（大きく、pickle に時間がかかる）ため、
+本文・SimHash・DOM構造の特徴と、チェッカーが参照する要素のみを残した要約HTMLを返す。
+"""
+
+import html as html_lib
+import re
+from typing import Optional, Set
+
+from bs4 import BeautifulSoup
+
+from utils.near_duplicates import simhash
+from utils.page_clustering import dom_signature
+
+# 要約HTMLに残す meta 要素（name / property）
+SKELETON_META = {"description", "og:title", "og:description"}
+
+# GA4 等の計測タグを含む script を要約HTMLに残す判定
+TRACKING_PATTERN = re.compile(r"G-[A-Z0-9]{5,}")
+
+
+class PageFacts:
+    """解析済みのページ"""
+
+    def __init__(self, url: str, text: str, skeleton: str = "", dom: Optional[Set[str]] = None,
+                 fingerprint: Optional[int] = None, soup: Optional[BeautifulSoup] = None):
+        """
+        Args:
+            url: ページのURL
+            text: 本文
+            skeleton: チェッカーが参照する要素のみの要約HTML（soup がない場合に使用）
+            dom: DOM構造の特徴（省略時は soup から算出）
+            fingerprint: 本文の SimHash（短いページ・重複検出が無効の場合は None）
+            soup: 解析済みの soup（同一プロセスで解析した場合）
+        """
+        self.url = url
+        self.text = text
+        self.skeleton = skeleton
+        self.dom = dom
+        self.fingerprint = fingerprint
+        self._soup = soup
+
+    @property
+    def soup(self) -> BeautifulSoup:
+        """チェッカーに渡す soup（プロセスプールで解析した場合は要約HTMLから生成）"""
+        if self._soup is None:
+            self._soup = BeautifulSoup(self.skeleton, "html.parser")
+        return self._soup
+
+    def dom_signature(self) -> Set[str]:
+        """テンプレート群の判定に使うDOM構造の特徴"""
+        if self.dom is None:
+            self.dom = dom_signature(self.soup)
+        return self.dom
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_soup"] = None
+        return state
+
+
+def build_skeleton(soup: BeautifulSoup) -> str:
+    """チェッカーが参照する要素（title・meta・リンク・画像の alt・構造化データ・計測タグ）のみのHTML"""
+    head = []
+    if soup.title and soup.title.string:
+        head.append(f"<title>{html_lib.escape(soup.title.string)}</title>")
+    for meta in soup.find_all("meta"):
+        key = meta.get("name") or meta.get("property")
+        if key in SKELETON_META:
+            attr = "name" if meta.get("name") else "property"
+            head.append(f'<meta {attr}="{html_lib.escape(key)}" content="{html_lib.escape(meta.get("content", ""))}">')
+
+    body = []
+    for script in soup.find_all("script"):
+        source = script.get("src", "") + (script.string or "")
+        if script.get("type") == "application/ld+json" or TRACKING_PATTERN.search(source):
+            body.append(str(script))
+    for link in soup.find_all("a", href=True):
+        body.append(f'<a href="{html_lib.escape(link["href"])}">{html_lib.escape(link.get_text(strip=True))}</a>')
+    for img in soup.find_all("img", alt=True):
+        body.append(f'<img alt="{html_lib.escape(img["alt"])}">')
+
+    return "<html><head>" + "".join(head) + "</head><body>" + "".join(body) + "</body></html>"
+
+
+def extract_page_facts(url: str, html: str, fingerprint_min_length: Optional[int] = None) -> PageFacts:
+    """
+    HTMLを解析して PageFacts を作成（プロセスプールのワーカーで実行）
+
+    Args:
+        url: ページのURL
+        html: HTML文字列
+        fingerprint_min_length: SimHash を算出する本文の最小文字数（None なら算出しない）
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    text = soup.get_text(separator="\n", strip=True)
+    fingerprint = None
+    if fingerprint_min_length is not None and len(text) >= fingerprint_min_length:
+        fingerprint = simhash(text)
+    return PageFacts(url, text, build_skeleton(soup), dom_signature(soup), fingerprint)
@@ -0,0 +1,76 @@
+"""
+ページの優先順位
+
+トップページ・アクセス・料金・お問い合わせなど、誤りがあると影響の大きいページを
+先にチェックするための優先度を、URLのパターンとサイト内の被リンク数から算出する
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+DEFAULT_PRIORITY_PATTERNS = [
+    {"pattern": r"access|map|アクセス|地図", "weight": 100},
+    {"pattern": r"price|fee|cost|料金|費用", "weight": 90},
+    {"pattern": r"contact|reserv|inquiry|お問い合わせ|予約", "weight": 90},
+    {"pattern": r"clinic|about|医院|院長|doctor|staff", "weight": 50},
+]
+
+
+def _normalize_url(url: str) -> str:
+    """比較用にURLを正規化（フラグメント・末尾のスラッシュを除去）"""
+    return url.split("#")[0].rstrip("/")
+
+
+class PagePrioritizer:
+    """ページのチェック順を決定"""
+
+    def __init__(self, config: Dict):
+        """
+        Args:
+            config: 設定辞書（scheduling を参照）
+        """
+        scheduling_config = config.get("scheduling", {})
+        self.top_page_weight = scheduling_config.get("top_page_weight", 1000)
+        self.inbound_link_weight = scheduling_config.get("inbound_link_weight", 1)
+        self.patterns = [
+            (re.compile(p["pattern"], re.IGNORECASE), p.get("weight", 0))
+            for p in scheduling_config.get("priority_patterns", DEFAULT_PRIORITY_PATTERNS)
+        ]
+
+    def inbound_counts(self, pages: Dict[str, Tuple[str, BeautifulSoup]]) -> Dict[str, int]:
+        """
+        ページごとのサイト内の被リンク数（リンク元のページ数）
+
+        Args:
+            pages: {url: (本文, soup)}
+        """
+        known = {_normalize_url(url): url for url in pages}
+        counts = {url: 0 for url in pages}
+        for source_url, (_, soup) in pages.items():
+            targets = set()
+            for link in soup.find_all("a", href=True):
+                target = known.get(_normalize_url(urljoin(source_url, link["href"])))
+                if target and target != source_url:
+                    targets.add(target)
+            for target in targets:
+                counts[target] += 1
+        return counts
+
+    def score(self, url: str, inbound: int = 0) -> float:
+        """優先度（大きいほど先にチェック）"""
+        path = unquote(urlparse(url).path)
+        score = inbound * self.inbound_link_weight
+        if path.strip("/") in ("", "index.html", "index.php"):
+            score += self.top_page_weight
+        for pattern, weight in self.patterns:
+            if pattern.search(path):
+                score += weight
+        return score
+
+    def order(self, urls: List[str], inbound: Optional[Dict[str, int]] = None) -> List[str]:
+        """優先度の高い順に並べ替え（同じ優先度では元の順序を維持）"""
+        inbound = inbound or {}
+        return sorted(urls, key=lambda url: -self.score(url, inbound.get(url, 0)))
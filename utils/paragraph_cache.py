@@ -0,0 +1,124 @@
+"""
+段落単位のAI指摘キャッシュ
+
+テンプレート文章（インプラント解説、ホワイトニングFAQ、プライバシーポリシー等）は
+クリニック間で使い回されるため、段落ごとの指摘結果をディスクに保存して再利用する
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+
+
+def normalize_paragraph(text: str) -> str:
+    """
+    段落を正規化（前後の空白除去・連続空白の圧縮）
+
+    全角/半角の違いは誤字脱字の指摘対象になるため、ここでは変換しない
+    """
+    return re.sub(r"[ \t　]+", " ", text).strip()
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """
+    ページテキストを正規化済みの段落リストに分割（ページ内の重複は除外）
+
+    Args:
+        text: WebCrawler.fetch_page が返すテキスト（改行区切り）
+
+    Returns:
+        段落のリスト（出現順）
+    """
+    paragraphs = []
+    seen = set()
+    for line in text.split("\n"):
+        paragraph = normalize_paragraph(line)
+        if paragraph and paragraph not in seen:
+            seen.add(paragraph)
+            paragraphs.append(paragraph)
+    return paragraphs
+
+
+def compute_rule_version(**components) -> str:
+    """
+    ルールセットのバージョン文字列を生成
+
+    プロンプト・モデル・NGルールなど指摘結果に影響する要素のいずれかが
+    変わるとバージョンが変わり、古いキャッシュは参照されなくなる
+    """
+    payload = json.dumps(components, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class ParagraphFindingCache:
+    """段落ごとのAI指摘をSQLiteに保存するキャッシュ"""
+
+    def __init__(self, path: str, rule_version: str):
+        """
+        Args:
+            path: SQLiteファイルのパス
+            rule_version: ルールセットのバージョン（compute_rule_version の戻り値）
+        """
+        self.path = path
+        self.rule_version = rule_version
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS paragraph_findings ("
+                " key TEXT PRIMARY KEY,"
+                " findings TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def _key(self, paragraph: str) -> str:
+        """段落内容とルールセットのバージョンからキーを生成"""
+        raw = f"{self.rule_version}\0{paragraph}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_many(self, paragraphs: List[str]) -> Dict[str, List[str]]:
+        """
+        キャッシュ済みの段落の指摘を取得
+
+        Returns:
+            {段落: 指摘のリスト} の辞書（未キャッシュの段落は含まれない）
+        """
+        keys = {self._key(p): p for p in paragraphs}
+        found = {}
+        key_list = list(keys.keys())
+        with self._lock:
+            # SQLiteのプレースホルダ数上限を超えないよう分割して問い合わせ
+            for i in range(0, len(key_list), 500):
+                chunk = key_list[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, findings FROM paragraph_findings WHERE key IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                for key, findings in rows:
+                    found[keys[key]] = json.loads(findings)
+        return found
+
+    def put_many(self, findings_by_paragraph: Dict[str, List[str]]):
+        """段落ごとの指摘を保存（指摘なしの段落は空リストで保存）"""
+        now = time.time()
+        rows = [
+            (self._key(p), json.dumps(f, ensure_ascii=False), now)
+            for p, f in findings_by_paragraph.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO paragraph_findings (key, findings, created_at) VALUES (?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
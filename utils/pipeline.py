@@ -0,0 +1,158 @@
+"""
+ストリーミング処理パイプライン
+
+段階（取得 → 解析 → 機械判定 → ネットワーク → AI）ごとにワーカー数を設定し、
+段階間を上限付きのキューでつなぐ。ページは取得が終わった時点で次の段階に進むため、
+ネットワーク待ちとAI待ちが重なり、全体の所要時間が各段階の合計にならない。
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 段階の終了を下流に伝える目印
+_DONE = object()
+
+
+class Stage:
+    """パイプラインの1段階"""
+
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int, queue_size: int):
+        """
+        Args:
+            name: 段階名（統計の表示に使用）
+            func: 要素を受け取り、次の段階に渡す要素を返す関数（None を返すと以降の段階に進まない）
+            workers: ワーカースレッド数
+            queue_size: 入力キューの上限（上流はキューが空くまで待機する）
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self.processed = 0
+        self.dropped = 0
+        self.busy_seconds = 0.0
+        self.active_workers = self.workers
+        self.lock = threading.Lock()
+
+
+class Pipeline:
+    """上限付きキューで段階をつないだマルチスレッドのパイプライン"""
+
+    def __init__(self, stages: List[Tuple[str, Callable[[Any], Any], int]], queue_size: int = 20):
+        """
+        Args:
+            stages: (段階名, 処理関数, ワーカー数) のリスト（先頭から順に実行）
+            queue_size: 各段階の入力キューの上限
+        """
+        self.stages = [Stage(name, func, workers, queue_size) for name, func, workers in stages]
+        self.output: queue.Queue = queue.Queue()
+        self.started_at: Optional[float] = None
+
+    def run(self, items: Iterable[Any], poll_interval: float = 0.5) -> Iterator[Optional[Any]]:
+        """
+        パイプラインを実行し、最終段階を通過した要素を完了順に返す
+
+        poll_interval 秒間に完了した要素がない場合は None を返す
+        （呼び出し側で進捗・統計の表示を更新するため）
+
+        Args:
+            items: 先頭の段階に投入する要素（投入順に処理される）
+        """
+        self.started_at = time.perf_counter()
+        threads = [threading.Thread(target=self._feed, args=(items,), daemon=True)]
+        for index, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(target=self._work, args=(index,), daemon=True))
+        for thread in threads:
+            thread.start()
+
+        while True:
+            try:
+                item = self.output.get(timeout=poll_interval)
+            except queue.Empty:
+                yield None
+                continue
+            if item is _DONE:
+                break
+            yield item
+
+        for thread in threads:
+            thread.join()
+
+    def _feed(self, items: Iterable[Any]):
+        first = self.stages[0]
+        for item in items:
+            first.queue.put(item)
+        for _ in range(first.workers):
+            first.queue.put(_DONE)
+
+    def _work(self, index: int):
+        stage = self.stages[index]
+        downstream = self.stages[index + 1].queue if index + 1 < len(self.stages) else self.output
+        while True:
+            item = stage.queue.get()
+            if item is _DONE:
+                break
+
+            start = time.perf_counter()
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                print(f"エラー (パイプライン: {stage.name}): {e}")
+                result = None
+            with stage.lock:
+                stage.busy_seconds += time.perf_counter() - start
+                stage.processed += 1
+                if result is None:
+                    stage.dropped += 1
+
+            if result is not None:
+                downstream.put(result)
+
+        # 最後に終了したワーカーが下流に終了を伝える
+        with stage.lock:
+            stage.active_workers -= 1
+            last = stage.active_workers == 0
+        if last:
+            if index + 1 < len(self.stages):
+                for _ in range(self.stages[index + 1].workers):
+                    downstream.put(_DONE)
+            else:
+                downstream.put(_DONE)
+
+    def metrics(self) -> List[Dict]:
+        """
+        段階ごとの統計
+
+        Returns:
+            [{"stage", "workers", "queue_depth", "processed", "dropped",
+              "throughput"(件/秒), "utilization"(ワーカーの稼働率)}, ...]
+        """
+        elapsed = max(1e-9, time.perf_counter() - self.started_at) if self.started_at else 0.0
+        rows = []
+        for stage in self.stages:
+            with stage.lock:
+                processed, dropped, busy = stage.processed, stage.dropped, stage.busy_seconds
+            rows.append({
+                "stage": stage.name,
+                "workers": stage.workers,
+                "queue_depth": stage.queue.qsize(),
+                "processed": processed,
+                "dropped": dropped,
+                "throughput": processed / elapsed if elapsed else 0.0,
+                "utilization": min(1.0, busy / (elapsed * stage.workers)) if elapsed else 0.0,
+            })
+        return rows
+
+
+# ページチェックの段階（pipeline.workers のキー）。取得・解析の後はチェッカーの resource_class ごとの段階
+PAGE_STAGES = ("fetch", "parse", "cpu", "network", "ai")
+
+
+def stage_workers(config: Dict) -> Dict[str, int]:
+    """段階ごとのワーカー数（pipeline.workers を参照。未設定の段階は crawler.max_workers）"""
+    default = max(1, config.get("crawler", {}).get("max_workers", 5))
+    workers = config.get("pipeline", {}).get("workers", {}) or {}
+    return {name: max(1, int(workers.get(name, default))) for name in PAGE_STAGES}
@@ -0,0 +1,194 @@
+"""
+ローカル校正ルール（AIチェック前の事前フィルタ）
+
+janome による形態素解析と正規表現で、よくある誤りを機械的に検出する。
+- 過ぎた年の未来形表記（「2025年開催予定」）
+- ら抜き言葉（「見れる」「食べれる」）
+- 助詞の重複（「をを」「にに」）
+- 括弧の対応の不一致
+- 全角/半角の句読点・記号の混在
+
+検出結果からページごとの疑わしさスコアを算出し、AIで精査するページを絞り込む
+"""
+
+import datetime
+import re
+import unicodedata
+from typing import List
+
+from utils.japanese import pos_of, tokenize
+
+# 過ぎた年に付いていると更新漏れとみなす未来形の表現
+FUTURE_EXPRESSIONS = r"(?:予定|開催します|実施します|開始します|オープンします|開院します|リニューアルします)"
+STALE_DATE_PATTERN = re.compile(
+    r"((?:19|20)\d{2})\s*年(?:\s*\d{1,2}\s*月)?(?:\s*\d{1,2}\s*日)?(?:\s*[（(][^）)]{1,3}[）)])?"
+    r"[^。\n]{0,15}?" + FUTURE_EXPRESSIONS
+)
+
+# 辞書上で1語として登録されているら抜き言葉
+RANUKI_WORDS = {"見れる": "見られる", "来れる": "来られる"}
+
+BRACKET_PAIRS = {"「": "」", "『": "』", "（": "）", "(": ")", "【": "】", "［": "］", "[": "]"}
+# 括弧を閉じるまでに許容する行数（本文はタグごとに改行されるため、リンク等を囲む括弧は複数行にまたがる）
+BRACKET_SPAN = 5
+# 行頭の番号付きリスト（「1) 初診」「２）再診」）。閉じ括弧のみで対応する開き括弧はない
+LIST_NUMBER_PATTERN = re.compile(r"^\s*\d+[)）]")
+
+# 全角/半角の混在を検出する記号の組（全角, 半角）
+PUNCTUATION_PAIRS = [("、", "，"), ("。", "．"), ("！", "!"), ("？", "?"), ("（", "(")]
+
+# 検出ルールごとの重み（疑わしさスコアの算出用）
+RULE_WEIGHTS = {
+    "stale_date": 3,
+    "ranuki": 2,
+    "duplicate_particle": 2,
+    "bracket": 1,
+    "punctuation": 1,
+}
+
+
+class ProofreadFinding:
+    """ローカル校正ルールの検出結果"""
+
+    def __init__(self, rule: str, wrong: str, correct: str, reason: str):
+        self.rule = rule
+        self.wrong = wrong
+        self.correct = correct
+        self.reason = reason
+
+    def to_finding(self) -> str:
+        """レポート用の指摘文字列（TypoChecker と同じ「★ 誤:」形式）"""
+        return f"★ 誤: 「{self.wrong}」 → 正: 「{self.correct}（{self.reason}）」"
+
+
+class LocalProofreader:
+    """形態素解析と正規表現による校正ルールエンジン"""
+
+    def __init__(self, today: datetime.date = None):
+        """
+        Args:
+            today: 基準日（省略時は実行日）
+        """
+        self.today = today or datetime.date.today()
+
+    def check(self, text: str) -> List[ProofreadFinding]:
+        """
+        テキストを全ルールで判定
+
+        Args:
+            text: チェック対象のテキスト（改行区切り）
+
+        Returns:
+            ProofreadFindingのリスト（同じ指摘は1件にまとめる）
+        """
+        findings = []
+        seen = set()
+
+        def add(finding: ProofreadFinding):
+            key = (finding.rule, finding.wrong)
+            if key not in seen:
+                seen.add(key)
+                findings.append(finding)
+
+        lines = [line.strip() for line in text.split("\n") if line.strip()]
+        for line in lines:
+            for finding in self._check_stale_dates(line):
+                add(finding)
+            for finding in self._check_tokens(line):
+                add(finding)
+        for finding in self._check_brackets(lines):
+            add(finding)
+        for finding in self._check_punctuation(text):
+            add(finding)
+        return findings
+
+    def score(self, findings: List[ProofreadFinding]) -> int:
+        """検出結果から疑わしさスコアを算出"""
+        return sum(RULE_WEIGHTS.get(f.rule, 1) for f in findings)
+
+    def _check_stale_dates(self, line: str) -> List[ProofreadFinding]:
+        """過ぎた年を未来形で表現している箇所（更新漏れ）"""
+        findings = []
+        for m in STALE_DATE_PATTERN.finditer(unicodedata.normalize("NFKC", line)):
+            if int(m.group(1)) < self.today.year:
+                findings.append(ProofreadFinding(
+                    "stale_date", m.group(0), "過去の表現に更新",
+                    f"現在は{self.today.year}年のため、古い情報の可能性があります"
+                ))
+        return findings
+
+    def _check_tokens(self, line: str) -> List[ProofreadFinding]:
+        """形態素解析によるら抜き言葉・助詞の重複の検出"""
+        findings = []
+        tokens = tokenize(line)
+        for i, token in enumerate(tokens):
+            next_token = tokens[i + 1] if i + 1 < len(tokens) else None
+
+            # ら抜き言葉（1語として登録されているもの）
+            if token.base_form in RANUKI_WORDS:
+                findings.append(ProofreadFinding(
+                    "ranuki", token.surface,
+                    RANUKI_WORDS[token.base_form][:-1] + token.surface[len(token.base_form) - 1:],
+                    "ら抜き言葉"
+                ))
+
+            # ら抜き言葉（一段動詞の未然形 + 「れる」）
+            if (next_token is not None and pos_of(token) == "動詞" and token.infl_type == "一段"
+                    and token.infl_form == "未然形" and next_token.base_form == "れる"
+                    and next_token.part_of_speech.startswith("動詞,接尾")):
+                wrong = token.surface + next_token.surface
+                findings.append(ProofreadFinding(
+                    "ranuki", wrong, token.surface + "ら" + next_token.surface, "ら抜き言葉"
+                ))
+
+            # 助詞の重複（「をを」「にに」等）
+            if (next_token is not None and pos_of(token) == "助詞" and pos_of(next_token) == "助詞"
+                    and token.surface == next_token.surface):
+                findings.append(ProofreadFinding(
+                    "duplicate_particle", token.surface + next_token.surface, token.surface, "助詞の重複"
+                ))
+        return findings
+
+    def _check_brackets(self, lines: List[str]) -> List[ProofreadFinding]:
+        """
+        括弧の対応の不一致
+        
+        「<a>料金表</a>」のようにタグで行が分かれた括弧も対応させるため、開いた行から BRACKET_SPAN 行以内で
+        閉じていれば対応しているとみなす。行頭の番号付きリストの閉じ括弧は数えない
+        """
+        closing_to_opening = {v: k for k, v in BRACKET_PAIRS.items()}
+        stack = []  # (開き括弧, 行番号)
+        unmatched = set()
+        for no, line in enumerate(lines):
+            list_number = LIST_NUMBER_PATTERN.match(line)
+            for c in line[list_number.end():] if list_number else line:
+                if c in BRACKET_PAIRS:
+                    stack.append((c, no))
+                elif c in closing_to_opening:
+                    if not stack:
+                        unmatched.add(no)
+                    elif stack.pop()[0] != closing_to_opening[c]:
+                        unmatched.add(no)
+            # 許容する行数を過ぎても閉じていない括弧
+            while stack and no - stack[0][1] >= BRACKET_SPAN:
+                unmatched.add(stack.pop(0)[1])
+        unmatched.update(no for _, no in stack)
+        return [self._bracket_finding(lines[no]) for no in sorted(unmatched)]
+
+    def _bracket_finding(self, line: str) -> ProofreadFinding:
+        excerpt = line if len(line) <= 40 else line[:40] + "…"
+        return ProofreadFinding("bracket", excerpt, "括弧を対応させる", "括弧の対応が取れていません")
+
+    def _check_punctuation(self, text: str) -> List[ProofreadFinding]:
+        """全角/半角の句読点・記号の混在（ページ単位）"""
+        findings = []
+        for full, half in PUNCTUATION_PAIRS:
+            # 半角記号は日本語の文字に隣接しているものだけを数える（「1,000」「(株)」等の英数字表記を除外）
+            half_pattern = re.compile(
+                rf"(?<=[぀-ヿ一-鿿]){re.escape(half)}|{re.escape(half)}(?=[぀-ヿ一-鿿])"
+            )
+            if full in text and half_pattern.search(text):
+                findings.append(ProofreadFinding(
+                    "punctuation", half, full, "全角と半角の記号が混在しています"
+                ))
+        return findings
@@ -1,13 +1,14 @@
 """
-Excelレポート生成
+レポート生成
 
-チェック結果をExcelファイルに出力
+チェック結果をExcelファイル・JSONに出力
 """
 
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment
-from typing import List, Dict
+from typing import List, Dict, Optional
 from io import BytesIO
+import json
 
 
 class ExcelReporter:
@@ -30,13 +31,14 @@ class ExcelReporter:
         })
         self.default_font = Font(name="メイリオ", size=10)
     
-    def generate_report(self, clinic_name: str, results: List[Dict]) -> BytesIO:
+    def generate_report(self, clinic_name: str, results: List[Dict], ai_usage: Optional[Dict] = None) -> BytesIO:
         """
         チェック結果からExcelレポートを生成
         
         Args:
             clinic_name: クリニック名
             results: チェック結果のリスト
+            ai_usage: AIUsageTracker.summary() の戻り値（指定時は「AI使用状況」シートを追加）
         
         Returns:
             ExcelファイルのBytesIO
@@ -55,6 +57,10 @@ class ExcelReporter:
         # 列幅を調整
         self._adjust_column_widths(ws)
         
+        # AI使用状況シート
+        if ai_usage:
+            self._add_ai_usage_sheet(wb, ai_usage)
+        
         # BytesIOに保存
         output = BytesIO()
         wb.save(output)
@@ -62,6 +68,59 @@ class ExcelReporter:
         
         return output
     
+    def generate_batch_summary(self, batch_result: Dict) -> BytesIO:
+        """
+        一括チェックの集計表を生成（1医院1行と合計）
+        
+        Args:
+            batch_result: BatchRunner.run() の戻り値
+        
+        Returns:
+            ExcelファイルのBytesIO
+        """
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "一括チェック集計"
+        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+        header_font = Font(name="メイリオ", bold=True, color="FFFFFF")
+        
+        headers = ["医院名", "ページ数", "エラー", "警告", "所要時間(秒)", "AI呼び出し", "トークン", "概算費用", "状態", "レポート", "設定ファイル"]
+        for col_idx, name in enumerate(headers, start=1):
+            cell = ws.cell(row=1, column=col_idx, value=name)
+            cell.fill = header_fill
+            cell.font = header_font
+            cell.alignment = Alignment(horizontal="center", vertical="center")
+        
+        clinics = batch_result["clinics"]
+        rows = [
+            [
+                s["clinic_name"], s["pages"], s["errors"], s["warnings"], round(s["elapsed"], 1), s["ai_calls"],
+                s["tokens"], round(s["cost"], 4), f"失敗: {s['failure']}" if s["failure"] else "完了",
+                "\n".join(s["reports"]), s["config_path"]
+            ]
+            for s in clinics
+        ]
+        rows.append([
+            f"合計（{len(clinics)}医院）", batch_result["pages"], sum(s["errors"] for s in clinics),
+            sum(s["warnings"] for s in clinics), round(batch_result["elapsed"], 1), sum(s["ai_calls"] for s in clinics),
+            sum(s["tokens"] for s in clinics), round(sum(s["cost"] for s in clinics), 4),
+            f"{batch_result['pages_per_minute']:.1f} ページ/分", "", ""
+        ])
+        for row_idx, values in enumerate(rows, start=2):
+            for col_idx, value in enumerate(values, start=1):
+                cell = ws.cell(row=row_idx, column=col_idx, value=value)
+                cell.font = self.default_font
+                cell.alignment = Alignment(vertical="top", wrap_text=True)
+        
+        widths = [30, 10, 8, 8, 14, 12, 12, 12, 30, 60, 40]
+        for col_idx, width in enumerate(widths, start=1):
+            ws.column_dimensions[ws.cell(row=1, column=col_idx).column_letter].width = width
+        
+        output = BytesIO()
+        wb.save(output)
+        output.seek(0)
+        return output
+    
     def _create_header(self, ws):
         """ヘッダー行を作成"""
         header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
@@ -121,3 +180,75 @@ class ExcelReporter:
         for col_idx, column_name in enumerate(self.columns, start=1):
             width = column_widths.get(column_name, 15)
             ws.column_dimensions[ws.cell(row=1, column=col_idx).column_letter].width = width
+    
+    def _add_ai_usage_sheet(self, wb: Workbook, ai_usage: Dict):
+        """AI呼び出しのトークン数・処理時間・概算費用のシートを追加"""
+        ws = wb.create_sheet("AI使用状況")
+        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+        header_font = Font(name="メイリオ", bold=True, color="FFFFFF")
+        currency = ai_usage.get("currency", "USD")
+        
+        headers = [
+            "区分", "対象", "呼び出し回数", "エラー", "リトライ", "入力トークン",
+            "うちキャッシュ", "出力トークン", f"概算費用({currency})", "p50(秒)", "p95(秒)"
+        ]
+        for col_idx, name in enumerate(headers, start=1):
+            cell = ws.cell(row=1, column=col_idx, value=name)
+            cell.fill = header_fill
+            cell.font = header_font
+            cell.alignment = Alignment(horizontal="center", vertical="center")
+        
+        rows = [("全体", "", ai_usage["total"])]
+        rows += [("チェッカー", name, stats) for name, stats in ai_usage.get("by_checker", {}).items()]
+        rows += [("ページ（上位）", stats["page_url"], stats) for stats in ai_usage.get("top_pages", [])]
+        
+        for row_idx, (kind, target, stats) in enumerate(rows, start=2):
+            values = [
+                kind, target, stats["calls"], stats["errors"], stats["retries"], stats["prompt_tokens"],
+                stats["cached_tokens"], stats["response_tokens"], round(stats["cost"], 4),
+                round(stats["latency_p50"], 2), round(stats["latency_p95"], 2)
+            ]
+            for col_idx, value in enumerate(values, start=1):
+                cell = ws.cell(row=row_idx, column=col_idx, value=value)
+                cell.font = self.default_font
+        
+        widths = [16, 50, 12, 8, 8, 14, 14, 14, 16, 10, 10]
+        for col_idx, width in enumerate(widths, start=1):
+            ws.column_dimensions[ws.cell(row=1, column=col_idx).column_letter].width = width
+
+
+class JsonReporter:
+    """JSONレポート生成クラス（他のツールでの集計・差分比較用）"""
+    
+    def __init__(self, config: Dict):
+        """
+        Args:
+            config: 設定辞書
+        """
+        self.config = config
+    
+    def generate_report(self, clinic_name: str, results: List[Dict], ai_usage: Optional[Dict] = None,
+                        checked_urls: Optional[List[str]] = None, metrics: Optional[List[Dict]] = None) -> str:
+        """
+        チェック結果からJSONレポートを生成
+        
+        Args:
+            clinic_name: クリニック名
+            results: チェック結果のリスト
+            ai_usage: AIUsageTracker.summary() の戻り値
+            checked_urls: チェックしたURLのリスト
+            metrics: 処理段階ごとの統計（Pipeline.metrics() の戻り値）
+        
+        Returns:
+            JSON文字列
+        """
+        summary = {status: sum(1 for r in results if r["status"] == status) for status in ("ok", "warning", "error")}
+        report = {
+            "clinic_name": clinic_name,
+            "summary": summary,
+            "checked_urls": checked_urls or [],
+            "results": results,
+            "ai_usage": ai_usage,
+            "pipeline": metrics or [],
+        }
+        return json.dumps(report, ensure_ascii=False, indent=2)
@@ -0,0 +1,750 @@
+"""
+チェックの実行
+
+Streamlit の画面（app.py）とコマンドライン（cli.py）で共通のチェック処理。
+UI には依存せず、進捗は ProgressReporter を通じて通知する。
+"""
+
+import io
+import os
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+
+from checkers import RESOURCE_AI, RESOURCE_CLASSES, RESOURCE_CPU, RESOURCE_NETWORK, CheckResult, LinkChecker, PhoneChecker, UnifiedAIChecker
+from utils.aggregation import FindingAggregator
+from utils.ai_metrics import AIUsageTracker
+from utils.budget import CancelledError, RunBudget
+from utils.checkpoint import RunJournal
+from utils.crawler import WebCrawler
+from utils.estimator import RunEstimator, RunStatsStore
+from utils.excel_handler import ExcelHandler
+from utils.page_clustering import TemplateSampler
+from utils.page_priority import PagePrioritizer
+from utils.pipeline import Pipeline, stage_workers
+from utils.reporter import ExcelReporter, JsonReporter
+
+DEFAULT_CONFIG_PATH = Path(__file__).parent.parent / "config.yaml"
+# チェック結果の状態（CheckResult.status）
+STATUSES = ("ok", "warning", "error")
+
+
+def load_config(path: Optional[str] = None) -> Dict:
+    """設定ファイルを読み込み（省略時はプロジェクト直下の config.yaml）"""
+    with open(path or DEFAULT_CONFIG_PATH, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+def describe_pace(rate: float, eta: Optional[float]) -> str:
+    """ProgressReporter.pace() の結果の表示用文字列（例: 「0.8ページ/秒・残り約3分」）"""
+    if eta is None:
+        return "残り時間を計測中"
+    if eta <= 0:
+        return f"{rate:.2f}ページ/秒"
+    if eta < 60:
+        remaining = f"{eta:.0f}秒"
+    else:
+        remaining = f"{eta / 60:.0f}分"
+    return f"{rate:.2f}ページ/秒・残り約{remaining}"
+
+
+def count_statuses(results: List[Dict]) -> Dict[str, int]:
+    """状態（ok / warning / error）ごとの件数"""
+    counts = dict.fromkeys(STATUSES, 0)
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    return counts
+
+
+class ProgressReporter:
+    """
+    チェックの進捗の通知先（画面・コンソール等の表示はサブクラスで実装）
+    
+    ページ・チェッカー単位の結果が届くたびに状態ごとの件数と検出済みの指摘を更新するため、
+    表示のたびにこれまでの結果全体を数え直す必要はない
+    """
+
+    def __init__(self):
+        # 最後に完了した実行の段階ごとの統計
+        self.metrics: List[Dict] = []
+        # これまでに届いた結果の状態ごとの件数と、検出済みの指摘（状態ごとに届いた順）
+        self.counts = dict.fromkeys(STATUSES, 0)
+        self._findings: Dict[str, List[Dict]] = {"error": [], "warning": []}
+        self._results_lock = threading.Lock()
+        # 処理速度の起点（最初に update() を呼び出した時刻と処理済みのページ数）
+        self._pace_origin: Optional[Tuple[float, int]] = None
+
+    def start(self, run_id: Optional[str]):
+        """
+        チェックの開始時に呼び出される（run_clinic() から）
+
+        Args:
+            run_id: 中断した場合の再開に使う実行ID（途中経過を記録しない場合は None）
+        """
+
+    def add_results(self, results: List[Dict]):
+        """
+        ページ・チェッカー単位のチェックが終わるたびに呼び出される（各段階のスレッドから。ページ全体の完了を待たない）
+        
+        サブクラスで上書きする場合も呼び出すこと
+        
+        Args:
+            results: 完了した単位のチェック結果（CheckResult.to_dict() のリスト）
+        """
+        with self._results_lock:
+            for r in results:
+                self.counts[r["status"]] = self.counts.get(r["status"], 0) + 1
+                if r["status"] in self._findings:
+                    self._findings[r["status"]].append(r)
+
+    def findings(self, limit: int = 50) -> List[Dict]:
+        """検出済みの指摘（エラーを先頭に最大 limit 件）"""
+        with self._results_lock:
+            rows = self._findings["error"][:limit]
+            return rows + self._findings["warning"][:limit - len(rows)]
+
+    def pace(self, done: int, total: int) -> Tuple[float, Optional[float]]:
+        """
+        処理速度と残り時間の見込み（update() の中で呼び出す）
+        
+        再開時に記録から復元したページは速度に含めない
+        
+        Returns:
+            (ページ/秒, 残り秒数。まだ見込めない場合は None)
+        """
+        now = time.monotonic()
+        if self._pace_origin is None:
+            self._pace_origin = (now, done)
+        origin_time, origin_done = self._pace_origin
+        elapsed = now - origin_time
+        rate = (done - origin_done) / elapsed if elapsed > 0 else 0.0
+        return rate, (total - done) / rate if rate > 0 else None
+
+    def update(self, done: int, total: int, results: List[Dict], metrics: List[Dict]):
+        """
+        ページのチェックが進むたびに呼び出される（完了したページがなくても一定間隔で呼び出される。
+        チェックの開始時にも、再開時に記録から復元したページ数で1回呼び出される）
+
+        Args:
+            done: 処理済みのページ数（取得できなかったページを含む）
+            total: 対象ページ数
+            results: これまでのチェック結果（CheckResult.to_dict() のリスト）
+            metrics: Pipeline.metrics() の段階ごとの統計
+        """
+
+    def finish(self, metrics: List[Dict]):
+        """全ページの処理が終わったときに呼び出される（サブクラスで上書きする場合も呼び出すこと）"""
+        self.metrics = metrics
+
+    def error(self, message: str):
+        """チェックを続行できないエラー"""
+        print(f"エラー: {message}")
+
+
+def estimate_run(urls: List[str], config: dict, pre_pages: Dict, ng_rules: Optional[List[dict]] = None, master_data: Optional[dict] = None, duplicates: Optional[Dict] = None) -> Dict:
+    """
+    チェック開始前の見積もりを算出（AIの呼び出し・リンク確認は行わない）
+    
+    Args:
+        urls: チェック対象URLリスト
+        config: 設定辞書
+        pre_pages: URL抽出時に取得したページ {url: (本文, soup)}
+        ng_rules: NG表現ルールのリスト
+        master_data: マスターデータ
+        duplicates: URL抽出時に検出したほぼ同一のページ {url: (代表ページ, 類似度)}
+    
+    Returns:
+        RunEstimator.estimate() の結果
+    """
+    run_config = config.copy()
+    if ng_rules:
+        run_config["ng_words_rules"] = ng_rules
+    
+    link_checker = LinkChecker(run_config)
+    ai_checker = UnifiedAIChecker(run_config, master_data=master_data, ng_rules=ng_rules)
+    estimator = RunEstimator(run_config)
+    duplicates = duplicates or {}
+    target_pages = {u: pre_pages[u] for u in urls if u in pre_pages and u not in duplicates}
+    sampling_plan = TemplateSampler(run_config).plan(target_pages)
+    return estimator.estimate(
+        urls,
+        pre_pages,
+        link_checker=link_checker if link_checker.is_enabled() else None,
+        ai_checker=ai_checker if ai_checker.is_enabled() else None,
+        skip_ai={u for u, cluster in sampling_plan.items() if not cluster.is_sampled(u)} | set(duplicates)
+    )
+
+
+def run_checks(urls: List[str], config: dict, auth_id: str = "", auth_pass: str = "", ng_rules: Optional[List[dict]] = None, master_data: Optional[dict] = None, usage_tracker: Optional[AIUsageTracker] = None, budget: Optional[RunBudget] = None, inbound_counts: Optional[Dict[str, int]] = None, progress: Optional[ProgressReporter] = None, journal: Optional[RunJournal] = None):
+    """
+    チェックを実行
+    
+    取得 → 解析 → 機械判定 → ネットワーク → AI の各段階を上限付きキューでつないで並行処理し、
+    取得できたページから順にチェックへ進める。各チェッカーは消費する資源の種類（resource_class）の段階で実行される
+    
+    budget.cancel_token で中止された場合・実行時間の上限に達した場合は、受信中のページ・確認中のリンクも打ち切り、
+    チェックを終えていないページに「未チェック」の行を付けて、それまでの結果を返す
+    
+    journal を指定すると、ページ・チェッカー単位の結果を完了するたびに記録する。
+    記録済みの実行を再開した場合は、記録済みの結果を再利用して未完了の分のみをチェックする
+    （全てのチェックが完了したページは取得も行わない）。チェック順・重複ページ・テンプレート群の割り当ても
+    記録から復元するため、中断せずに実行した場合と同じ結果になる
+    
+    Args:
+        urls: チェック対象URLリスト
+        config: 設定辞書
+        auth_id: Basic認証ID
+        auth_pass: Basic認証パスワード
+        ng_rules: NG表現ルールのリスト
+        master_data: マスターデータ
+        usage_tracker: AI呼び出しの記録先
+        budget: 実行予算（省略時は無制限）
+        inbound_counts: URL抽出時に数えたページごとの被リンク数（チェック順の決定に使用）
+        progress: 進捗の通知先（省略時は通知しない）
+        journal: 途中経過の記録先（省略時は記録しない）
+    
+    Returns:
+        (チェック結果のリスト, チェックしたURLのリスト, 取得したページ {url: (本文, soup)})
+        再開した場合、記録から復元したページは取得したページに含まれない
+    """
+    all_results = []
+    progress = progress or ProgressReporter()
+    budget = budget or RunBudget()
+    budget.start()
+    cancel_token = budget.cancel_token
+    
+    # 既存の設定を上書きしないようにコピー
+    run_config = config.copy()
+    if ng_rules:
+        run_config["ng_words_rules"] = ng_rules
+    
+    # Basic認証情報
+    auth = None
+    if auth_id and auth_pass:
+        auth = (auth_id, auth_pass)
+    
+    # クローラー初期化
+    crawler = WebCrawler(run_config)
+    if auth:
+        crawler.set_auth(auth_id, auth_pass)
+    crawler.set_cancel_token(cancel_token)
+    
+    # トップ・アクセス・料金・お問い合わせ等の重要なページから順に処理
+    # 再開時は記録したチェック順を使用（URL抽出時の被リンク数がなくても同じ順になる）
+    if journal and journal.order:
+        urls = journal.order
+    else:
+        urls = PagePrioritizer(run_config).order(urls, inbound_counts)
+        if journal:
+            journal.record_order(urls)
+    
+    # チェッカーを初期化（AI系は UnifiedAIChecker に統合）
+    checkers = [
+        LinkChecker(run_config, auth=auth, cancel_token=cancel_token),
+        PhoneChecker(run_config),
+        UnifiedAIChecker(run_config, master_data=master_data, ng_rules=ng_rules, usage_tracker=usage_tracker, budget=budget)
+    ]
+    # 消費する資源の種類ごとに、その種類の同時実行数で動く段階に振り分ける
+    checkers_by_resource = {
+        resource: [c for c in checkers if c.is_enabled() and c.resource_class == resource]
+        for resource in RESOURCE_CLASSES
+    }
+    # AIを呼び出す前の機械判定（GA4・NG表現・整合性・校正ルール）はCPUの段階で実行
+    local_checkers = [c for c in checkers_by_resource[RESOURCE_AI] if isinstance(c, UnifiedAIChecker)]
+    
+    # 大規模サイトでは同じテンプレートのページ群のうち代表ページのみをAIチェック
+    sampler = TemplateSampler(run_config)
+    sampling_active = sampler.is_active(len(urls))
+    
+    pages = {}
+    
+    # 記録済みの割り当てを復元（群の先頭ページを先に復元）し、全てのチェックが完了したページの結果を再利用
+    restored_clusters = {}
+    restored_urls = set()
+    if journal:
+        recorded_pages = sorted(journal.pages.values(), key=lambda record: record.get("leader") is None)
+        for record in recorded_pages:
+            crawler.near_duplicates.restore(record["url"], record.get("fingerprint"), record.get("duplicate_of"))
+            if sampling_active and record.get("cluster"):
+                restored_clusters[record["url"]] = sampler.restore(
+                    record["url"], record["cluster"], record.get("sampled", False), record.get("leader")
+                )
+        restored_urls = {url for url in urls if url in journal.done}
+        for url in urls:
+            if url in restored_urls:
+                for unit in journal.units.get(url, {}).values():
+                    all_results.extend(unit["results"])
+        progress.add_results(all_results)
+    
+    def run_checker(task, unit, func, state=None):
+        """
+        ページ・チェッカー単位のチェック（unit は単位の名前）
+        
+        記録済みの単位は結果を再利用する。state は再開時に引き継ぐ状態を返す関数で、
+        記録済みの状態またはチェック後の state() を返す（失敗した場合は None。記録しないため再開時に再実行される）
+        中断された後の単位は実行せず、ページを途中で打ち切ったものとして扱う
+        """
+        recorded = journal.units.get(task["url"], {}).get(unit) if journal else None
+        if recorded is not None:
+            task["units"][unit] = recorded["results"]
+            progress.add_results(recorded["results"])
+            return recorded["state"]
+        if cancel_token.cancelled:
+            task["interrupted"] = True
+            return None
+        try:
+            results = [r.to_dict() for r in func()]
+        except CancelledError:
+            task["interrupted"] = True
+            return None
+        except Exception as e:
+            print(f"エラー ({unit} at {task['url']}): {e}")
+            return None
+        task["units"][unit] = results
+        progress.add_results(results)
+        unit_state = state() if state else None
+        if journal:
+            journal.record_unit(task["url"], unit, results, unit_state)
+        return unit_state
+    
+    def mark_unchecked(task, partial=False):
+        """中断したページに「未チェック」の行を付ける（完了を記録しないため、再開時にチェックされる）"""
+        task["skipped"] = True
+        task["units"]["未チェック"] = [unchecked_result(task["url"], cancel_token.reason, partial)]
+        progress.add_results(task["units"]["未チェック"])
+        return task
+    
+    def fetch_stage(task):
+        try:
+            task["html"] = crawler.fetch_html(task["url"])
+        except CancelledError:
+            return mark_unchecked(task)
+        return task if task["html"] is not None else None
+    
+    def parse_stage(task):
+        if task.get("skipped"):
+            return task
+        page_url = task["url"]
+        facts = crawler.parse_page(page_url, task.pop("html"))
+        content, soup = facts.text, facts.soup
+        pages[page_url] = (content, soup)
+        task["content"], task["soup"] = content, soup
+        if cancel_token.cancelled:
+            return mark_unchecked(task)
+        
+        recorded = journal.pages.get(page_url) if journal else None
+        if recorded is not None:
+            task["duplicate_of"] = recorded.get("duplicate_of")
+            task["cluster"] = restored_clusters.get(page_url)
+        else:
+            # ほぼ同一のページ（ページ送り・印刷用ページ等）は先に届いた代表ページのみでAI・リンクをチェック
+            task["duplicate_of"] = crawler.near_duplicates.match(page_url)
+            if not task["duplicate_of"] and sampling_active:
+                task["cluster"] = sampler.assign(page_url, content, soup, dom=facts.dom)
+            if journal:
+                cluster = task.get("cluster")
+                journal.record_page(page_url, {
+                    "duplicate_of": task["duplicate_of"],
+                    "fingerprint": crawler.near_duplicates.fingerprints.get(page_url),
+                    "cluster": cluster.urls[0] if cluster else None,
+                    "sampled": cluster.is_sampled(page_url) if cluster else False,
+                    "leader": sampler.leader_features(page_url) if cluster and cluster.urls[0] == page_url else None,
+                })
+        
+        def duplicate_rows():
+            if not task["duplicate_of"]:
+                return []
+            rep_url, score = task["duplicate_of"]
+            return [CheckResult(
+                page_url=page_url,
+                check_name="重複ページ",
+                status="ok",
+                details=f"{rep_url} とほぼ同一の内容（類似度 {score:.0%}）のため、AI・リンクのチェックは代表ページの結果を参照してください",
+                severity="low"
+            )]
+        run_checker(task, "重複ページ", duplicate_rows)
+        return task
+    
+    def cpu_stage(task):
+        if task.get("skipped"):
+            return task
+        for checker in checkers_by_resource[RESOURCE_CPU]:
+            run_checker(task, checker.__class__.__name__, lambda: checker.check(task["url"], task["content"], task["soup"]))
+        for checker in local_checkers:
+            def check_local():
+                results, light_consistency, include_typo = checker.check_local(task["url"], task["content"], task["soup"])
+                task["ai_options"][checker] = [light_consistency, include_typo]
+                return results
+            options = run_checker(task, f"{checker.__class__.__name__}.local", check_local, state=lambda: task["ai_options"][checker])
+            if options is not None:
+                task["ai_options"][checker] = options
+        return task
+    
+    def network_stage(task):
+        if task.get("skipped") or task.get("duplicate_of"):
+            return task
+        for checker in checkers_by_resource[RESOURCE_NETWORK]:
+            run_checker(task, checker.__class__.__name__, lambda: checker.check(task["url"], task["content"], task["soup"]))
+        return task
+    
+    def ai_stage(task):
+        cluster = task.get("cluster")
+        if task.get("skipped") or task.get("duplicate_of") or (cluster and not cluster.is_sampled(task["url"])):
+            return task
+        for checker in checkers_by_resource[RESOURCE_AI]:
+            if checker in local_checkers:
+                if checker not in task["ai_options"]:
+                    continue
+                light_consistency, include_typo = task["ai_options"][checker]
+                run_checker(task, f"{checker.__class__.__name__}.ai", lambda: checker.check_ai(
+                    task["url"], task["content"], task["soup"], light_consistency, include_typo
+                ))
+            else:
+                run_checker(task, checker.__class__.__name__, lambda: checker.check(task["url"], task["content"], task["soup"]))
+        return task
+    
+    workers = stage_workers(run_config)
+    pipeline = Pipeline([
+        ("取得", fetch_stage, workers["fetch"]),
+        ("解析", parse_stage, workers["parse"]),
+        ("機械判定", cpu_stage, workers[RESOURCE_CPU]),
+        ("ネットワーク", network_stage, workers[RESOURCE_NETWORK]),
+        ("AI", ai_stage, workers[RESOURCE_AI]),
+    ], queue_size=run_config.get("pipeline", {}).get("queue_size", 20))
+    
+    # 優先度順に投入し、ページ・チェッカー単位の結果は add_results() で、ページの完了は update() で通知
+    total_tasks = len(urls)
+    current_done = len(restored_urls)
+    skipped = False
+    progress.update(current_done, total_tasks, all_results, [])
+    tasks = ({"url": url, "units": {}, "ai_options": {}} for url in urls if url not in restored_urls)
+    for task in pipeline.run(tasks):
+        if task is not None:
+            if task.get("interrupted") and not task.get("skipped"):
+                mark_unchecked(task, partial=True)
+            # ページ内の結果はチェック順（段階順）に並ぶ
+            for results in task["units"].values():
+                all_results.extend(results)
+            current_done += 1
+            skipped = skipped or task.get("skipped", False)
+            if journal and not task.get("skipped"):
+                journal.record_page_done(task["url"])
+        # 取得できなかったページも処理済みとして数える
+        finished = current_done + pipeline.stages[0].dropped
+        progress.update(finished, total_tasks, all_results, pipeline.metrics())
+    
+    crawler.close()
+    for checker in checkers:
+        checker.close()
+    progress.finish(pipeline.metrics())
+    # 中断して省略したページがあれば、再開できるよう完了としない
+    if journal and not skipped:
+        journal.finish()
+    
+    if not pages and not restored_urls:
+        if cancel_token.cancelled:
+            progress.error(f"{cancel_token.reason}ため、ページを取得する前に中断しました")
+        else:
+            progress.error("入力されたURLから有効なページ情報を取得できませんでした")
+        return [], [], {}
+    
+    all_results, checked_urls = finalize_results(all_results, urls, set(pages) | restored_urls, crawler.near_duplicates, sampler)
+    return all_results, checked_urls, pages
+
+
+def unchecked_result(page_url: str, reason: str, partial: bool = False) -> Dict:
+    """
+    中断したページの「未チェック」の行
+    
+    Args:
+        page_url: ページのURL
+        reason: 中断の理由（CancelToken.reason）
+        partial: 一部のチェックを終えた後で打ち切った場合 True
+    """
+    if partial:
+        details = f"★ {reason}ため、このページのチェックを途中で打ち切りました（完了したチェックの結果のみ表示）"
+    else:
+        details = f"★ {reason}ため、このページのチェックを省略しました"
+    return CheckResult(
+        page_url=page_url,
+        check_name="未チェック",
+        status="warning",
+        details=details,
+        severity="medium"
+    ).to_dict()
+
+
+def finalize_results(all_results: List[Dict], urls: List[str], checked: set, near_duplicates, sampler: TemplateSampler) -> Tuple[List[Dict], List[str]]:
+    """
+    全ページの割り当てが終わった後の結果の確定（run_checks() と分散チェックで共通）
+    
+    代表ページ側の「重複ページ」「サンプリング」の行を追加し、ページの優先度順に並べる
+    
+    Args:
+        all_results: ページごとのチェック結果
+        urls: チェック順のURLリスト
+        checked: チェックした（記録から復元したページを含む）URL
+        near_duplicates: 重複ページの判定に使った NearDuplicateDetector
+        sampler: テンプレート群の割り当てに使った TemplateSampler
+    
+    Returns:
+        (チェック結果のリスト, チェックしたURLのリスト)
+    """
+    duplicate_groups = {}
+    for dup_url, (rep_url, _) in near_duplicates.duplicates.items():
+        duplicate_groups.setdefault(rep_url, []).append(dup_url)
+    for rep_url, dup_urls in duplicate_groups.items():
+        all_results.append(CheckResult(
+            page_url=rep_url,
+            check_name="重複ページ",
+            status="ok",
+            details="このページとほぼ同一の内容のページ（このページを代表としてチェック）:\n" + "\n".join(sorted(dup_urls)),
+            severity="low"
+        ).to_dict())
+    for cluster in sampler.assigned_clusters():
+        for page_url in cluster.urls:
+            all_results.append(CheckResult(
+                page_url=page_url,
+                check_name="サンプリング",
+                status="ok",
+                details=cluster.describe(page_url),
+                severity="low"
+            ).to_dict())
+    
+    # レポートはページの優先度順に並べる
+    checked_urls = [url for url in urls if url in checked]
+    rank = {url: i for i, url in enumerate(checked_urls)}
+    all_results.sort(key=lambda r: rank.get(r["page_url"], len(rank)))
+    
+    return all_results, checked_urls
+
+
+class ClinicJob:
+    """1医院分のチェック条件"""
+
+    def __init__(self, clinic_name: str, url: str, urls: Optional[List[str]] = None, correct_phone: str = "",
+                 ng_rules: Optional[List[dict]] = None, master_data: Optional[dict] = None):
+        """
+        Args:
+            clinic_name: 医院名
+            url: サイトのURL（urls を省略した場合、ここから巡回してチェック対象を収集）
+            urls: チェック対象URLのリスト
+            correct_phone: 正しい電話番号
+            ng_rules: NG表現ルールのリスト
+            master_data: マスターデータ
+        """
+        self.clinic_name = clinic_name
+        self.url = url
+        self.urls = urls
+        self.correct_phone = correct_phone
+        self.ng_rules = ng_rules
+        self.master_data = master_data
+
+    @classmethod
+    def from_excel(cls, path: str, sync: bool = True, urls: Optional[List[str]] = None) -> "ClinicJob":
+        """
+        DC-config.xlsx からチェック条件を作成
+
+        Args:
+            path: DC-config.xlsx のパス
+            sync: 「プレミアムプラン用」シートを「チェックリスト」シートに同期する（ファイルを上書き保存）
+            urls: チェック対象URLのリスト（省略時はサイトを巡回して収集）
+
+        Raises:
+            ValueError: ファイルがない、またはURL・医院名が見つからない場合
+        """
+        handler = ExcelHandler(path)
+        if not handler.load():
+            raise ValueError(f"設定ファイルが見つかりません: {path}")
+        if sync:
+            handler.sync_sheets()
+        url, clinic_name, correct_phone = handler.get_basic_info()
+        if not url or not clinic_name:
+            raise ValueError(f"Excel内からURLまたは医院名が見つかりませんでした: {path}")
+        return cls(
+            clinic_name, url, urls=urls, correct_phone=correct_phone or "",
+            ng_rules=handler.get_ng_rules(), master_data=handler.get_all_master_data()
+        )
+
+    def to_dict(self) -> Dict:
+        """記録用の辞書（from_dict() で復元）"""
+        return {
+            "clinic_name": self.clinic_name, "url": self.url, "urls": self.urls, "correct_phone": self.correct_phone,
+            "ng_rules": self.ng_rules, "master_data": self.master_data,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ClinicJob":
+        return cls(**data)
+
+
+def apply_clinic_settings(config: Dict, correct_phone: str = "") -> Dict:
+    """医院ごとの設定（正しい電話番号）を反映した設定辞書（元の設定は変更しない）"""
+    run_config = config.copy()
+    if correct_phone:
+        checks = dict(run_config.get("checks") or {})
+        checks["phone_check"] = dict(checks.get("phone_check") or {}, correct_phone=correct_phone)
+        run_config["checks"] = checks
+    return run_config
+
+
+def run_clinic(job: ClinicJob, config: Dict, auth_id: str = "", auth_pass: str = "",
+               budget: Optional[RunBudget] = None, progress: Optional[ProgressReporter] = None,
+               pre_pages: Optional[Dict] = None, inbound_counts: Optional[Dict[str, int]] = None,
+               estimate: Optional[Dict] = None, journal: Optional[RunJournal] = None) -> Dict:
+    """
+    1医院分のチェックを実行（URLの収集・チェック・指摘の集約・実行統計の記録）
+
+    checkpoint.enabled の場合は途中経過を記録し、中断しても resume_clinic() で再開できる。
+    budget.cancel_token.cancel() で中止した場合・実行時間の上限に達した場合は、それまでの結果で部分的なレポートを返す。
+    distributed.queue を指定した場合は作業単位に分割してワーカーで実行する（utils.distributed）
+
+    Args:
+        job: チェック条件
+        config: 設定辞書
+        auth_id: Basic認証ID
+        auth_pass: Basic認証パスワード
+        budget: 実行予算（省略時は config の budget）
+        progress: 進捗の通知先
+        pre_pages: URL抽出時に取得したページ {url: (本文, soup)}（画面で抽出済みの場合。チェック順の決定に使用）
+        inbound_counts: URL抽出時に数えた被リンク数（省略時は pre_pages から算出）
+        estimate: 算出済みの見積もり（省略時は URL を収集した場合のみ算出）
+        journal: 再開する実行の記録（省略時は新しく記録する）
+
+    Returns:
+        {"clinic_name", "results", "checked_urls", "pages", "ai_usage", "estimate", "metrics", "elapsed", "run_id", "interrupted"}
+        interrupted は中断して未チェックのページが残った場合の理由（全てチェックした場合は None）
+    """
+    progress = progress or ProgressReporter()
+    run_config = apply_clinic_settings(config, job.correct_phone)
+    budget = budget or RunBudget.from_config(run_config)
+
+    # チェック対象URLの収集（URL抽出時に取得したページは見積もりとチェック順の決定に使用）
+    pre_pages = pre_pages or {}
+    duplicates = {}
+    urls = job.urls
+    if not urls:
+        pre_crawler = WebCrawler(run_config)
+        pre_crawler.set_auth(auth_id, auth_pass)
+        pre_crawler.set_cancel_token(budget.cancel_token)
+        pre_pages = pre_crawler.crawl_site(job.url)
+        duplicates = pre_crawler.near_duplicates.resolve()
+        urls = list(pre_pages.keys())
+
+    if estimate is None and pre_pages and not journal:
+        try:
+            estimate = estimate_run(urls, run_config, pre_pages, ng_rules=job.ng_rules, master_data=job.master_data, duplicates=duplicates)
+        except Exception as e:
+            print(f"警告 (見積もり): {e}")
+
+    if journal is None and RunJournal.is_enabled(run_config):
+        job_data = dict(job.to_dict(), urls=urls)
+        try:
+            journal = RunJournal.create(run_config, {"job": job_data})
+        except OSError as e:
+            print(f"警告 (途中経過の記録): {e}")
+
+    progress.start(journal.run_id if journal else None)
+    usage_tracker = AIUsageTracker(run_config)
+    if inbound_counts is None:
+        inbound_counts = PagePrioritizer(run_config).inbound_counts(pre_pages)
+    check_args = dict(
+        ng_rules=job.ng_rules, master_data=job.master_data, usage_tracker=usage_tracker, budget=budget,
+        inbound_counts=inbound_counts, progress=progress, journal=journal
+    )
+    queue_target = run_config.get("distributed", {}).get("queue")
+    if queue_target:
+        # utils.distributed は runner を参照するため、ここで読み込む
+        from utils.distributed import run_checks_distributed
+        from utils.work_queue import open_work_queue
+        queue = open_work_queue(queue_target, run_config)
+        results, checked_urls, pages = run_checks_distributed(urls, run_config, queue, auth_id, auth_pass, **check_args)
+    else:
+        results, checked_urls, pages = run_checks(urls, run_config, auth_id, auth_pass, **check_args)
+
+    unchecked = any(r["check_name"] == "未チェック" for r in results)
+    # フッター等の共通部分の指摘はサイト全体の1行に集約
+    results = FindingAggregator(run_config).aggregate(results)
+    ai_usage = usage_tracker.summary()
+
+    # 次回以降の見積もりのため実測値を記録
+    try:
+        RunStatsStore(run_config).update(ai_usage, budget.elapsed(), estimate)
+    except Exception as e:
+        print(f"警告 (実行統計の保存): {e}")
+
+    return {
+        "clinic_name": job.clinic_name,
+        "results": results,
+        "checked_urls": checked_urls,
+        "pages": pages,
+        "ai_usage": ai_usage,
+        "estimate": estimate,
+        "metrics": progress.metrics,
+        "elapsed": budget.elapsed(),
+        "run_id": journal.run_id if journal else None,
+        "interrupted": budget.cancel_token.reason if budget.cancel_token.reason and (unchecked or not checked_urls) else None,
+    }
+
+
+def resume_clinic(run_id: str, config: Dict, auth_id: str = "", auth_pass: str = "",
+                  budget: Optional[RunBudget] = None, progress: Optional[ProgressReporter] = None) -> Dict:
+    """
+    中断したチェックを再開（記録済みのチェック結果は再利用し、未完了の分のみをチェック）
+
+    Raises:
+        ValueError: 指定した実行IDの記録がない場合
+
+    Returns:
+        run_clinic() と同じ。AIの利用状況（ai_usage）は再開後の呼び出しのみを含む
+    """
+    journal = RunJournal.open(config, run_id)
+    job = ClinicJob.from_dict(journal.params["job"])
+    return run_clinic(job, config, auth_id, auth_pass, budget=budget, progress=progress, journal=journal)
+
+
+def page_texts_zip(pages: Dict) -> bytes:
+    """取得したページの本文を1ページ1ファイルのZIPにまとめる（AIの誤認等の調査・診断用）"""
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED, False) as zip_file:
+        for url, (content, _) in pages.items():
+            # URLをファイル名に安全な形式に変換
+            safe_filename = url.replace("https://", "").replace("http://", "").replace("/", "_").replace(":", "_") + ".txt"
+            zip_file.writestr(safe_filename, content)
+    return zip_buffer.getvalue()
+
+
+def write_reports(report: Dict, config: Dict, output_dir: str, formats: Tuple[str, ...] = ("xlsx", "json")) -> List[str]:
+    """
+    run_clinic() の結果をレポートファイルに出力
+
+    Args:
+        report: run_clinic() の戻り値
+        config: 設定辞書
+        output_dir: 出力先ディレクトリ
+        formats: 出力形式（"xlsx" / "json"）
+
+    Returns:
+        出力したファイルのパス
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.join(output_dir, f"{report['clinic_name']}チェック結果_{time.strftime('%Y%m%d_%H%M%S')}")
+    paths = []
+    if "xlsx" in formats:
+        data = ExcelReporter(config).generate_report(report["clinic_name"], report["results"], ai_usage=report["ai_usage"])
+        with open(stem + ".xlsx", "wb") as f:
+            f.write(data.getvalue())
+        paths.append(stem + ".xlsx")
+    if "json" in formats:
+        text = JsonReporter(config).generate_report(
+            report["clinic_name"], report["results"], ai_usage=report["ai_usage"],
+            checked_urls=report["checked_urls"], metrics=report["metrics"]
+        )
+        with open(stem + ".json", "w", encoding="utf-8") as f:
+            f.write(text)
+        paths.append(stem + ".json")
+    return paths
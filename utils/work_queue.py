@@ -0,0 +1,412 @@
+"""
+分散チェックの作業単位の待ち行列
+
+チェックを作業単位（ページの取得・ページ内リンクの確認・ページのAIチェック）に分割して SQLite に保存し、
+1台または複数台のワーカー（utils.distributed）が貸し出し（リース）を受けて実行する。
+期限内に完了しなかった単位・失敗した単位は待ち時間を置いて再実行し、max_attempts 回で失敗として確定する。
+
+複数台で共有する場合は、SQLite ファイルを直接共有せず、このモジュールのブローカー（HTTP）を1台で起動し、
+各ワーカー・投入側は RemoteWorkQueue で接続する（ネットワーク上のメッセージブローカーの代わり）。
+実行の条件・結果にはマスターデータ・NGルール・ページ本文が含まれるため、他のPCから接続する場合は
+distributed.token（または環境変数 WORK_QUEUE_TOKEN）を指定し、Authorization: Bearer <token> を要求する。
+
+使い方:
+    python -m utils.work_queue --db .cache/work_queue.sqlite3 --host 0.0.0.0 --port 8767
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import requests
+
+UNIT_FETCH = "fetch"
+UNIT_LINKS = "links"
+UNIT_AI = "ai"
+UNIT_KINDS = (UNIT_FETCH, UNIT_LINKS, UNIT_AI)
+
+UNIT_PENDING = "pending"
+UNIT_LEASED = "leased"
+UNIT_DONE = "done"
+UNIT_FAILED = "failed"
+
+
+class WorkQueue:
+    """作業単位の待ち行列（SQLite、スレッド・プロセス間で共有可能）"""
+
+    def __init__(self, path: str, max_attempts: int = 3, retry_backoff: float = 5.0):
+        """
+        Args:
+            path: SQLiteファイルのパス
+            max_attempts: 1つの単位の最大試行回数（期限切れ・失敗による再実行を含む）
+            retry_backoff: 失敗した単位を再実行するまでの待ち時間（秒、試行ごとに倍）
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                " run_id TEXT PRIMARY KEY,"
+                " params TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS units ("
+                " unit_id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " run_id TEXT NOT NULL,"
+                " kind TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " lease_owner TEXT,"
+                " lease_expires REAL,"
+                " available_at REAL NOT NULL,"
+                " result TEXT,"
+                " error TEXT NOT NULL DEFAULT '',"
+                " collected INTEGER NOT NULL DEFAULT 0,"
+                " UNIQUE (run_id, kind, key))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS units_ready ON units (status, kind, available_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS units_run ON units (run_id, collected)")
+
+    def _transaction(self, func):
+        """書き込みを1つのトランザクションで実行（他のプロセスと競合しないよう先にロックを取得）"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._conn)
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def register_run(self, run_id: str, params: Dict):
+        """実行の条件を登録（ワーカーがチェッカーの初期化に使用。登録済みなら何もしない）"""
+        self._transaction(lambda conn: conn.execute(
+            "INSERT OR IGNORE INTO runs (run_id, params, created_at) VALUES (?, ?, ?)",
+            (run_id, json.dumps(params, ensure_ascii=False, default=str), time.time())
+        ))
+
+    def run_params(self, run_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT params FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def enqueue(self, run_id: str, kind: str, key: str, payload: Dict):
+        """作業単位を追加（同じ実行・種類・キーの単位が登録済みなら何もしない。投入側の再起動に備える）"""
+        self._transaction(lambda conn: conn.execute(
+            "INSERT OR IGNORE INTO units (run_id, kind, key, payload, status, available_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (run_id, kind, key, json.dumps(payload, ensure_ascii=False), UNIT_PENDING, time.time())
+        ))
+
+    def lease(self, worker: str, kinds: List[str], lease_seconds: float) -> Optional[Dict]:
+        """
+        実行可能な単位を1件貸し出す（期限切れの単位を含む、登録順）
+
+        Returns:
+            {"unit_id", "run_id", "kind", "key", "payload", "attempts"}。実行可能な単位がなければ None
+        """
+        def lease_one(conn):
+            now = time.time()
+            # 期限切れのまま試行回数を使い切った単位は失敗として確定
+            conn.execute(
+                "UPDATE units SET status = ?, error = ? WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (UNIT_FAILED, "貸し出し期限切れ", UNIT_LEASED, now, self.max_attempts)
+            )
+            placeholders = ", ".join("?" for _ in kinds)
+            row = conn.execute(
+                f"SELECT unit_id, run_id, kind, key, payload, attempts FROM units"
+                f" WHERE kind IN ({placeholders}) AND available_at <= ?"
+                f" AND (status = ? OR (status = ? AND lease_expires < ?))"
+                f" ORDER BY unit_id LIMIT 1",
+                (*kinds, now, UNIT_PENDING, UNIT_LEASED, now)
+            ).fetchone()
+            if not row:
+                return None
+            conn.execute(
+                "UPDATE units SET status = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE unit_id = ?",
+                (UNIT_LEASED, worker, now + lease_seconds, row[0])
+            )
+            return {
+                "unit_id": row[0], "run_id": row[1], "kind": row[2], "key": row[3],
+                "payload": json.loads(row[4]), "attempts": row[5] + 1,
+            }
+        return self._transaction(lease_one)
+
+    def renew(self, unit_ids: List[int], worker: str, lease_seconds: float):
+        """実行中の単位の貸し出し期限を延長"""
+        expires = time.time() + lease_seconds
+        self._transaction(lambda conn: conn.executemany(
+            "UPDATE units SET lease_expires = ? WHERE unit_id = ? AND lease_owner = ? AND status = ?",
+            [(expires, unit_id, worker, UNIT_LEASED) for unit_id in unit_ids]
+        ))
+
+    def complete(self, unit_id: int, worker: str, result) -> bool:
+        """
+        単位の結果を記録
+
+        Returns:
+            記録した場合 True（期限切れで他のワーカーに貸し出し済みの場合は False。結果は破棄する）
+        """
+        cursor = self._transaction(lambda conn: conn.execute(
+            "UPDATE units SET status = ?, result = ?, error = '', lease_owner = NULL WHERE unit_id = ? AND lease_owner = ? AND status = ?",
+            (UNIT_DONE, json.dumps(result, ensure_ascii=False), unit_id, worker, UNIT_LEASED)
+        ))
+        return cursor.rowcount == 1
+
+    def fail(self, unit_id: int, worker: str, error: str):
+        """単位の失敗を記録（試行回数が残っていれば待ち時間を置いて再実行）"""
+        def fail_one(conn):
+            row = conn.execute(
+                "SELECT attempts FROM units WHERE unit_id = ? AND lease_owner = ? AND status = ?", (unit_id, worker, UNIT_LEASED)
+            ).fetchone()
+            if not row:
+                return
+            if row[0] >= self.max_attempts:
+                conn.execute(
+                    "UPDATE units SET status = ?, error = ?, lease_owner = NULL WHERE unit_id = ?", (UNIT_FAILED, error, unit_id)
+                )
+            else:
+                conn.execute(
+                    "UPDATE units SET status = ?, error = ?, lease_owner = NULL, available_at = ? WHERE unit_id = ?",
+                    (UNIT_PENDING, error, time.time() + self.retry_backoff * 2 ** (row[0] - 1), unit_id)
+                )
+        self._transaction(fail_one)
+
+    def collect(self, run_id: str, include_collected: bool = False) -> List[Dict]:
+        """
+        完了・失敗が確定した単位を取り出す（取り出し済みとして記録し、次回以降は返さない）
+
+        Args:
+            include_collected: 取り出し済みの単位も返す（投入側の再起動時）
+
+        Returns:
+            [{"unit_id", "kind", "key", "status", "result", "error", "collected"}, ...]（登録順。
+            collected は以前に取り出し済みだった単位）
+        """
+        def collect_all(conn):
+            rows = conn.execute(
+                "SELECT unit_id, kind, key, status, result, error, collected FROM units"
+                " WHERE run_id = ? AND status IN (?, ?)" + ("" if include_collected else " AND collected = 0") +
+                " ORDER BY unit_id",
+                (run_id, UNIT_DONE, UNIT_FAILED)
+            ).fetchall()
+            conn.executemany("UPDATE units SET collected = 1 WHERE unit_id = ?", [(row[0],) for row in rows])
+            return rows
+        return [
+            {"unit_id": unit_id, "kind": kind, "key": key, "status": status,
+             "result": json.loads(result) if result else None, "error": error, "collected": bool(collected)}
+            for unit_id, kind, key, status, result, error, collected in self._transaction(collect_all)
+        ]
+
+    def progress(self, run_id: str) -> Dict[str, Dict]:
+        """
+        種類ごとの単位の状況
+
+        Returns:
+            {kind: {"pending", "leased", "done", "failed", "workers"}}（workers は貸し出し中のワーカー数）
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, status, COUNT(*), COUNT(DISTINCT lease_owner) FROM units WHERE run_id = ? GROUP BY kind, status",
+                (run_id,)
+            ).fetchall()
+        stats = {kind: {UNIT_PENDING: 0, UNIT_LEASED: 0, UNIT_DONE: 0, UNIT_FAILED: 0, "workers": 0} for kind in UNIT_KINDS}
+        for kind, status, count, workers in rows:
+            stats.setdefault(kind, {})[status] = count
+            if status == UNIT_LEASED:
+                stats[kind]["workers"] = workers
+        return stats
+
+    def purge(self, run_id: str):
+        """実行の単位と条件を削除（レポート作成後）"""
+        def purge_run(conn):
+            conn.execute("DELETE FROM units WHERE run_id = ?", (run_id,))
+            conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+        self._transaction(purge_run)
+
+    def discard_pending(self, run_id: str):
+        """
+        中断した実行の未完了の単位（待機中・貸し出し中・失敗）と条件を削除し、完了済みの単位は残す
+
+        同じ実行IDで再開すると、完了済みの単位の結果を再利用し、削除した単位のみ改めて投入する。
+        条件を削除するため、ワーカーはこの実行のチェッカーを解放する
+        """
+        def discard_run(conn):
+            conn.execute("DELETE FROM units WHERE run_id = ? AND status != ?", (run_id, UNIT_DONE))
+            conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+        self._transaction(discard_run)
+
+
+# ブローカー経由で呼び出せるメソッド
+BROKER_METHODS = ("register_run", "run_params", "enqueue", "lease", "renew", "complete", "fail", "collect", "progress", "purge", "discard_pending")
+
+
+class RemoteWorkQueue:
+    """ブローカー（start_broker）経由の待ち行列。WorkQueue と同じメソッドを持つ"""
+
+    def __init__(self, url: str, timeout: float = 30, token: str = ""):
+        """
+        Args:
+            url: ブローカーのURL（例: http://192.168.0.10:8767）
+            timeout: 1回の呼び出しのタイムアウト（秒）
+            token: ブローカーのトークン（指定時は Authorization: Bearer <token> を送信）
+        """
+        self.url = url.rstrip("/") + "/rpc"
+        self.timeout = timeout
+        self._session = requests.Session()
+        if token:
+            self._session.headers["Authorization"] = f"Bearer {token}"
+
+    def _call(self, method: str, **args):
+        response = self._session.post(self.url, json={"method": method, "args": args}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["result"]
+
+    def register_run(self, run_id: str, params: Dict):
+        return self._call("register_run", run_id=run_id, params=params)
+
+    def run_params(self, run_id: str) -> Optional[Dict]:
+        return self._call("run_params", run_id=run_id)
+
+    def enqueue(self, run_id: str, kind: str, key: str, payload: Dict):
+        return self._call("enqueue", run_id=run_id, kind=kind, key=key, payload=payload)
+
+    def lease(self, worker: str, kinds: List[str], lease_seconds: float) -> Optional[Dict]:
+        return self._call("lease", worker=worker, kinds=list(kinds), lease_seconds=lease_seconds)
+
+    def renew(self, unit_ids: List[int], worker: str, lease_seconds: float):
+        return self._call("renew", unit_ids=unit_ids, worker=worker, lease_seconds=lease_seconds)
+
+    def complete(self, unit_id: int, worker: str, result) -> bool:
+        return self._call("complete", unit_id=unit_id, worker=worker, result=result)
+
+    def fail(self, unit_id: int, worker: str, error: str):
+        return self._call("fail", unit_id=unit_id, worker=worker, error=error)
+
+    def collect(self, run_id: str, include_collected: bool = False) -> List[Dict]:
+        return self._call("collect", run_id=run_id, include_collected=include_collected)
+
+    def progress(self, run_id: str) -> Dict[str, Dict]:
+        return self._call("progress", run_id=run_id)
+
+    def purge(self, run_id: str):
+        return self._call("purge", run_id=run_id)
+
+    def discard_pending(self, run_id: str):
+        return self._call("discard_pending", run_id=run_id)
+
+
+def open_work_queue(target: str, config: Optional[Dict] = None):
+    """
+    待ち行列を開く
+
+    Args:
+        target: ブローカーのURL（http:// または https://）、または SQLite ファイルのパス（1台で複数プロセスの場合）
+        config: 設定辞書（distributed の max_attempts・retry_backoff・token を参照）
+    """
+    if target.startswith(("http://", "https://")):
+        return RemoteWorkQueue(target, token=broker_token(config or {}))
+    distributed_config = (config or {}).get("distributed", {})
+    return WorkQueue(target, distributed_config.get("max_attempts", 3), distributed_config.get("retry_backoff", 5.0))
+
+
+def broker_token(config: Dict) -> str:
+    """ブローカーのトークン（distributed.token、なければ環境変数 WORK_QUEUE_TOKEN）"""
+    return config.get("distributed", {}).get("token") or os.environ.get("WORK_QUEUE_TOKEN", "")
+
+
+def _make_handler(queue: WorkQueue, token: str = ""):
+    class BrokerHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if token and self.headers.get("Authorization", "") != f"Bearer {token}":
+                self._send_json(401, {"error": "unauthorized"})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": "invalid json"})
+                return
+            method = body.get("method")
+            if method not in BROKER_METHODS:
+                self._send_json(404, {"error": f"unknown method: {method}"})
+                return
+            try:
+                result = getattr(queue, method)(**body.get("args", {}))
+            except Exception as e:
+                print(f"エラー (ブローカー: {method}): {e}")
+                self._send_json(500, {"error": str(e)})
+                return
+            self._send_json(200, {"result": result})
+
+        def _send_json(self, status: int, data: dict):
+            payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            # ワーカーのポーリングでログが大量に出力されないよう抑制
+            pass
+
+    return BrokerHandler
+
+
+def start_broker(queue: WorkQueue, host: str = "127.0.0.1", port: int = 8767, token: str = "") -> ThreadingHTTPServer:
+    """
+    ブローカーをバックグラウンドスレッドで起動
+
+    Returns:
+        起動したサーバー（停止時は server.shutdown() を呼ぶ）。port=0 の場合は
+        server.server_address[1] で割り当てられたポートを取得できる
+    """
+    server = ThreadingHTTPServer((host, port), _make_handler(queue, token))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分散チェックの作業単位のブローカー")
+    parser.add_argument("--db", default=".cache/work_queue.sqlite3", help="SQLiteファイルのパス")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けるアドレス（他のPCから接続する場合は 0.0.0.0）")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--max-attempts", type=int, default=3, help="1つの単位の最大試行回数")
+    parser.add_argument("--retry-backoff", type=float, default=5.0, help="再実行までの待ち時間（秒、試行ごとに倍）")
+    parser.add_argument("--config", help="設定ファイル（省略時は config.yaml。distributed.token を参照）")
+    parser.add_argument("--token", help="要求するトークン（省略時は distributed.token、なければ環境変数 WORK_QUEUE_TOKEN）")
+    args = parser.parse_args()
+
+    from utils.runner import load_config
+    token = args.token or broker_token(load_config(args.config))
+    if args.host not in ("127.0.0.1", "localhost") and not token:
+        print("警告 (ブローカー): トークンが未設定のため、同じネットワークの誰でも接続できます（distributed.token を指定してください）")
+    queue = WorkQueue(args.db, args.max_attempts, args.retry_backoff)
+    server = ThreadingHTTPServer((args.host, args.port), _make_handler(queue, token))
+    print(f"作業単位のブローカー起動: http://{args.host}:{args.port}/rpc")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()